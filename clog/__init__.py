@@ -0,0 +1,38 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
+
+__version__ = "0.0.1-dev"
+
+from .output import DirectoryOutput, MemoryOutput, Output, TarOutput, ZipOutput
+
+if TYPE_CHECKING:
+    from .models import BuildResult
+
+__all__ = [
+    "DirectoryOutput",
+    "MemoryOutput",
+    "Output",
+    "TarOutput",
+    "ZipOutput",
+    "build",
+]
+
+
+def build(
+    path: Union[Path, str] = ".", output: Optional[Output] = None, only=None
+) -> "BuildResult":
+    """Build the site in `path` and return a :class:`clog.models.BuildResult`.
+
+    `output` defaults to the site's public/ directory; pass a
+    :class:`MemoryOutput` to keep the files in memory instead::
+
+        result = clog.build("my-site", output=clog.MemoryOutput())
+        html = result.output.read_text("index.html")
+    """
+    from .models import Site
+
+    site = Site(Path(path).resolve())
+    if output is None:
+        return site.build(only=only)
+    with output:
+        return site.build(only=only, output=output)
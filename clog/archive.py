@@ -0,0 +1,83 @@
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import arrow
+
+from .page import Page
+
+Bucket = Tuple[int, Optional[int]]  # (year, month), month None for a year
+
+
+def archive_path(year: int, month: Optional[int] = None) -> str:
+    """Directory of an archive page in the output, e.g. `archive/2020/03`"""
+    if month is None:
+        return f"archive/{year}"
+    return f"archive/{year}/{month:02d}"
+
+
+def buckets_of(date: Optional[arrow.Arrow]) -> Set[Bucket]:
+    """The year and month archives a page dated `date` appears in"""
+    if date is None:
+        return set()
+    return {(date.year, None), (date.year, date.month)}
+
+
+def _freeze(groups: Dict) -> Mapping:
+    return MappingProxyType({key: tuple(pages) for key, pages in groups.items()})
+
+
+class Collections:
+    """Sorted, read-only views of a site's pages, computed once per build so
+    that templates don't have to sort or filter `site.pages`.
+
+    Only dated pages outside the top level (posts) are included. Every
+    collection is sorted by date, newest first:
+
+      * `by_date` - a tuple of all posts
+      * `by_section` - posts by directory in content/, e.g. `posts`
+      * `by_tag` - posts by tag
+      * `by_year` - posts by year, newest year first
+      * `by_month` - posts by `(year, month)`, newest month first
+    """
+
+    def __init__(self, pages: Iterable[Page] = ()):
+        dated = []
+        for page in pages:
+            date = None if page.is_toplevel else page.date
+            if date is not None:
+                dated.append((date, page))
+        # Stable, so pages with the same date keep the order of content/
+        dated.sort(key=lambda item: item[0], reverse=True)
+
+        sections, tags = {}, {}  # type: Dict[str, List[Page]], Dict[str, List[Page]]
+        years, months = {}, {}  # type: Dict[int, List[Page]], Dict[Bucket, List[Page]]
+        for date, page in dated:
+            sections.setdefault(page.html_directory, []).append(page)
+            for tag in page.tags:
+                tags.setdefault(tag, []).append(page)
+            years.setdefault(date.year, []).append(page)
+            months.setdefault((date.year, date.month), []).append(page)
+
+        self.by_date = tuple(page for _, page in dated)
+        self.by_section = _freeze(dict(sorted(sections.items())))
+        self.by_tag = _freeze(dict(sorted(tags.items())))
+        self.by_year = _freeze(years)
+        self.by_month = _freeze(months)
+
+    def __len__(self):
+        return len(self.by_date)
+
+    def archive(self, year: int, month: Optional[int] = None) -> Tuple[Page, ...]:
+        """Posts of a year, or of a month of that year"""
+        if month is None:
+            return self.by_year.get(year, ())
+        return self.by_month.get((year, month), ())
+
+    @property
+    def buckets(self) -> List[Bucket]:
+        """Every year and month with posts, newest first"""
+        buckets = []
+        for year in self.by_year:
+            buckets.append((year, None))
+            buckets.extend(key for key in self.by_month if key[0] == year)
+        return buckets
@@ -0,0 +1,148 @@
+import hashlib
+import re
+from typing import Dict, NamedTuple, Optional
+from urllib.request import urlopen
+
+from .exceptions import CLogException
+from .utils import get_logger
+
+LOG = get_logger(__name__)
+
+# `\[` alone is also the Markdown escape of a bracket, so display math must
+# close on the same line or start its own
+RE_MATH = re.compile(r"\$\$|\\\(|\\\[.*?\\\]|^\s*\\\[|\\begin\{")
+RE_FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+class Asset(NamedTuple):
+    """A third-party file that can be served from public/static/ instead of a CDN"""
+
+    filename: str
+    url: str
+
+
+HIGHLIGHTJS_SCRIPT = Asset(
+    "highlight.min.js",
+    "https://cdnjs.cloudflare.com/ajax/libs/highlight.js/9.18.1/highlight.min.js",
+)
+HIGHLIGHTJS_STYLE = Asset(
+    "highlight.min.css",
+    "https://cdnjs.cloudflare.com/ajax/libs/highlight.js/9.18.1/styles/default.min.css",
+)
+# MathJax 3 ships as a single file, unlike MathJax 2 which loads its
+# components relative to its own URL and cannot be vendored as one file
+MATHJAX_SCRIPT = Asset(
+    "tex-mml-chtml.js", "https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js"
+)
+MATHJAX_FONTS_URL = "https://cdn.jsdelivr.net/npm/mathjax@3/es5/output/chtml/fonts/woff-v2"
+# Loaded by MathJax by name from `fontURL`, so vendored into a directory
+# that is fingerprinted as a whole
+MATHJAX_FONTS = tuple(
+    Asset(f"MathJax_{name}.woff", f"{MATHJAX_FONTS_URL}/MathJax_{name}.woff")
+    for name in (
+        "AMS-Regular",
+        "Calligraphic-Bold",
+        "Calligraphic-Regular",
+        "Fraktur-Bold",
+        "Fraktur-Regular",
+        "Main-Bold",
+        "Main-Italic",
+        "Main-Regular",
+        "Math-BoldItalic",
+        "Math-Italic",
+        "Math-Regular",
+        "SansSerif-Bold",
+        "SansSerif-Italic",
+        "SansSerif-Regular",
+        "Script-Regular",
+        "Size1-Regular",
+        "Size2-Regular",
+        "Size3-Regular",
+        "Size4-Regular",
+        "Typewriter-Regular",
+        "Vector-Bold",
+        "Vector-Regular",
+        "Zero",
+    )
+)
+VENDORED_ASSETS = (HIGHLIGHTJS_SCRIPT, HIGHLIGHTJS_STYLE, MATHJAX_SCRIPT)
+
+
+def has_math(line: str) -> bool:
+    """Returns True if a Markdown line contains TeX delimiters recognised by
+    MathJax. Lines of fenced code blocks should not be passed"""
+    return RE_MATH.search(line) is not None
+
+
+def has_codeblock(line: str) -> bool:
+    return RE_FENCE.match(line) is not None
+
+
+def fingerprint(data: bytes, length=10) -> str:
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def cache_key(asset: Asset) -> str:
+    return hashlib.sha256(asset.url.encode("utf-8")).hexdigest()
+
+
+def fingerprinted_name(asset: Asset, digest: str) -> str:
+    """`highlight.min.js` becomes `highlight.min.<digest>.js`"""
+    stem, _, suffix = asset.filename.rpartition(".")
+    return f"{stem}.{digest}.{suffix}"
+
+
+class Vendor:
+    """Downloads third-party assets once into the `vendor` namespace of the
+    site's cache and copies them with fingerprinted filenames into the site's
+    static directory"""
+
+    def __init__(self, cache, base_url: str = "/"):
+        self.cache = cache
+        self.base_url = base_url.rstrip("/")
+        self.filenames = {}  # type: Dict[Asset, str]
+        self._data = {}  # type: Dict[Asset, bytes]
+
+    def fetch(self, asset: Asset) -> bytes:
+        key = cache_key(asset)
+        data = self.cache.get("vendor", key)
+        if data is not None:
+            return data
+        LOG.info("Downloading %s", asset.url)
+        try:
+            with urlopen(asset.url) as response:
+                data = response.read()
+        except OSError as ex:
+            raise CLogException(f"Cannot download {asset.url}: {ex}")
+        self.cache.put("vendor", key, data)
+        return data
+
+    def prepare(self, assets=VENDORED_ASSETS, fonts=MATHJAX_FONTS):
+        """Fetch `assets` and work out their fingerprinted filenames, and
+        `fonts` into a fingerprinted directory"""
+        for asset in assets:
+            self._data[asset] = self.fetch(asset)
+            self.filenames[asset] = fingerprinted_name(asset, fingerprint(self._data[asset]))
+        if not fonts:
+            return
+        data = [self.fetch(font) for font in fonts]
+        directory = f"mathjax-fonts.{fingerprint(b''.join(data))}"
+        for font, font_data in zip(fonts, data):
+            self._data[font] = font_data
+            self.filenames[font] = f"{directory}/{font.filename}"
+
+    def href(self, asset: Asset) -> str:
+        return f"{self.base_url}/static/vendor/{self.filenames[asset]}"
+
+    def fonts_href(self, fonts=MATHJAX_FONTS) -> Optional[str]:
+        """URL of the directory of vendored `fonts`, None if not vendored"""
+        if not fonts or fonts[0] not in self.filenames:
+            return None
+        return self.href(fonts[0]).rpartition("/")[0]
+
+    def publish(self, output):
+        """Copy the fingerprinted assets to a :class:`clog.output.Output`"""
+        for asset, filename in self.filenames.items():
+            rel_path = f"static/vendor/{filename}"
+            if not output.exists(rel_path):
+                output.write_bytes(rel_path, self._data[asset])
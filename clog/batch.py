@@ -0,0 +1,102 @@
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from .exceptions import CLogException, InvalidSite, MissingContent
+from .plugins import Pipeline
+
+
+class SharedResources:
+    """State shared by the sites built in one process: compiled templates of
+    identical themes, Markdown pipelines (and so their converters) of
+    identical configurations, and optionally one cache directory"""
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = cache_dir
+        self.templates = {}  # type: Dict[str, tuple]
+        self.pipelines = {}  # type: Dict[str, Pipeline]
+        # Templates and pipelines reused from another site
+        self.counters = Counter()
+
+
+class SiteResult(NamedTuple):
+    path: str
+    pages: int
+    duration: float
+    reused_templates: bool
+    error: Optional[str] = None
+
+
+def build_site(path: Path, shared: SharedResources) -> SiteResult:
+    """Build the site in `path`, reporting failures instead of raising them"""
+    from .models import Site
+
+    started = time.perf_counter()
+    reused = shared.counters["templates"]
+    try:
+        result = Site(Path(path).resolve(), shared=shared).build()
+    except Exception as ex:  # One broken site must not stop the others
+        duration = time.perf_counter() - started
+        if isinstance(ex, (CLogException, InvalidSite, MissingContent)):
+            error = str(ex) or type(ex).__name__
+        else:
+            error = f"{type(ex).__name__}: {ex}"
+        return SiteResult(str(path), 0, duration, False, error)
+    reused_templates = shared.counters["templates"] > reused
+    return SiteResult(str(path), len(result.pages), result.duration, reused_templates)
+
+
+# Resources of a worker process of `build_sites`
+_WORKER_RESOURCES = None  # type: Optional[SharedResources]
+
+
+def _init_worker(cache_dir: Optional[Path]):
+    global _WORKER_RESOURCES
+    _WORKER_RESOURCES = SharedResources(cache_dir)
+
+
+def _build_in_worker(path: Path) -> SiteResult:
+    return build_site(path, _WORKER_RESOURCES)
+
+
+def build_sites(
+    paths: Iterable[Path], jobs: int = 1, cache_dir: Optional[Path] = None
+) -> List[SiteResult]:
+    """Build several sites in this process, or in `jobs` worker processes,
+    each sharing templates, pipelines and caches between the sites it builds"""
+    paths = list(paths)
+    if jobs <= 1 or len(paths) <= 1:
+        shared = SharedResources(cache_dir)
+        return [build_site(path, shared) for path in paths]
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(cache_dir,)
+    ) as executor:
+        futures = [executor.submit(_build_in_worker, path) for path in paths]
+        results = []
+        for path, future in zip(paths, futures):
+            try:
+                results.append(future.result())
+            except Exception as ex:  # e.g. a worker that died
+                error = f"{type(ex).__name__}: {ex}"
+                results.append(SiteResult(str(path), 0, 0.0, False, error))
+        return results
+
+
+def read_sites(entries: Iterable[str]) -> List[Path]:
+    """Site directories from command line entries: directories, or files
+    listing one directory per line relative to the file (blank lines and
+    lines starting with # are skipped)"""
+    paths = []
+    for entry in entries:
+        path = Path(entry)
+        if not path.is_file():
+            paths.append(path)
+            continue
+        for line in path.read_text().splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(path.parent.joinpath(line))
+    return paths
+
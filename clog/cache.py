@@ -0,0 +1,289 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import jinja2
+from jinja2 import BytecodeCache
+
+from . import __version__
+from .exceptions import CLogException
+from .utils import get_logger
+
+LOG = get_logger(__name__)
+
+CACHE_DIR_ENV = "CLOG_CACHE_DIR"
+# Marker whose mtime records when the cache was last pruned, and which holds
+# the size of the cache after that
+PRUNE_MARKER = ".last-prune"
+PRUNE_INTERVAL = 3600
+UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+RE_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+
+
+def parse_size(value: Union[int, str, None]) -> Optional[int]:
+    """Parses sizes such as 500MB or 2G into bytes"""
+    if value is None or isinstance(value, int):
+        return value
+    match = RE_SIZE.match(str(value))
+    if match is None:
+        raise CLogException(f"Invalid size: {value}")
+    number, unit = match.groups()
+    return int(float(number) * UNITS[unit.upper()])
+
+
+def digest(*parts: Union[str, bytes]) -> str:
+    """Hash of `parts`, separated so that ("ab", "c") and ("a", "bc") differ"""
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode("utf-8") if isinstance(part, str) else part)
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def file_digest(path: Union[str, Path], chunk_size: int = 64 * 1024) -> str:
+    """Hash of the contents of a file, read in chunks"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as reader:
+        for chunk in iter(lambda: reader.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_tree(root: Path) -> str:
+    """Hash of the names and contents of every file under `root`"""
+    hasher = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root.as_posix()):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = Path(dirpath, filename)
+            hasher.update(path.relative_to(root).as_posix().encode("utf-8") + b"\0")
+            hasher.update(path.read_bytes())
+    return hasher.hexdigest()
+
+
+class Entry(NamedTuple):
+    path: Path
+    size: int
+    last_used: float
+
+
+class NamespaceStats(NamedTuple):
+    entries: int
+    size: int
+
+
+class Cache:
+    """Content-addressed cache on disk, shared by everything clog caches.
+
+    Entries are files named after their key, which must be a hash of
+    everything the value depends on, so an entry never has to be invalidated
+    and the directory can be shared between checkouts, branches and CI
+    runners. Writes go to a temporary file that is renamed into place, so
+    concurrent builds sharing the directory never see partial entries.
+
+    Each kind of data lives in its own namespace (`pages`, `html`, ...).
+    Reading an entry updates its mtime, which `prune` uses to evict the
+    least recently used entries once the cache is over `max_size` bytes,
+    and entries unused for more than `max_age` seconds. Besides the periodic
+    `maybe_prune`, writes prune the cache as soon as they take it over
+    `max_size`.
+    """
+
+    def __init__(
+        self, root: Path, max_size: Optional[int] = None, max_age: Optional[float] = None
+    ):
+        self.root = root
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = Counter()  # type: Counter
+        self.misses = Counter()  # type: Counter
+        # Size of the cache, tracked from the last prune once `put` needs it
+        self._size = None  # type: Optional[int]
+
+    def _path(self, namespace: str, key: str) -> Path:
+        return self.root.joinpath(namespace, key[:2], key)
+
+    def get(
+        self,
+        namespace: str,
+        key: str,
+        validate: Optional[Callable[[bytes], bool]] = None,
+    ) -> Optional[bytes]:
+        """Data of an entry, None if it is missing or `validate` rejects it,
+        e.g. because it depends on something that changed since"""
+        path = self._path(namespace, key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self.misses[namespace] += 1
+            return None
+        if validate is not None and not validate(data):
+            self.misses[namespace] += 1
+            return None
+        self.hits[namespace] += 1
+        try:
+            os.utime(path.as_posix())
+        except OSError:
+            pass  # Evicted by a concurrent prune
+        return data
+
+    def contains(self, namespace: str, key: str) -> bool:
+        """Whether an entry exists, without counting a hit or a miss"""
+        return self._path(namespace, key).is_file()
+
+    def put(self, namespace: str, key: str, data: bytes):
+        if self.max_size is not None:
+            self._recorded_size()  # Before this entry is written
+        path = self._path(namespace, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent.as_posix(), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as writer:
+                writer.write(data)
+            os.replace(temp_path, path.as_posix())
+        except OSError:
+            LOG.warning("Cannot write cache entry %s", path, exc_info=True)
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            return
+        if self.max_size is not None:
+            self._size += len(data)
+            if self._size > self.max_size:
+                self.prune()
+
+    def _recorded_size(self) -> int:
+        """Size of the cache, as recorded by the last prune plus the entries
+        written since by this process. Overwritten entries are counted
+        twice, which only makes the next prune come a little early"""
+        if self._size is None:
+            try:
+                self._size = int(self._marker.read_text())
+            except (FileNotFoundError, ValueError):
+                self._size = sum(e.size for e in self.entries())
+        return self._size
+
+    def get_json(self, namespace: str, key: str) -> Optional[dict]:
+        data = self.get(namespace, key)
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def put_json(self, namespace: str, key: str, value):
+        self.put(namespace, key, json.dumps(value).encode("utf-8"))
+
+    def namespaces(self) -> Iterable[str]:
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir())
+
+    def entries(self, namespace: Optional[str] = None) -> List[Entry]:
+        namespaces = self.namespaces() if namespace is None else [namespace]
+        entries = []
+        for name in namespaces:
+            for dirpath, _, filenames in os.walk(self.root.joinpath(name).as_posix()):
+                for filename in filenames:
+                    path = Path(dirpath, filename)
+                    try:
+                        stat = path.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append(Entry(path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def stats(self) -> Dict[str, NamespaceStats]:
+        return {
+            name: NamespaceStats(len(entries), sum(e.size for e in entries))
+            for name, entries in ((n, self.entries(n)) for n in self.namespaces())
+        }
+
+    def prune(
+        self, max_size: Optional[int] = None, max_age: Optional[float] = None
+    ) -> Tuple[int, int]:
+        """Evict entries unused for `max_age` seconds, then the least recently
+        used ones until the cache fits in `max_size` bytes. Returns the number
+        of entries and bytes removed"""
+        max_size = self.max_size if max_size is None else max_size
+        max_age = self.max_age if max_age is None else max_age
+        entries = sorted(self.entries(), key=lambda e: e.last_used)
+        total = sum(e.size for e in entries)
+        oldest_allowed = time.time() - max_age if max_age is not None else None
+        removed = freed = 0
+        for entry in entries:
+            too_old = oldest_allowed is not None and entry.last_used < oldest_allowed
+            too_big = max_size is not None and total - freed > max_size
+            if not (too_old or too_big):
+                continue
+            try:
+                entry.path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += entry.size
+        self._size = total - freed
+        self._marker.parent.mkdir(parents=True, exist_ok=True)
+        self._marker.write_text(str(self._size))
+        return removed, freed
+
+    @property
+    def _marker(self) -> Path:
+        return self.root.joinpath(PRUNE_MARKER)
+
+    def maybe_prune(self) -> Tuple[int, int]:
+        """Prune if limits are set and the cache was not pruned recently, so
+        that builds don't walk a large cache every time"""
+        if self.max_size is None and self.max_age is None:
+            return 0, 0
+        try:
+            if time.time() - self._marker.stat().st_mtime < PRUNE_INTERVAL:
+                return 0, 0
+        except FileNotFoundError:
+            pass
+        return self.prune()
+
+    def clear(self, namespace: Optional[str] = None):
+        for name in self.namespaces() if namespace is None else [namespace]:
+            shutil.rmtree(self.root.joinpath(name).as_posix(), ignore_errors=True)
+        # The size recorded by the last prune no longer holds
+        self._size = None
+        try:
+            self._marker.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class TemplateBytecodeCache(BytecodeCache):
+    """Stores compiled Jinja templates in the `templates` namespace of a
+    :class:`Cache`, so that themes are not recompiled by every build.
+
+    Templates compile differently with other versions of Jinja and clog and
+    with other `extensions`, which are all part of the key.
+    """
+
+    def __init__(self, cache: Cache, extensions: Iterable[type] = ()):
+        self.cache = cache
+        self.signature = digest(
+            __version__,
+            jinja2.__version__,
+            *sorted(f"{e.__module__}.{e.__qualname__}" for e in extensions),
+        )
+
+    def _key(self, bucket) -> str:
+        return digest(self.signature, bucket.key, bucket.checksum)
+
+    def load_bytecode(self, bucket):
+        data = self.cache.get("templates", self._key(bucket))
+        if data is not None:
+            bucket.bytecode_from_string(data)
+
+    def dump_bytecode(self, bucket):
+        self.cache.put("templates", self._key(bucket), bucket.bytecode_to_string())
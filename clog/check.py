@@ -0,0 +1,196 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import arrow
+import yaml
+from slugify import slugify
+
+from .discovery import Source
+from .exceptions import CLogException
+from .page import Page
+from .routes import Routes, reserved_dirs
+
+# Below this many headers to read, starting worker processes costs more than
+# it saves
+PARALLEL_THRESHOLD = 256
+
+
+class Problem(NamedTuple):
+    rel_path: str  # Path of the page relative to content/
+    message: str
+
+
+class Header(NamedTuple):
+    """Front matter of a page and the problems found while reading it"""
+
+    rel_path: str
+    rel_dir: str
+    meta: dict
+    problems: Tuple[str, ...]
+
+
+def _entry(page: Page, key: str, problems: List[str]):
+    try:
+        return page.meta.get_entry(key, None)
+    except (yaml.YAMLError, ValueError):
+        problems.append(f"cannot parse {key}")
+        return None
+
+
+def validate_meta(page: Page, is_toplevel: bool) -> List[str]:
+    """Checks the fields of a page's front matter that a build relies on"""
+    problems = []
+    title = _entry(page, "title", problems)
+    if title is None:
+        problems.append("missing title")
+    elif not isinstance(title, str):
+        problems.append(f"title must be text, not {title!r}")
+    elif not slugify(title):
+        problems.append(f"title {title!r} has no characters usable in a URL")
+
+    date = _entry(page, "date", problems)
+    if date is None:
+        if not is_toplevel:
+            problems.append("missing date")
+    else:
+        try:
+            arrow.get(date)
+        except (TypeError, ValueError):
+            problems.append(f"invalid date {date!r}")
+
+    tags = _entry(page, "tags", problems)
+    if tags is not None and (
+        not isinstance(tags, list) or not all(isinstance(t, str) for t in tags)
+    ):
+        problems.append(f"tags must be a list of text, not {tags!r}")
+    return problems
+
+
+def read_header(source: Source) -> Header:
+    """Reads and validates the front matter of `source`, stopping at its
+    closing delimeter so that the body of the page is never read"""
+    page, problems = Page(), []
+    # Lines are decoded one at a time as a text reader decodes ahead
+    with open(source.path, "rb") as fp:
+        for number, line in enumerate(fp, 1):
+            try:
+                page.meta.parse(line.decode("utf-8").strip())
+            except UnicodeDecodeError:
+                problems.append(f"line {number}: not valid UTF-8")
+                break
+            except ValueError:
+                problems.append(f"line {number}: expected `key = value` in front matter")
+                break
+            if page.meta.complete:
+                break
+    if not problems:
+        if not page.meta.complete:
+            problems.append("front matter is missing or not closed")
+        problems.extend(validate_meta(page, source.is_toplevel))
+    return Header(source.rel_path, source.rel_dir, page.meta.data, tuple(problems))
+
+
+class Checker:
+    """Lints the front matter of a site's pages without building it.
+
+    Only headers are read, in worker processes when there are many of them.
+    Besides the fields of each page, the URLs and aliases of all pages are
+    routed as a build would, to find those used more than once. When
+    checking a few `paths`, the other pages' front matter is taken from the
+    previous build's record if their sources have not changed since.
+    """
+
+    def __init__(self, site, jobs: Optional[int] = None):
+        self.site = site
+        self.jobs = jobs
+        self.checked = 0
+
+    def _read_headers(self, sources: List[Source]) -> List[Header]:
+        parallel = len(sources) >= PARALLEL_THRESHOLD if self.jobs is None else self.jobs > 1
+        if not parallel:
+            return [read_header(source) for source in sources]
+        jobs = self.jobs or os.cpu_count() or 1
+        chunksize = max(1, len(sources) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(read_header, sources, chunksize=chunksize))
+
+    def _collect_headers(self, sources: List[Source], selected: set) -> List[Header]:
+        metadata = self.site._load_page_metadata() if selected else {}
+        headers, unread = [], []
+        for source in sources:
+            previous = metadata.get(source.rel_path)
+            if source.rel_path in selected or not previous:
+                unread.append(source)
+            elif previous["mtime_ns"] == source.mtime_ns:
+                headers.append(Header(source.rel_path, source.rel_dir, previous["meta"], ()))
+            else:
+                unread.append(source)
+        return headers + self._read_headers(unread)
+
+    def check(self, paths: Optional[Iterable[str]] = None) -> List[Problem]:
+        """Returns the problems in every page, or only in `paths` relative to
+        the site's directory if given"""
+        if not self.site.config:
+            self.site.load_config()
+        sources = self.site.scan_content().sources
+        selected = set()
+        if paths is not None:
+            content_dir = self.site.content_dir.resolve()
+            for path in paths:
+                path = self.site.cwd.joinpath(path).resolve()
+                if content_dir in path.parents:
+                    selected.add(path.relative_to(content_dir).as_posix())
+            if not selected:
+                return []
+
+        headers = self._collect_headers(sources, selected)
+        headers.sort(key=lambda h: h.rel_path)
+        reported = selected or {h.rel_path for h in headers}
+        self.checked = len(reported & {h.rel_path for h in headers})
+        problems = [
+            Problem(h.rel_path, message)
+            for h in headers
+            if h.rel_path in reported
+            for message in h.problems
+        ]
+        problems.extend(
+            p for p in self._find_collisions(headers) if p.rel_path in reported
+        )
+        return sorted(problems)
+
+    def _find_collisions(self, headers: List[Header]) -> List[Problem]:
+        """Pages and aliases at the same URL as another page or alias, or as
+        a listing, found with the routing table builds use"""
+        routes = Routes(reserved_dirs(self.site.archives))
+        problems = []
+        for header in headers:
+            page = Page.from_meta(header.meta)
+            page.html_directory = header.rel_dir
+            try:
+                if page.is_draft and not self.site.include_drafts:
+                    continue
+                title = page.title
+                if not isinstance(title, str) or not page.title_slug:
+                    continue  # Reported by `validate_meta`
+                page.html_filename = page.slug
+            except (yaml.YAMLError, ValueError):
+                continue
+            try:
+                routes.add(header.rel_path, page)
+            except CLogException as ex:
+                problems.append(Problem(header.rel_path, str(ex)))
+            except (yaml.YAMLError, ValueError, TypeError):
+                problems.append(Problem(header.rel_path, "cannot parse aliases"))
+
+        for path, owners in routes.collisions():
+            url = f"/{path}/" if path else "/"
+            for rel_path in sorted(set(owners)):
+                if routes.is_reserved(path):
+                    message = f"URL {url} is used by a generated listing"
+                    problems.append(Problem(rel_path, message))
+                others = [o for o in owners if o != rel_path]
+                if others:
+                    message = f"URL {url} is also used by {', '.join(others)}"
+                    problems.append(Problem(rel_path, message))
+        return problems
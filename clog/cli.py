@@ -1,14 +1,31 @@
+import asyncio
+import contextlib
+import json
 import logging
 import os
 import subprocess
+import sys
+import time
+from datetime import datetime
 from pathlib import Path
 
 import click
 import tornado
+import tornado.ioloop
 from tornado import web
 
+from .batch import build_sites, read_sites
+from .cache import NamespaceStats, parse_size
+from .check import Checker
+from .daemon import BuildDaemon, find_daemon
+from .engines import available_engines, benchmark as benchmark_engine, create_engine
+from .events import JsonLinesWriter, ProgressBar
 from .exceptions import CLogException
 from .models import Site
+from .output import open_output
+from .page import read_markdown
+from .serve import load_test, make_app, page_urls
+from .telemetry import HISTORY_FILE, History, find_regressions
 
 logging.basicConfig(
     format="%(asctime)s [p%(process)s:%(pathname)s:%(lineno)d] %(levelname)s: %(message)s"
@@ -65,25 +82,414 @@ def develop(port):
 
 
 @main.command()
-def build():
-    click.secho("Transforming markdown to HTML")
+@click.option(
+    "--only",
+    multiple=True,
+    help="Only render pages matching a glob, section (posts/2024) or tag (tag:python)",
+)
+@click.option(
+    "--no-daemon", is_flag=True, help="Build in this process even if a daemon is running"
+)
+@click.option(
+    "--output",
+    "output_spec",
+    default=None,
+    help="Write to dir:<path>, tar:<path>, tar.gz:<path> or zip:<path>; - for stdout",
+)
+@click.option("--quiet", "-q", is_flag=True, help="Only show errors")
+@click.option("--jobs", default=None, type=int, help="Number of processes parsing pages")
+@click.option(
+    "--log-format",
+    type=click.Choice(["text", "jsonl"]),
+    default="text",
+    help="jsonl writes build events to stdout, one JSON object per line",
+)
+def build(only, no_daemon, output_spec, quiet, jobs, log_format):
+    # Events are only sent by builds in this process, and the daemon only
+    # writes to public/
+    in_process = no_daemon or log_format == "jsonl" or output_spec is not None
+    client = None if in_process else find_daemon(Path.cwd())
+    if client is not None:
+        response = client.request("build", only=list(only), jobs=jobs, quiet=quiet)
+        if not quiet:
+            click.echo(response.get("output", ""), nl=False)
+        if not response["ok"]:
+            click.echo(click.style(response["error"], fg="yellow"))
+            raise SystemExit(1)
+        if not quiet:
+            click.echo(click.style("Done!", bold=True))
+        return
+
     builder = Site(Path.cwd())
+    builder.jobs = jobs
+    if output_spec is not None:
+        _build_to_output(builder, output_spec, only, quiet, log_format)
+        return
+    stdout = sys.stdout
+    if log_format == "jsonl":
+        builder.events.subscribe(JsonLinesWriter(stdout))
+        # Keep messages out of the event stream
+        messages = sys.stderr
+    else:
+        messages = open(os.devnull, "w") if quiet else stdout
+        if not quiet and stdout.isatty():
+            builder.events.subscribe(ProgressBar(stdout))
 
     try:
-        builder.build()
-        click.echo(click.style("Done!", bold=True))
+        with contextlib.redirect_stdout(messages):
+            click.secho("Transforming markdown to HTML")
+            builder.build(only=only)
+            click.echo(click.style("Done!", bold=True))
     except CLogException as ex:
-        click.echo(click.style(ex, fg="yellow"))
+        builder.events.emit("error", message=str(ex))
+        click.echo(click.style(str(ex), fg="yellow"), err=quiet)
         raise SystemExit()
+    finally:
+        if messages not in (stdout, sys.stderr):
+            messages.close()
+
+
+@main.command("build-all")
+@click.argument("sites", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--jobs", default=1, help="Number of worker processes")
+@click.option(
+    "--cache-dir",
+    default=None,
+    type=click.Path(file_okay=False),
+    help="Cache directory shared by every site",
+)
+def build_all(sites, jobs, cache_dir):
+    """Build several sites in one process. SITES are site directories or
+    files listing one directory per line"""
+    paths = read_sites(sites)
+    started = time.perf_counter()
+    results = build_sites(
+        paths, jobs=jobs, cache_dir=None if cache_dir is None else Path(cache_dir)
+    )
+    elapsed = time.perf_counter() - started
+
+    click.echo(click.style(f"{'site':<40}{'pages':>8}{'seconds':>10}", bold=True))
+    for result in results:
+        line = f"{result.path:<40}{result.pages:>8}{result.duration:>10.2f}"
+        if result.error is not None:
+            click.echo(f"{line}  {click.style(result.error, fg='red')}")
+        elif result.reused_templates:
+            click.echo(f"{line}  {click.style('shared templates', dim=True)}")
+        else:
+            click.echo(line)
+    failed = [r for r in results if r.error is not None]
+    click.echo(
+        click.style(
+            f"Built {len(results) - len(failed)} of {len(results)} sites "
+            f"({sum(r.pages for r in results)} pages) in {elapsed:.2f}s",
+            bold=True,
+        )
+    )
+    if failed:
+        raise SystemExit(1)
+
+
+def _build_to_output(builder, spec, only, quiet, log_format):
+    to_stdout = spec.partition(":")[2] == "-"
+    if log_format == "jsonl":
+        if to_stdout:
+            raise click.UsageError("--log-format jsonl needs stdout for the events")
+        builder.events.subscribe(JsonLinesWriter(sys.stdout))
+    elif not quiet and sys.stderr.isatty():
+        builder.events.subscribe(ProgressBar(sys.stderr))
+    # Keep progress messages out of an archive streamed to stdout
+    messages = open(os.devnull, "w") if quiet else sys.stderr
+    try:
+        output = open_output(spec, stdout=sys.stdout.buffer)
+        with contextlib.redirect_stdout(messages), output:
+            result = builder.build(only=only, output=output)
+    except CLogException as ex:
+        builder.events.emit("error", message=str(ex))
+        click.echo(click.style(str(ex), fg="yellow"), err=True)
+        raise SystemExit(1)
+    finally:
+        if messages is not sys.stderr:
+            messages.close()
+    if not quiet:
+        click.echo(
+            click.style(
+                f"Done! Wrote {len(result.files)} files ({result.bytes_written} bytes)",
+                bold=True,
+            ),
+            err=True,
+        )
+
+
+@main.command()
+@click.argument("files", nargs=-1, type=click.Path())
+@click.option("--jobs", default=None, type=int, help="Number of worker processes")
+@click.option("--links", is_flag=True, help="Also check the links in public/")
+def check(files, jobs, links):
+    """Check the front matter of pages, or only of FILES, without building"""
+    site = Site(Path.cwd())
+    if not site.is_valid():
+        click.echo(click.style("Cannot find a site in the current directory", fg="yellow"))
+        raise SystemExit(1)
+    checker = Checker(site, jobs=jobs)
+    problems = checker.check(files or None)
+    for problem in problems:
+        path = site.content_dir.joinpath(problem.rel_path).relative_to(site.cwd)
+        click.echo(f"{path}: {click.style(problem.message, fg='red')}")
+    summary = f"Checked {checker.checked} pages, found {len(problems)} problems"
+    click.echo(click.style(summary, bold=True))
+    broken = []
+    if links:
+        if not site.publish_dir.exists():
+            click.echo(click.style("Run clog build before checking links", fg="yellow"))
+            raise SystemExit(1)
+        broken = site.find_broken_links(jobs=jobs)
+        for link in broken:
+            if link.source is not None:
+                page = site.content_dir.joinpath(link.source).relative_to(site.cwd)
+            else:
+                page = site.publish_dir.joinpath(link.page).relative_to(site.cwd)
+            click.echo(f"{page}: {click.style(link.reason, fg='red')}: {link.url}")
+        click.echo(click.style(f"Found {len(broken)} broken links", bold=True))
+    if problems or broken:
+        raise SystemExit(1)
+
+
+@main.command()
+@click.option("--json", "as_json", is_flag=True, help="Print machine-readable JSON")
+@click.option("--last", default=10, help="Number of recent builds to show")
+@click.option(
+    "--threshold",
+    default=0.2,
+    help="Flag metrics this fraction above the median of previous builds",
+)
+@click.option("--window", default=10, help="Number of previous builds in the median")
+def stats(as_json, last, threshold, window):
+    """Show build performance history and regressions"""
+    history = History(Path.cwd().joinpath(".clog", HISTORY_FILE))
+    records = history.load()
+    regressions = find_regressions(records, threshold=threshold, window=window)
+    if as_json:
+        data = {
+            "builds": records[-last:],
+            "regressions": [dict(r._asdict(), change=r.change) for r in regressions],
+        }
+        click.echo(json.dumps(data, indent=2))
+        return
+    if not records:
+        click.echo("No builds recorded yet")
+        return
+
+    click.echo(
+        f"{'when':<20}{'seconds':>10}{'pages':>8}{'parsed':>8}"
+        f"{'MB written':>12}{'peak MB':>10}"
+    )
+    for record in records[-last:]:
+        when = datetime.fromtimestamp(record["time"]).strftime("%Y-%m-%d %H:%M:%S")
+        click.echo(
+            f"{when:<20}{record['duration']:>10.2f}{record['pages']:>8}"
+            f"{record['parsed']:>8}{record['bytes_written'] / 1e6:>12.2f}"
+            f"{record['peak_rss'] / 1e6:>10.1f}"
+        )
+    for regression in regressions:
+        click.echo(
+            click.style(
+                f"Regression: {regression.metric} is {regression.value:.2f}, "
+                f"{regression.change:.0%} above the median of {regression.median:.2f}",
+                fg="red",
+            )
+        )
+
+
+@main.command()
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
+@click.option(
+    "--engine",
+    "engines",
+    multiple=True,
+    help="Engine to measure, all installed ones by default",
+)
+@click.option("--repeat", default=3, help="Times each file is converted")
+def benchmark(files, engines, repeat):
+    """Measure the throughput of the Markdown engines on the site's pages, or FILES"""
+    paths = [Path(f) for f in files]
+    if not paths:
+        paths = sorted(Path.cwd().joinpath("content").rglob("*.md"))
+    if not paths:
+        click.echo(click.style("No Markdown files to convert", fg="yellow"))
+        raise SystemExit(1)
+    texts = [read_markdown(path) for path in paths]
+    click.echo(f"{'engine':<18}{'docs/s':>10}{'MB/s':>8}{'seconds':>10}")
+    for name in engines or available_engines():
+        try:
+            result = benchmark_engine(create_engine(name), texts, repeat=repeat)
+        except CLogException as ex:
+            click.echo(click.style(str(ex), fg="yellow"))
+            continue
+        click.echo(
+            f"{name:<18}{result.documents_per_second:>10.1f}"
+            f"{result.megabytes_per_second:>8.2f}{result.seconds:>10.3f}"
+        )
+
+
+def _open_site_cache():
+    site = Site(Path.cwd())
+    if site.config_path.exists():
+        site.load_config()
+    return site.open_cache()
+
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+@main.group()
+def cache():
+    """Inspect and clean the build cache"""
+
+
+@cache.command("stats")
+def cache_stats():
+    """Show the size of each cache namespace"""
+    site_cache = _open_site_cache()
+    stats = site_cache.stats()
+    click.echo(f"Cache directory: {site_cache.root}")
+    rows = list(stats.items())
+    rows.append(
+        ("total", NamespaceStats(*map(sum, zip(*stats.values())) if stats else (0, 0)))
+    )
+    for namespace, entry in rows:
+        size = _format_size(entry.size)
+        click.echo(f"  {namespace:<12}{entry.entries:>8} entries {size:>10}")
+
+
+@cache.command("prune")
+@click.option("--max-size", default=None, help="Size to shrink the cache to, e.g. 500MB")
+@click.option("--max-age", default=None, type=float, help="Remove entries unused for days")
+def cache_prune(max_size, max_age):
+    """Evict least recently used entries"""
+    site_cache = _open_site_cache()
+    try:
+        removed, freed = site_cache.prune(
+            max_size=parse_size(max_size),
+            max_age=None if max_age is None else max_age * 86400,
+        )
+    except CLogException as ex:
+        click.echo(click.style(str(ex), fg="yellow"))
+        raise SystemExit(1)
+    click.echo(f"Removed {removed} entries ({_format_size(freed)})")
+
+
+@cache.command("clear")
+@click.option("--namespace", default=None, help="Only clear this namespace")
+def cache_clear(namespace):
+    """Remove every cache entry"""
+    _open_site_cache().clear(namespace)
+    click.echo("Cache cleared")
+
+
+@main.command()
+def daemon():
+    """Keep the site loaded in memory and build it on request"""
+    try:
+        server = BuildDaemon(Site(Path.cwd()))
+    except CLogException as ex:
+        click.echo(click.style(str(ex), fg="yellow"))
+        raise SystemExit(1)
+    click.echo(f"Listening on {server.path}")
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command()
+@click.option("--port", default=8000, help="Port to serve website")
+@click.option("--host", default="127.0.0.1", help="Address to listen on")
+def serve(port, host):
+    """Serve public/ with caching headers and compression like production"""
+    site = Site(Path.cwd())
+    if not site.publish_dir.exists():
+        click.echo("Cannot find public/ directory")
+        raise SystemExit(1)
+    app = make_app(site.publish_dir, site.manifest)
+    app.listen(port, address=host)
+    click.echo(f"Serving {site.publish_dir} on http://{host}:{port}/")
+    try:
+        tornado.ioloop.IOLoop.current().start()
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command()
+@click.option("--url", default="http://127.0.0.1:8000", help="Server to test")
+@click.option("--requests", "count", default=1000, help="Number of requests")
+@click.option("--concurrency", default=10, help="Requests in flight at once")
+@click.option("--encoding", default="gzip, br", help="Accept-Encoding to send")
+def loadtest(url, count, concurrency, encoding):
+    """Measure requests/sec and latency of a server running `clog serve`"""
+    paths = page_urls(Site(Path.cwd()).manifest)
+    if not paths:
+        click.echo("No pages found, build the site first")
+        raise SystemExit(1)
+    headers = {"Accept-Encoding": encoding} if encoding else None
+    result = asyncio.run(load_test(url, paths, count, concurrency, headers=headers))
+    click.echo(
+        f"{result.requests} requests to {len(paths)} pages in {result.duration:.2f}s: "
+        f"{result.requests_per_second:.0f} req/s, "
+        f"{_format_size(result.bytes_received / result.duration)}/s"
+    )
+    latencies = ", ".join(
+        f"p{p} {result.percentile(p) * 1000:.1f}ms" for p in (50, 90, 99)
+    )
+    click.echo(f"Latency: {latencies}, max {result.latencies[-1] * 1000:.1f}ms")
+    if result.errors:
+        click.echo(click.style(f"{result.errors} requests failed", fg="red"))
+        raise SystemExit(1)
+
+
+@main.command()
+@click.argument("build_name", required=False)
+@click.option("--list", "list_builds", is_flag=True, help="List the builds kept")
+def rollback(build_name, list_builds):
+    """Publish a previous build again (with atomicPublish)"""
+    site = Site(Path.cwd())
+    if list_builds:
+        site.load_config()
+        releases = site.releases
+        current = releases.current
+        for name in releases.list():
+            click.echo(f"{'*' if name == current else ' '} {name}")
+        return
+    try:
+        site.rollback(build_name)
+    except CLogException as ex:
+        click.echo(click.style(str(ex), fg="red", bold=True))
+        raise SystemExit(1)
 
 
 @main.command()
 @click.option(
     "--autocommit", default=True, help="Automatically commit changes", is_flag=True
 )
-def deploy(autocommit: bool):
-    click.secho("Deploying to gh-pages", bold=True)
+@click.option(
+    "--target", default=None, help="Copy changed files to a target such as dir:<path>"
+)
+@click.option("--jobs", default=8, help="Number of files transferred at once")
+def deploy(autocommit: bool, target, jobs):
     builder = Site(Path.cwd())
+    if target is not None:
+        try:
+            builder.deploy_to(target, jobs=jobs)
+        except (CLogException, OSError) as ex:
+            click.echo(click.style(str(ex), fg="red", bold=True))
+            raise SystemExit(1)
+        click.echo(click.style("Done!", bold=True))
+        return
+
+    click.secho("Deploying to gh-pages", bold=True)
     try:
         builder.deploy(autocommit=autocommit)
         click.echo(click.style("Done!", bold=True))
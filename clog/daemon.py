@@ -0,0 +1,149 @@
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+from pathlib import Path
+from typing import Optional
+
+from .exceptions import CLogException, InvalidSite, MissingContent
+from .models import Site
+from .utils import get_logger
+
+LOG = get_logger(__name__)
+
+SOCKET_NAME = "daemon.sock"
+
+
+def socket_path(cwd: Path) -> Path:
+    return cwd.joinpath(".clog", SOCKET_NAME)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handles one JSON request per line, replying with one JSON line"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"ok": False, "error": "Invalid request"}
+            else:
+                response = self.server.dispatch(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class BuildDaemon(socketserver.UnixStreamServer):
+    """Keeps a warm `Site` in memory and builds it on request.
+
+    Compiled templates, the Markdown converter and parsed pages survive
+    between requests, so a build only pays for the sources that changed.
+    Requests are handled one at a time, which keeps the `Site` consistent.
+
+    Requests are JSON objects with a `command`:
+      * `build` - build the site, optionally with `only` patterns and `jobs`
+      * `render` - return the HTML of the page at `path` in content/
+      * `invalidate` - forget parsed `paths` (all if omitted) and `templates`
+      * `ping` and `shutdown`
+    """
+
+    def __init__(self, site: Site):
+        self.site = site
+        self._stopping = False
+        self.path = socket_path(site.cwd)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            if DaemonClient(self.path).ping():
+                raise CLogException(f"A daemon is already listening on {self.path}")
+            self.path.unlink()
+        super().__init__(self.path.as_posix(), _Handler)
+
+    def dispatch(self, request: dict) -> dict:
+        command = request.get("command")
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                result = self._run(command, request)
+        except (CLogException, InvalidSite, MissingContent) as ex:
+            error = str(ex) or type(ex).__name__
+            return {"ok": False, "error": error, "output": output.getvalue()}
+        except Exception as ex:  # Keep serving after unexpected errors
+            LOG.exception("Request failed: %s", request)
+            return {"ok": False, "error": repr(ex), "output": output.getvalue()}
+        if request.get("quiet"):
+            return {"ok": True, "result": result, "output": ""}
+        return {"ok": True, "result": result, "output": output.getvalue()}
+
+    def _run(self, command, request):
+        if command == "ping":
+            return os.getpid()
+        if command == "build":
+            self.site.jobs = request.get("jobs")
+            self.site.build(only=request.get("only") or None)
+            return len(self.site.pages)
+        if command == "render":
+            return self.site.render_source(request["path"])
+        if command == "invalidate":
+            self.site.invalidate(request.get("paths"), request.get("templates", False))
+            return None
+        if command == "shutdown":
+            self._stopping = True
+            return None
+        raise CLogException(f"Unknown command: {command}")
+
+    def serve(self):
+        """Handle requests until a `shutdown` request arrives"""
+        try:
+            while not self._stopping:
+                self.handle_request()
+        finally:
+            self.server_close()
+
+    def server_close(self):
+        super().server_close()
+        if self.path.exists():
+            self.path.unlink()
+
+
+class DaemonClient:
+    def __init__(self, path: Path, timeout: Optional[float] = None):
+        self.path = path
+        self.timeout = timeout
+
+    def request(self, command: str, **kwargs) -> dict:
+        payload = dict(kwargs, command=command)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(self.timeout)
+            conn.connect(self.path.as_posix())
+            conn.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+            with conn.makefile("rb") as reader:
+                line = reader.readline()
+        if not line:
+            raise CLogException("Daemon closed the connection")
+        return json.loads(line)
+
+    def ping(self) -> bool:
+        try:
+            return self.request("ping").get("ok", False)
+        except OSError:
+            return False
+
+
+def find_daemon(cwd: Path) -> Optional[DaemonClient]:
+    """Returns a client for the daemon serving the site in `cwd`, if one is running"""
+    path = socket_path(cwd)
+    if not path.exists():
+        return None
+    client = DaemonClient(path, timeout=1)
+    try:
+        client.request("ping")
+    except (socket.timeout, TimeoutError):
+        # Busy with another request. Requests are handled in turn, so using
+        # it anyway waits for that build instead of running one alongside it
+        LOG.info("Daemon is busy, waiting for it")
+    except (OSError, ValueError, CLogException):
+        return None  # Left over from a daemon that is gone
+    client.timeout = None  # Builds may take longer than a ping
+    return client
@@ -0,0 +1,207 @@
+import csv
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+import yaml
+
+from . import __version__
+from .cache import Cache, digest, file_digest
+from .exceptions import CLogException
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:  # Optional, only needed for .toml data files
+        tomllib = None
+
+DATA_DIR = "data"
+
+
+def _load_yaml(path: Path):
+    with open(path, encoding="utf-8") as reader:
+        return yaml.safe_load(reader)
+
+
+def _load_json(path: Path):
+    with open(path, encoding="utf-8") as reader:
+        return json.load(reader)
+
+
+def _load_toml(path: Path):
+    if tomllib is None:
+        raise CLogException(f"{path.name}: reading TOML needs the tomli package")
+    with open(path, "rb") as reader:
+        return tomllib.load(reader)
+
+
+def _load_csv(path: Path):
+    with open(path, encoding="utf-8", newline="") as reader:
+        return list(csv.DictReader(reader))
+
+
+LOADERS = {
+    ".yaml": _load_yaml,
+    ".yml": _load_yaml,
+    ".json": _load_json,
+    ".toml": _load_toml,
+    ".csv": _load_csv,
+}
+
+
+class DataDirectory:
+    """Structured data files in a site's `data/` directory.
+
+    Files are known by their path without the extension, e.g. `team/people`
+    for `data/team/people.yaml`. A file is only parsed when it is first read
+    during a build, and parsed values are cached by the hash of the file.
+
+    While `reads` is a set, the names of the files read are added to it, so
+    that the pages depending on a file can be told apart.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.cache = None  # type: Optional[Cache]
+        self.reads = None  # type: Optional[Set[str]]
+        # Files parsed or restored from the cache during the build
+        self.counters = Counter()
+        self._files = None  # type: Optional[Dict[str, Path]]
+        self._values = {}  # type: Dict[str, object]
+        self._digests = {}  # type: Dict[str, str]
+        # Digest and value by path, reused while the file is unchanged
+        self._parsed = {}  # type: Dict[Path, Tuple[tuple, str, object]]
+
+    def reset(self, cache: Optional[Cache] = None):
+        """Start a new build, looking for changed files again"""
+        self.cache = cache
+        self.counters = Counter()
+        self._files = None
+        self._values = {}
+        self._digests = {}
+
+    @property
+    def files(self) -> Dict[str, Path]:
+        if self._files is None:
+            files = {}
+            for dirpath, dirnames, filenames in os.walk(self.root.as_posix()):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+                for filename in sorted(filenames):
+                    path = Path(dirpath, filename)
+                    if path.suffix not in LOADERS or filename.startswith("."):
+                        continue
+                    name = path.relative_to(self.root).with_suffix("").as_posix()
+                    if name in files:
+                        raise CLogException(
+                            f"{DATA_DIR}/{name}: found both {files[name].name} "
+                            f"and {path.name}"
+                        )
+                    files[name] = path
+            self._files = files
+        return self._files
+
+    def namespace(self, prefix: str = "") -> "DataNamespace":
+        return DataNamespace(self, prefix)
+
+    def digest(self, name: str) -> Optional[str]:
+        """Hash of the file `name`, None if it doesn't exist"""
+        if name not in self._digests:
+            path = self.files.get(name)
+            if path is None:
+                return None
+            stat = path.stat()
+            key = (stat.st_mtime_ns, stat.st_size)
+            previous = self._parsed.get(path)
+            if previous is not None and previous[0] == key:
+                self._digests[name] = previous[1]
+            else:
+                self._digests[name] = file_digest(path)
+                self._parsed.pop(path, None)
+        return self._digests[name]
+
+    def load(self, name: str):
+        """Parsed contents of the file `name`"""
+        if self.reads is not None:
+            self.reads.add(name)
+        if name in self._values:
+            return self._values[name]
+        path = self.files[name]
+        file_hash = self.digest(name)
+        previous = self._parsed.get(path)
+        if previous is not None and previous[1] == file_hash:
+            value = previous[2]
+        else:
+            value = self._parse(path, file_hash)
+            stat = path.stat()
+            self._parsed[path] = ((stat.st_mtime_ns, stat.st_size), file_hash, value)
+        self._values[name] = value
+        return value
+
+    def _parse(self, path: Path, file_hash: str):
+        key = digest(__version__, path.suffix, file_hash)
+        if self.cache is not None:
+            cached = self.cache.get_json("data", key)
+            if cached is not None:
+                self.counters["cached"] += 1
+                return cached["value"]
+        try:
+            value = LOADERS[path.suffix](path)
+        except (ValueError, yaml.YAMLError, csv.Error) as ex:
+            rel_path = path.relative_to(self.root).as_posix()
+            raise CLogException(f"{DATA_DIR}/{rel_path}: {ex}")
+        self.counters["parsed"] += 1
+        if self.cache is not None:
+            self._store(key, value)
+        return value
+
+    def _store(self, key: str, value):
+        """Cache `value` if it reads back the same from JSON. Values that
+        don't, e.g. with dates or with numbers as keys in YAML, are parsed
+        again next time"""
+        try:
+            encoded = json.dumps({"value": value})
+        except (TypeError, ValueError):
+            return
+        if json.loads(encoded)["value"] == value:
+            self.cache.put("data", key, encoded.encode("utf-8"))
+
+
+class DataNamespace:
+    """`site.data` in templates: attributes are data files, or directories of
+    data files, e.g. `site.data.team.people`"""
+
+    def __init__(self, directory: DataDirectory, prefix: str = ""):
+        self._directory = directory
+        self._prefix = prefix
+
+    def __getitem__(self, key: str):
+        name = self._prefix + key
+        files = self._directory.files
+        if name in files:
+            return self._directory.load(name)
+        if any(n.startswith(name + "/") for n in files):
+            return DataNamespace(self._directory, name + "/")
+        raise KeyError(key)
+
+    def __getattr__(self, key: str):
+        if key.startswith("_"):
+            raise AttributeError(key)
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def keys(self):
+        """Names of the files and directories in this namespace"""
+        names = set()
+        for name in self._directory.files:
+            if name.startswith(self._prefix):
+                names.add(name[len(self._prefix) :].split("/", 1)[0])
+        return sorted(names)
@@ -0,0 +1,255 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from .cache import file_digest
+from .exceptions import CLogException
+from .output import Manifest
+from .utils import get_logger
+
+LOG = get_logger(__name__)
+
+# Manifest of the deployed files, kept next to the target, e.g.
+# `/srv/www.clog-manifest.json`, so that it is not served. Deploys before
+# that kept it at the root of the target
+MANIFEST_NAME = ".clog-manifest.json"
+TARGETS = {}
+
+
+def register_target(scheme: str):
+    """Class decorator making a target available as `<scheme>:<location>`"""
+
+    def decorator(cls):
+        TARGETS[scheme] = cls
+        return cls
+
+    return decorator
+
+
+def local_manifest(root: Path, manifest: Optional[Manifest] = None) -> Dict[str, list]:
+    """`[size, digest]` of every file under `root`, using the digests
+    recorded by the build when they are still valid"""
+    entries = {}
+    for dirpath, dirnames, filenames in os.walk(root.as_posix()):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = Path(dirpath, filename)
+            rel_path = path.relative_to(root).as_posix()
+            digest = manifest.digest(rel_path) if manifest is not None else None
+            entries[rel_path] = [path.stat().st_size, digest or file_digest(path)]
+    return entries
+
+
+class DeployPlan(NamedTuple):
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+    unchanged: List[str]
+
+    @staticmethod
+    def compare(local: Dict[str, list], remote: Dict[str, list]) -> "DeployPlan":
+        added, changed, unchanged = [], [], []
+        for rel_path, entry in sorted(local.items()):
+            previous = remote.get(rel_path)
+            if previous is None:
+                added.append(rel_path)
+            elif list(previous) != list(entry):
+                changed.append(rel_path)
+            else:
+                unchanged.append(rel_path)
+        removed = sorted(set(remote) - set(local))
+        return DeployPlan(added, changed, removed, unchanged)
+
+    @property
+    def transfers(self) -> List[str]:
+        return self.added + self.changed
+
+
+class DeployResult(NamedTuple):
+    plan: DeployPlan
+    bytes_transferred: int
+    bytes_total: int
+    duration: float
+
+
+class Target:
+    """Destination of `clog deploy --target`.
+
+    A deploy reads the manifest recorded by the previous deploy, calls
+    `begin`, `put` for each added or changed file (from several threads),
+    `delete` for each removed file once every transfer is done, and finally
+    `commit` with the new manifest. `abort` is called instead of `commit`
+    if anything fails.
+    """
+
+    def read_manifest(self) -> Dict[str, list]:
+        raise NotImplementedError
+
+    def begin(self, plan: DeployPlan):
+        pass
+
+    def put(self, rel_path: str, source: Path):
+        raise NotImplementedError
+
+    def delete(self, rel_path: str):
+        raise NotImplementedError
+
+    def commit(self, manifest: Dict[str, list]):
+        raise NotImplementedError
+
+    def abort(self):
+        pass
+
+
+@register_target("dir")
+class DirectoryTarget(Target):
+    """Deploys to a directory, e.g. a mirror mounted over NFS.
+
+    With `atomic`, the new tree is assembled in a staging directory next to
+    the target, with unchanged files hard-linked from the current one, and
+    then swapped in. If the target is a symlink, it is atomically pointed at
+    the new tree; otherwise the old directory is renamed away and the new
+    one renamed into place. Without `atomic`, files are replaced one by one.
+    """
+
+    def __init__(self, location: str, atomic: bool = True):
+        self.path = Path(location).expanduser().absolute()
+        self.atomic = atomic
+        self.staging = None  # type: Optional[Path]
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path.with_name(self.path.name + MANIFEST_NAME)
+
+    def read_manifest(self) -> Dict[str, list]:
+        for path in (self.manifest_path, self.path.joinpath(MANIFEST_NAME)):
+            try:
+                return json.loads(path.read_text())
+            except (FileNotFoundError, ValueError):
+                continue
+        return {}
+
+    @property
+    def root(self) -> Path:
+        """Directory files are written to"""
+        return self.path if self.staging is None else self.staging
+
+    def begin(self, plan: DeployPlan):
+        if not self.atomic:
+            self.path.mkdir(parents=True, exist_ok=True)
+            return
+        live = self.path.resolve()
+        live.parent.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d%H%M%S")
+        self.staging = Path(tempfile.mkdtemp(prefix=f"{live.name}-{stamp}-", dir=live.parent))
+        for rel_path in plan.unchanged:
+            target = self.staging.joinpath(rel_path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(live.joinpath(rel_path), target)
+            except OSError:  # Not supported by the file system
+                shutil.copy2(live.joinpath(rel_path).as_posix(), target.as_posix())
+
+    def put(self, rel_path: str, source: Path):
+        target = self.root.joinpath(rel_path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if self.staging is not None:
+            shutil.copy2(source.as_posix(), target.as_posix())
+            return
+        # Replace in place without exposing a partially written file
+        fd, temp_path = tempfile.mkstemp(dir=target.parent.as_posix(), prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copy2(source.as_posix(), temp_path)
+            os.replace(temp_path, target.as_posix())
+        except OSError:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def delete(self, rel_path: str):
+        if self.staging is not None:
+            return  # Never linked into the staging directory
+        path = self.path.joinpath(rel_path)
+        if path.exists():
+            path.unlink()
+        # Remove directories left empty
+        for parent in path.parents:
+            if parent == self.path or any(parent.iterdir()):
+                break
+            parent.rmdir()
+
+    def commit(self, manifest: Dict[str, list]):
+        self._swap()
+        legacy = self.path.joinpath(MANIFEST_NAME)
+        if legacy.is_file():
+            legacy.unlink()
+        # Written once the files are in place, atomically
+        temp_path = self.manifest_path.with_name(f".{self.manifest_path.name}.tmp")
+        temp_path.write_text(json.dumps(manifest, sort_keys=True))
+        os.replace(temp_path.as_posix(), self.manifest_path.as_posix())
+
+    def _swap(self):
+        """Put the staged tree in place of the live one"""
+        if self.staging is None:
+            return
+        staging, self.staging = self.staging, None
+        if self.path.is_symlink():
+            previous = self.path.resolve()
+            link = self.path.with_name(f".{self.path.name}.link")
+            if os.path.lexists(link):
+                link.unlink()
+            link.symlink_to(staging)
+            os.replace(link.as_posix(), self.path.as_posix())
+            shutil.rmtree(previous.as_posix(), ignore_errors=True)
+        elif self.path.exists():
+            previous = self.path.with_name(f".{self.path.name}.old-{os.getpid()}")
+            os.rename(self.path.as_posix(), previous.as_posix())
+            os.rename(staging.as_posix(), self.path.as_posix())
+            shutil.rmtree(previous.as_posix(), ignore_errors=True)
+        else:
+            os.rename(staging.as_posix(), self.path.as_posix())
+
+    def abort(self):
+        if self.staging is not None:
+            shutil.rmtree(self.staging.as_posix(), ignore_errors=True)
+            self.staging = None
+
+
+def open_target(spec: str) -> Target:
+    """Creates a target from a `<scheme>:<location>` spec such as `dir:/srv/www`"""
+    scheme, _, location = spec.partition(":")
+    if not location or scheme not in TARGETS:
+        known = ", ".join(f"{s}:" for s in sorted(TARGETS))
+        raise CLogException(f"Unknown deploy target: {spec} (expected {known})")
+    return TARGETS[scheme](location)
+
+
+def deploy(
+    root: Path, target: Target, manifest: Optional[Manifest] = None, jobs: int = 8
+) -> DeployResult:
+    """Bring `target` up to date with the files under `root`, transferring
+    only the files whose size or digest differ from the target's manifest"""
+    started = time.perf_counter()
+    local = local_manifest(root, manifest)
+    plan = DeployPlan.compare(local, target.read_manifest())
+    target.begin(plan)
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            # list() re-raises the first failed transfer
+            list(executor.map(lambda p: target.put(p, root.joinpath(p)), plan.transfers))
+        # Removed last so that the old pages keep working during the transfer
+        for rel_path in plan.removed:
+            target.delete(rel_path)
+        target.commit(local)
+    except BaseException:
+        target.abort()
+        raise
+    transferred = sum(local[p][0] for p in plan.transfers)
+    total = sum(entry[0] for entry in local.values())
+    return DeployResult(plan, transferred, total, time.perf_counter() - started)
@@ -0,0 +1,157 @@
+import json
+import os
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from .utils import get_logger
+
+LOG = get_logger(__name__)
+
+IGNORE_FILE = ".clogignore"
+DRAFT_DIRS = ("drafts", "_drafts")
+CACHE_VERSION = 1
+
+
+class Source(NamedTuple):
+    """A Markdown file found under the content directory"""
+
+    path: str  # Absolute path to the file
+    rel_dir: str  # Directory relative to content/, "" for top-level pages
+    size: int
+    mtime_ns: int
+
+    @property
+    def rel_path(self) -> str:
+        name = os.path.basename(self.path)
+        return f"{self.rel_dir}/{name}" if self.rel_dir else name
+
+    @property
+    def is_toplevel(self) -> bool:
+        return self.rel_dir == ""
+
+
+def read_ignore_patterns(path: Path) -> List[str]:
+    """Reads glob patterns from a .clogignore file, one per line"""
+    if not path.exists():
+        return []
+    patterns = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            patterns.append(line.rstrip("/"))
+    return patterns
+
+
+class ContentIndex:
+    """Listing of the content directory built with a single `os.scandir` walk.
+
+    The listing of each directory is cached in `cache_path` together with the
+    directory's mtime. Directories whose mtime has not changed since the last
+    run had no entries added, removed or renamed, so their listing is reused
+    and only the files themselves are stat'ed again.
+    """
+
+    def __init__(
+        self,
+        content_dir: Path,
+        ignore: Optional[List[str]] = None,
+        include_drafts: bool = False,
+        cache_path: Optional[Path] = None,
+    ):
+        self.content_dir = content_dir
+        self.ignore = ignore or []
+        self.include_drafts = include_drafts
+        self.cache_path = cache_path
+        self.sources = []  # type: List[Source]
+        self.dirs_scanned = 0
+        self.dirs_reused = 0
+        self._listings = {}  # type: Dict[str, dict]
+
+    def is_ignored(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        if name.startswith("."):
+            return True
+        if is_dir and not self.include_drafts and name in DRAFT_DIRS:
+            return True
+        return any(
+            fnmatch(rel_path, pattern) or fnmatch(name, pattern)
+            for pattern in self.ignore
+        )
+
+    def _load_cache(self) -> Dict[str, dict]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            cached = json.loads(self.cache_path.read_text())
+        except ValueError:
+            return {}
+        settings = [self.ignore, self.include_drafts]
+        if cached.get("version") != CACHE_VERSION or cached.get("settings") != settings:
+            return {}
+        return cached.get("dirs", {})
+
+    def _save_cache(self):
+        if self.cache_path is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": CACHE_VERSION,
+            "settings": [self.ignore, self.include_drafts],
+            "dirs": self._listings,
+        }
+        self.cache_path.write_text(json.dumps(data))
+
+    def _list_dir(self, dirpath: str, rel_dir: str, mtime_ns: int, cached: dict):
+        """Returns the (subdirs, files) names of a directory"""
+        listing = cached.get(rel_dir)
+        if listing is not None and listing["mtime_ns"] == mtime_ns:
+            self.dirs_reused += 1
+            return listing["dirs"], listing["files"]
+
+        self.dirs_scanned += 1
+        dirs, files = [], []
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                is_dir = entry.is_dir()
+                if self.is_ignored(rel_path, entry.name, is_dir):
+                    continue
+                if is_dir:
+                    dirs.append(entry.name)
+                elif entry.name.endswith(".md"):
+                    files.append(entry.name)
+        dirs.sort()
+        files.sort()
+        return dirs, files
+
+    def scan(self) -> List[Source]:
+        cached = self._load_cache()
+        self.sources = []
+        self._listings = {}
+        self.dirs_scanned = self.dirs_reused = 0
+
+        pending = [("", self.content_dir.as_posix())]
+        while pending:
+            rel_dir, dirpath = pending.pop()
+            mtime_ns = os.stat(dirpath).st_mtime_ns
+            dirs, files = self._list_dir(dirpath, rel_dir, mtime_ns, cached)
+            self._listings[rel_dir] = {"mtime_ns": mtime_ns, "dirs": dirs, "files": files}
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                self.sources.append(Source(path, rel_dir, stat.st_size, stat.st_mtime_ns))
+            # Reversed so that directories are popped in sorted order
+            for name in reversed(dirs):
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                pending.append((rel_path, os.path.join(dirpath, name)))
+
+        self._save_cache()
+        LOG.debug(
+            "Scanned %s directories, reused %s cached listings",
+            self.dirs_scanned,
+            self.dirs_reused,
+        )
+        return self.sources
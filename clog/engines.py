@@ -0,0 +1,188 @@
+import time
+from typing import Iterable, List, NamedTuple, Optional
+
+from markdown import Markdown
+from markdown import __version__ as markdown_version
+
+from .exceptions import CLogException
+
+DEFAULT_ENGINE = "python-markdown"
+DEFAULT_EXTENSIONS = ["pymdownx.extra"]
+
+# Markdown engines that can be selected with `markdownEngine` in config.yaml
+ENGINES = {}
+
+
+def register_engine(name):
+    """Class decorator that makes an engine available by `name` in config.yaml"""
+
+    def _register(cls):
+        cls.name = name
+        ENGINES[name] = cls
+        return cls
+
+    return _register
+
+
+class Engine:
+    """Converts the Markdown of a page to HTML.
+
+    An engine is created once per pipeline (so once per worker process) and
+    reused for every page. `extensions` are Python-Markdown extensions; the
+    other engines provide the features of the default `pymdownx.extra`
+    themselves and reject any other extension.
+    """
+
+    name = None  # type: Optional[str]
+
+    def __init__(self, extensions: Iterable[str] = ()):
+        self.extensions = list(extensions)
+
+    @property
+    def version(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def signature(self) -> str:
+        """Identifies the HTML the engine produces, for use in cache keys"""
+        return f"{self.name}@{self.version}"
+
+    def convert(self, text: str) -> str:
+        raise NotImplementedError
+
+    def _check_extensions(self):
+        unsupported = [e for e in self.extensions if e not in DEFAULT_EXTENSIONS]
+        if unsupported:
+            raise CLogException(
+                f"The {self.name} engine does not support Markdown extensions: "
+                f"{', '.join(unsupported)}"
+            )
+
+
+@register_engine("python-markdown")
+class PythonMarkdownEngine(Engine):
+    """Python-Markdown with pymdown-extensions, the default"""
+
+    def __init__(self, extensions: Iterable[str] = ()):
+        super().__init__(extensions)
+        # Building a converter loads every extension, so one is kept and
+        # `reset()` between pages instead
+        self._markdown = Markdown(extensions=self.extensions)
+
+    @property
+    def version(self) -> str:
+        return markdown_version
+
+    def convert(self, text: str) -> str:
+        return self._markdown.reset().convert(text)
+
+
+@register_engine("markdown-it")
+class MarkdownItEngine(Engine):
+    """markdown-it-py, CommonMark with tables, strikethrough, footnotes and
+    definition lists (from mdit-py-plugins, if installed)"""
+
+    def __init__(self, extensions: Iterable[str] = ()):
+        super().__init__(extensions)
+        self._check_extensions()
+        try:
+            from markdown_it import MarkdownIt
+        except ImportError:
+            raise CLogException(
+                "The markdown-it engine needs the markdown-it-py package"
+            )
+        self._markdown = MarkdownIt("commonmark", {"html": True})
+        self._markdown.enable(["table", "strikethrough"])
+        try:
+            from mdit_py_plugins.deflist import deflist_plugin
+            from mdit_py_plugins.footnote import footnote_plugin
+        except ImportError:  # Optional, only needed for footnotes and deflists
+            pass
+        else:
+            self._markdown.use(footnote_plugin).use(deflist_plugin)
+
+    @property
+    def version(self) -> str:
+        import markdown_it
+
+        return markdown_it.__version__
+
+    def convert(self, text: str) -> str:
+        return self._markdown.render(text)
+
+
+@register_engine("mistune")
+class MistuneEngine(Engine):
+    """mistune, with tables, strikethrough, footnotes, definition lists and
+    abbreviations"""
+
+    PLUGINS = ["table", "strikethrough", "footnotes", "def_list", "abbr"]
+
+    def __init__(self, extensions: Iterable[str] = ()):
+        super().__init__(extensions)
+        self._check_extensions()
+        try:
+            import mistune
+        except ImportError:
+            raise CLogException("The mistune engine needs the mistune package")
+        # Raw HTML, e.g. from the codeblocks plugin, is passed through as is
+        self._markdown = mistune.create_markdown(escape=False, plugins=self.PLUGINS)
+
+    @property
+    def version(self) -> str:
+        import mistune
+
+        return mistune.__version__
+
+    def convert(self, text: str) -> str:
+        return self._markdown(text)
+
+
+def create_engine(name: Optional[str], extensions: Iterable[str] = ()) -> Engine:
+    """Creates the engine registered as `name`, the default one if None"""
+    name = name or DEFAULT_ENGINE
+    if name not in ENGINES:
+        known = ", ".join(sorted(ENGINES))
+        raise CLogException(f"Unknown Markdown engine: {name} (expected {known})")
+    return ENGINES[name](extensions)
+
+
+def available_engines() -> List[str]:
+    """Names of the registered engines whose packages are installed"""
+    names = []
+    for name in sorted(ENGINES):
+        try:
+            create_engine(name)
+        except CLogException:
+            continue
+        names.append(name)
+    return names
+
+
+class BenchmarkResult(NamedTuple):
+    engine: str
+    documents: int
+    bytes: int
+    seconds: float
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes / 1024 ** 2 / self.seconds if self.seconds else 0.0
+
+
+def benchmark(engine: Engine, texts: List[str], repeat: int = 3) -> BenchmarkResult:
+    """Converts every text `repeat` times with `engine`, after one untimed
+    pass to warm it up, and reports the throughput"""
+    for text in texts:
+        engine.convert(text)
+    size = sum(len(text.encode("utf-8")) for text in texts)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            engine.convert(text)
+    seconds = time.perf_counter() - started
+    return BenchmarkResult(engine.name, len(texts) * repeat, size * repeat, seconds)
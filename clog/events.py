@@ -0,0 +1,100 @@
+import json
+import time
+from typing import Callable, List, TextIO
+
+# Events emitted by `Site.build`, with their fields:
+#
+#   build_started    sources
+#   phase            name ("parse" or "render"), total
+#   pool_finished    jobs, batches, seconds, utilisation (parallel builds)
+#   file_parsed      path, seconds, parsed (False if reused or cached)
+#   cache_hit        namespace, path
+#   page_rendered    path, seconds, cached
+#   build_finished   seconds, pages, files, bytes_written
+#   error            message
+#
+# Every event also has `event`, its kind, and `time`, the seconds since the
+# build started.
+Handler = Callable[[dict], None]
+
+
+class EventBus:
+    """Dispatches build events to the handlers subscribed to them.
+
+    Emitting is nearly free while nobody is subscribed, so builds can report
+    every file without slowing down when nobody is listening.
+    """
+
+    def __init__(self):
+        self.handlers = []  # type: List[Handler]
+        self.started = time.perf_counter()
+
+    def subscribe(self, handler: Handler):
+        self.handlers.append(handler)
+
+    def unsubscribe(self, handler: Handler):
+        self.handlers.remove(handler)
+
+    def emit(self, kind: str, **data):
+        if not self.handlers:
+            return
+        if kind == "build_started":
+            self.started = time.perf_counter()
+        event = {"event": kind, "time": round(time.perf_counter() - self.started, 6)}
+        event.update(data)
+        for handler in self.handlers:
+            handler(event)
+
+
+class JsonLinesWriter:
+    """Writes each event as one line of JSON"""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def __call__(self, event: dict):
+        self.stream.write(json.dumps(event, default=str) + "\n")
+        self.stream.flush()
+
+
+class ProgressBar:
+    """Shows the progress of each phase of a build on one line of a
+    terminal, redrawn at most every `interval` seconds"""
+
+    WIDTH = 30
+
+    def __init__(self, stream: TextIO, interval: float = 0.1):
+        self.stream = stream
+        self.interval = interval
+        self.phase = None
+        self.total = 0
+        self.count = 0
+        self._drawn = 0.0
+
+    def __call__(self, event: dict):
+        kind = event["event"]
+        if kind in ("file_parsed", "page_rendered"):
+            self.count += 1
+            if event["time"] - self._drawn >= self.interval:
+                self._draw(event["time"])
+        elif kind == "phase":
+            self._finish()
+            self.phase, self.total, self.count = event["name"], event["total"], 0
+            self._draw(event["time"])
+        elif kind in ("build_finished", "error"):
+            self._finish()
+
+    def _draw(self, now: float):
+        self._drawn = now
+        total = max(self.total, self.count)
+        filled = self.WIDTH * self.count // total if total else self.WIDTH
+        bar = "#" * filled + "-" * (self.WIDTH - filled)
+        self.stream.write(f"\r  {self.phase:<8}[{bar}] {self.count}/{total}")
+        self.stream.flush()
+
+    def _finish(self):
+        if self.phase is not None:
+            self._draw(self._drawn)
+            self.stream.write("\n")
+            self.stream.flush()
+            self.phase = None
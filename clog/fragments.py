@@ -0,0 +1,101 @@
+import json
+from collections import Counter
+from typing import Callable, Dict, Hashable, List, Set, Tuple
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class FragmentCache:
+    """Rendered template fragments, kept for the duration of a build.
+
+    Fragments are looked up by a name and the values they depend on, so a
+    fragment is rendered once per build for each combination of values.
+    `hits` counts the renders saved by each fragment.
+
+    If a `tracker` is set, the names added to its `reads` set while a
+    fragment is rendered are added again each time the fragment is reused,
+    so that pages depend on the data files read by their fragments.
+    """
+
+    def __init__(self):
+        self._fragments = {}  # type: Dict[Hashable, Tuple[str, Set[str]]]
+        self.hits = Counter()
+        self.misses = Counter()
+        self.tracker = None
+
+    def clear(self):
+        self._fragments.clear()
+        self.hits.clear()
+        self.misses.clear()
+
+    def fetch(self, name: str, key: Hashable, render: Callable[[], str]) -> str:
+        """The fragment `name` for `key`, calling `render` on a miss"""
+        tracker = self.tracker
+        outer = None if tracker is None else tracker.reads
+        try:
+            fragment, reads = self._fragments[name, key]
+        except KeyError:
+            self.misses[name] += 1
+            if tracker is not None:
+                tracker.reads = set()
+            try:
+                fragment = render()
+            finally:
+                reads = set() if tracker is None else tracker.reads
+                if tracker is not None:
+                    tracker.reads = outer
+            self._fragments[name, key] = (fragment, reads)
+        else:
+            self.hits[name] += 1
+        if outer is not None:
+            outer.update(reads)
+        return fragment
+
+    def summary(self) -> List[Tuple[str, int, int]]:
+        """`(name, hits, renders)` of each fragment, most hits first"""
+        names = set(self.hits) | set(self.misses)
+        return sorted(
+            ((n, self.hits[n], self.hits[n] + self.misses[n]) for n in names),
+            key=lambda item: (-item[1], item[0]),
+        )
+
+
+def fragment_key(values) -> str:
+    """Key for the values a fragment depends on. Lists of pages should be
+    passed as attributes, e.g. `pages|map(attribute="href")|list`"""
+    return json.dumps(values, sort_keys=True, default=str)
+
+
+class FragmentCacheExtension(Extension):
+    """Adds `{% cache name[, dependency, ...] %}...{% endcache %}` to templates.
+
+    The block is rendered once per build for each set of dependency values,
+    so it must not use anything else that varies between pages::
+
+        {% cache "navigation", site.base_url %}
+          ...
+        {% endcache %}
+
+    The cache is `environment.fragment_cache`, shared by the site's
+    templates and cleared at the start of every build.
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render_fragment", [args[0], nodes.List(args[1:])])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, name, dependencies, caller):
+        cache = self.environment.fragment_cache
+        return cache.fetch(str(name), fragment_key(dependencies), caller)
@@ -0,0 +1,232 @@
+import codecs
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import unquote, urljoin, urlsplit
+
+from .cache import file_digest
+from .utils import get_logger
+
+LOG = get_logger(__name__)
+
+STATE_VERSION = 1
+PARALLEL_THRESHOLD = 256
+CHUNK_SIZE = 64 * 1024
+# Attribute holding the URL of each element that links to another file
+LINK_ATTRIBUTES = {
+    "a": "href",
+    "area": "href",
+    "link": "href",
+    "img": "src",
+    "script": "src",
+    "iframe": "src",
+    "source": "src",
+}
+# Fragments that browsers handle without a matching element
+IMPLICIT_FRAGMENTS = ("", "top")
+
+
+class BrokenLink(NamedTuple):
+    page: str  # Output file containing the link
+    source: Optional[str]  # Path of the page in content/, None for listings
+    url: str
+    reason: str
+
+
+class _LinkParser(HTMLParser):
+    """Collects element ids and linked URLs, fed one chunk at a time"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.ids = set()  # type: Set[str]
+        self.urls = []  # type: List[str]
+
+    def handle_starttag(self, tag, attrs):
+        attribute = LINK_ATTRIBUTES.get(tag)
+        for name, value in attrs:
+            if value is None:
+                continue
+            if name == "id" or (tag == "a" and name == "name"):
+                self.ids.add(value)
+            elif name == attribute:
+                self.urls.append(value.strip())
+
+
+def scan_html(path: str) -> Tuple[str, List[str], List[str]]:
+    """Returns the digest, element ids and linked URLs of an HTML file"""
+    hasher = hashlib.sha256()
+    parser = _LinkParser()
+    # Characters split between two chunks are decoded with the second one
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(path, "rb") as reader:
+        for chunk in iter(lambda: reader.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+            parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return hasher.hexdigest(), sorted(parser.ids), parser.urls
+
+
+def _index_of(path: str) -> str:
+    return f"{path}/index.html" if path else "index.html"
+
+
+class LinkChecker:
+    """Checks the internal links and anchors of the HTML files under `root`.
+
+    Every file is parsed once with a streaming parser, in worker processes
+    when there are many, to collect its element ids and links. The results
+    are kept in `state_path`, so later runs only parse files whose content
+    changed and only re-check the links of those files and of files linking
+    to pages that were added, removed or lost an anchor.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        state_path: Optional[Path] = None,
+        base_url: str = "/",
+        sources: Optional[Dict[str, str]] = None,
+        jobs: Optional[int] = None,
+    ):
+        self.root = root
+        self.state_path = state_path
+        self.base = urlsplit(base_url)
+        self.sources = sources or {}
+        self.jobs = jobs
+        self.parsed = 0
+        self.rechecked = 0
+
+    def resolve(self, page: str, url: str) -> Optional[Tuple[str, str]]:
+        """Returns the path under `root` and fragment a link on `page`
+        points to, or None if the link leaves the site"""
+        target = urlsplit(urljoin(f"/{page}", url))
+        if target.scheme not in ("", "http", "https"):
+            return None  # mailto:, javascript:, data:, ...
+        if target.netloc and target.netloc != self.base.netloc:
+            return None
+        path = unquote(target.path)
+        base_path = self.base.path.rstrip("/")
+        if base_path.startswith("/") and path.startswith(f"{base_path}/"):
+            path = path[len(base_path) :]
+        return path.strip("/"), unquote(target.fragment)
+
+    def _load_state(self) -> dict:
+        if self.state_path is None or not self.state_path.exists():
+            return {}
+        try:
+            state = json.loads(self.state_path.read_text())
+        except ValueError:
+            return {}
+        return state if state.get("version") == STATE_VERSION else {}
+
+    def _save_state(self, paths: List[str], pages: Dict[str, dict]):
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        state = {"version": STATE_VERSION, "paths": paths, "pages": pages}
+        self.state_path.write_text(json.dumps(state))
+
+    def _list_files(self) -> List[str]:
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(self.root.as_posix()):
+            dirnames.sort()
+            rel_dir = os.path.relpath(dirpath, self.root.as_posix())
+            for filename in sorted(filenames):
+                paths.append(filename if rel_dir == "." else f"{rel_dir}/{filename}")
+        return paths
+
+    def _scan(self, paths: List[str]) -> List[Tuple[str, List[str], List[str]]]:
+        full_paths = [self.root.joinpath(p).as_posix() for p in paths]
+        parallel = len(paths) >= PARALLEL_THRESHOLD if self.jobs is None else self.jobs > 1
+        if not parallel:
+            return [scan_html(path) for path in full_paths]
+        jobs = self.jobs or os.cpu_count() or 1
+        chunksize = max(1, len(paths) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(scan_html, full_paths, chunksize=chunksize))
+
+    def _collect_pages(self, html_paths: List[str], previous: Dict[str, dict]):
+        """Returns the ids and links of every HTML file, and the files that
+        were parsed again"""
+        pages, pending = {}, []
+        for rel_path in html_paths:
+            stat = os.stat(self.root.joinpath(rel_path))
+            entry = previous.get(rel_path)
+            if entry is not None and [entry["mtime_ns"], entry["size"]] == [
+                stat.st_mtime_ns,
+                stat.st_size,
+            ]:
+                pages[rel_path] = entry
+                continue
+            if entry is not None and entry["digest"] == file_digest(
+                self.root.joinpath(rel_path).as_posix()
+            ):
+                # Rewritten with the same content, e.g. by a full rebuild
+                pages[rel_path] = dict(entry, mtime_ns=stat.st_mtime_ns)
+                continue
+            pending.append(rel_path)
+            pages[rel_path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+        for rel_path, (digest, ids, urls) in zip(pending, self._scan(pending)):
+            links = []
+            for url in urls:
+                target = self.resolve(rel_path, url)
+                if target is not None:
+                    links.append([url, target[0], target[1]])
+            pages[rel_path].update(digest=digest, ids=ids, links=links)
+        self.parsed = len(pending)
+        return pages, set(pending)
+
+    def check(self) -> List[BrokenLink]:
+        state = self._load_state()
+        previous = state.get("pages", {})
+        paths = self._list_files()
+        files = set(paths)
+        html_paths = [p for p in paths if p.endswith((".html", ".htm"))]
+        pages, parsed = self._collect_pages(html_paths, previous)
+
+        # Links to these files may have been fixed or broken since last run
+        changed = files.symmetric_difference(state.get("paths", []))
+        changed.update(
+            p
+            for p in parsed
+            if p not in previous or previous[p].get("ids") != pages[p]["ids"]
+        )
+
+        self.rechecked = 0
+        broken = []
+        for rel_path in html_paths:
+            page = pages[rel_path]
+            recheck = rel_path in parsed or "problems" not in page or any(
+                path in changed or _index_of(path) in changed
+                for _, path, _ in page["links"]
+            )
+            if recheck:
+                self.rechecked += 1
+                page["problems"] = self._check_page(rel_path, page, files, pages)
+            source = self.sources.get(rel_path)
+            broken.extend(BrokenLink(rel_path, source, *p) for p in page["problems"])
+        self._save_state(paths, pages)
+        LOG.debug("Parsed %s pages, re-checked %s", self.parsed, self.rechecked)
+        return broken
+
+    def _check_page(self, rel_path: str, page: dict, files: Set[str], pages: dict):
+        problems = []
+        for url, path, fragment in page["links"]:
+            if path in files:
+                target = path
+            elif _index_of(path) in files:
+                target = _index_of(path)
+            else:
+                problems.append([url, "page not found"])
+                continue
+            if fragment in IMPLICIT_FRAGMENTS or target not in pages:
+                continue
+            if fragment not in pages[target]["ids"]:
+                problems.append([url, f"anchor #{fragment} not found"])
+        return problems
@@ -0,0 +1,134 @@
+import re
+from typing import Iterable, Iterator
+
+# Elements whose content is whitespace sensitive and is copied verbatim
+PRESERVED_TAGS = ("pre", "code", "textarea", "script", "style")
+RE_SPECIAL = re.compile(
+    r"<!--|<({})(?=[\s>/])".format("|".join(PRESERVED_TAGS)), re.IGNORECASE
+)
+RE_WHITESPACE = re.compile(r"\s+")
+# Longest closing tag that may be split across two chunks
+_TAIL = max(len(f"</{tag}") for tag in PRESERVED_TAGS)
+
+
+def _collapse(text: str) -> str:
+    """Collapses runs of whitespace, keeping a line break if the run had one"""
+    return RE_WHITESPACE.sub(lambda m: "\n" if "\n" in m.group() else " ", text)
+
+
+class HtmlMinifier:
+    """Streaming HTML minifier.
+
+    Only changes that cannot alter how a page renders are made: runs of
+    whitespace are collapsed to a single character and comments are dropped,
+    except for IE conditional comments. The content of `<pre>`, `<code>`,
+    `<textarea>`, `<script>` and `<style>` is left untouched.
+
+    Chunks are fed as the template produces them, so a page never has to be
+    held in memory twice. A minifier keeps no state between pages other than
+    its byte counters, so use one instance per page.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._preserve = None  # Name of the element being copied verbatim
+        self._ends_with_space = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _collapse(self, text: str) -> str:
+        text = _collapse(text)
+        # Whitespace on both sides of a dropped comment or a chunk boundary
+        if self._ends_with_space and text[:1] in (" ", "\n"):
+            text = text[1:]
+        return self._verbatim(text)
+
+    def _verbatim(self, text: str) -> str:
+        if text:
+            self._ends_with_space = text[-1].isspace()
+        return text
+
+    def _emit(self, text: str) -> str:
+        self.bytes_out += len(text.encode("utf-8"))
+        return text
+
+    def feed(self, chunk: str) -> str:
+        self.bytes_in += len(chunk.encode("utf-8"))
+        self._buffer += chunk
+        return self._drain(final=False)
+
+    def close(self) -> str:
+        return self._drain(final=True)
+
+    def _drain(self, final: bool) -> str:
+        out = []
+        buffer = self._buffer
+        while buffer:
+            if self._preserve is not None:
+                close = f"</{self._preserve}"
+                end = buffer.lower().find(close)
+                if end == -1:
+                    # Keep enough of the tail to recognise a split closing tag
+                    cut = len(buffer) if final else max(len(buffer) - _TAIL, 0)
+                    out.append(self._verbatim(buffer[:cut]))
+                    buffer = buffer[cut:]
+                    break
+                out.append(self._verbatim(buffer[:end]))
+                buffer = buffer[end:]
+                self._preserve = None
+                continue
+
+            match = RE_SPECIAL.search(buffer)
+            if match is None:
+                # Whitespace may continue in the next chunk, so stop at the last tag
+                cut = len(buffer) if final else buffer.rfind("<")
+                if cut <= 0:
+                    if final:
+                        out.append(self._collapse(buffer))
+                        buffer = ""
+                    break
+                out.append(self._collapse(buffer[:cut]))
+                buffer = buffer[cut:]
+                continue
+
+            out.append(self._collapse(buffer[: match.start()]))
+            buffer = buffer[match.start() :]
+            if match.group(1) is None:
+                end = buffer.find("-->")
+                if end == -1:
+                    if final:
+                        out.append(self._verbatim(buffer))
+                        buffer = ""
+                    break
+                comment = buffer[: end + 3]
+                if comment.startswith("<!--[if") or comment.startswith("<!--<!"):
+                    out.append(self._verbatim(comment))
+                buffer = buffer[end + 3 :]
+            else:
+                end = buffer.find(">")
+                if end == -1:
+                    if final:
+                        out.append(self._verbatim(buffer))
+                        buffer = ""
+                    break
+                out.append(self._verbatim(buffer[: end + 1]))
+                buffer = buffer[end + 1 :]
+                self._preserve = match.group(1).lower()
+
+        self._buffer = buffer
+        return self._emit("".join(out))
+
+
+def minify_stream(chunks: Iterable[str], minifier: HtmlMinifier = None) -> Iterator[str]:
+    minifier = HtmlMinifier() if minifier is None else minifier
+    for chunk in chunks:
+        text = minifier.feed(chunk)
+        if text:
+            yield text
+    text = minifier.close()
+    if text:
+        yield text
+
+
+def minify_html(html: str) -> str:
+    return "".join(minify_stream([html]))
@@ -1,12 +1,17 @@
+import copy
+import json
 import os
+import posixpath
 import shutil
+import time
+from collections import Counter
 from datetime import datetime
 from os.path import exists as path_exists
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Union, Optional, List
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 
-import click
+import arrow
 import yaml
 from jinja2 import Environment, PackageLoader, TemplateNotFound, Template
 
@@ -17,10 +22,96 @@ from .exceptions import (
     GitPermissionDenied,
     GitException,
 )
+from . import __version__
+from .archive import Collections, archive_path, buckets_of
+from .assets import (
+    Asset,
+    HIGHLIGHTJS_SCRIPT,
+    HIGHLIGHTJS_STYLE,
+    MATHJAX_FONTS_URL,
+    MATHJAX_SCRIPT,
+    Vendor,
+)
+from .cache import (
+    CACHE_DIR_ENV,
+    Cache,
+    TemplateBytecodeCache,
+    digest,
+    file_digest,
+    hash_tree,
+    parse_size,
+)
+from .data import DATA_DIR, DataDirectory, DataNamespace
+from .deploy import DeployResult, Target, deploy, open_target
+from .discovery import IGNORE_FILE, ContentIndex, Source, read_ignore_patterns
+from .events import EventBus
+from .fragments import FragmentCache, FragmentCacheExtension
+from .links import BrokenLink, LinkChecker
+from .minify import HtmlMinifier, minify_stream
+from .output import DirectoryOutput, Manifest, Output, precompress
 from .page import Page
+from .plugins import Pipeline
+from .publish import Releases, StagedOutput
+from .routes import Routes, normalize, page_path, redirect_html, reserved_dirs
+from .schedule import COSTS_FILE, CostModel, parse_in_pool
+from .selection import Selection
+from .split import part_navigation
+from .telemetry import HISTORY_FILE, History, PhaseTimer, peak_rss
 from .utils import get_logger, secho, run, GitStatus, git_status, reset
 
 LOG = get_logger(__name__)
+SOURCE_DATE_EPOCH = "SOURCE_DATE_EPOCH"
+MANIFEST_FILE = "manifest.json"
+
+
+class Affected(NamedTuple):
+    """Listings to render again in a selective build, and the pages of the
+    previous build whose URLs may no longer be used"""
+
+    tags: set
+    archives: set
+    stale: list
+
+
+class BuildResult:
+    """Summary of a build returned by :meth:`Site.build`"""
+
+    def __init__(self, site: "Site", output: Output, duration: float):
+        self.pages = list(site.pages)
+        self.output = output
+        self.duration = duration
+        self.phases = dict(site.timer.phases)
+        self.counters = Counter(site.counters)
+        # Whether only some pages were rendered, with `only`
+        self.selective = site.selective
+
+    @property
+    def files(self) -> Dict[str, int]:
+        """Size in bytes of each file written, by path relative to the output"""
+        return self.output.written
+
+    @property
+    def bytes_written(self) -> int:
+        return self.output.bytes_written
+
+    def record(self) -> dict:
+        """Compact summary of the build for the build history"""
+        return {
+            "time": int(time.time()),
+            "version": __version__,
+            "duration": round(self.duration, 4),
+            "phases": {k: round(v, 4) for k, v in self.phases.items()},
+            "pages": len(self.pages),
+            "selective": self.selective,
+            "rendered": self.counters.get("rendered", 0),
+            "parsed": self.counters.get("parsed", 0),
+            "reused": self.counters.get("reused", 0),
+            "cache_hits": self.counters.get("cache_hits", 0),
+            "cache_misses": self.counters.get("cache_misses", 0),
+            "files": len(self.files),
+            "bytes_written": self.bytes_written,
+            "peak_rss": peak_rss(),
+        }
 
 
 class Site:
@@ -32,20 +123,64 @@ class Site:
         CURRENT_FILE.joinpath("../_templates/themes/basic/").resolve().as_posix()
     )
 
-    def __init__(self, cwd: Union[Path, str]):
+    def __init__(self, cwd: Union[Path, str], shared=None):
         self.config = {}
+        # `clog.batch.SharedResources` when building several sites at once
+        self.shared = shared
         self.cwd = Path(cwd).resolve().absolute() if isinstance(cwd, str) else cwd
         self.content_dir = self.cwd.joinpath("content").resolve()
-        self.publish_dir = self.cwd.joinpath("public").resolve()
+        # Not resolved, it's a symlink to the current build with atomicPublish
+        self.publish_dir = self.cwd.joinpath("public").absolute()
         self.config_path = self.cwd.joinpath("config.yaml").resolve()
+        # Build state kept between runs, e.g. the content listing cache
+        self.state_dir = self.cwd.joinpath(".clog")
+        self.index = None  # type: Optional[ContentIndex]
         self._theme_dir = None  # type: Optional[Path]
         self.pages = []  # type: List[Page]
         self.toplevel_pages: Optional[List[Page]] = []
         self.tags = set()
+        # Sorted views of `pages`, computed once the pages are known
+        self.collections = Collections()
+        # Page behind every URL, computed once the pages are known
+        self.routes = Routes()
         self.template_index: Optional[Template] = None
         self.template_list: Optional[Template] = None
         self.template_index: Optional[Template] = None
         self.template_single: Optional[Template] = None
+        self.pipeline = Pipeline()
+        # Plugins and Markdown engine the pipeline was made for
+        self._pipeline_key = None  # type: Optional[str]
+        # Bytes of HTML rendered and removed by the minifier during the build
+        self.bytes_rendered = 0
+        self.bytes_saved = 0
+        # Page whose single page is being rendered, None for listings
+        self.current_page = None  # type: Optional[Page]
+        # Template fragments and site-wide markup rendered once per build
+        self.fragments = FragmentCache()
+        # Files in data/, exposed to templates as `site.data`
+        self.data_files = DataDirectory(self.cwd.joinpath(DATA_DIR))
+        self.fragments.tracker = self.data_files
+        self.vendor = None  # type: Optional[Vendor]
+        self.output = DirectoryOutput(self.publish_dir)  # type: Output
+        self.cache = None  # type: Optional[Cache]
+        self._render_context_hash = None  # type: Optional[str]
+        self.build_time = None  # type: Optional[arrow.Arrow]
+        self.timer = PhaseTimer()
+        # Pages parsed or reused, cache hits and misses, ... during the build
+        self.counters = Counter()
+        self.selective = False
+        # Progress of builds, for progress bars and `--log-format jsonl`
+        self.events = EventBus()
+        # Worker processes parsing pages, overriding `jobs` in config.yaml
+        self.jobs = None  # type: Optional[int]
+        # Time taken to parse each page, to schedule the workers
+        self.costs = CostModel(self.state_dir.joinpath(COSTS_FILE))
+        # Pages parsed by workers during the build: to_cache() data, seconds
+        self._parsed_by_workers = {}  # type: Dict[str, Tuple[dict, float, dict]]
+        # Cache keys of the sources, by path, mtime and size
+        self._page_keys = {}  # type: Dict[tuple, Optional[str]]
+        # Parsed pages by source path, reused while the source is unchanged
+        self._parsed = {}  # type: Dict[str, Tuple[tuple, Page]]
 
     @property
     def theme_dir(self):
@@ -53,7 +188,21 @@ class Site:
 
     @theme_dir.setter
     def theme_dir(self, value):
+        if value == self._theme_dir and self.template_single is not None:
+            return  # Templates are already compiled
         self._theme_dir = value
+        key = None
+        if self.shared is not None:
+            # Sites with identical themes share their compiled templates
+            key = hash_tree(value)
+            if key in self.shared.templates:
+                self.shared.counters["templates"] += 1
+                (
+                    self.template_index,
+                    self.template_list,
+                    self.template_single,
+                ) = self.shared.templates[key]
+                return
         try:
             self.template_index = self._get_template(
                 package_path=self.theme_dir.as_posix(), template="index.html"
@@ -71,6 +220,146 @@ class Site:
             package_path=self.theme_dir.joinpath("layouts", "_default").as_posix(),
             template="single.html",
         )
+        if key is not None:
+            templates = (self.template_index, self.template_list, self.template_single)
+            self.shared.templates[key] = templates
+
+    @property
+    def include_drafts(self):
+        return bool(self.config.get("buildDrafts", False))
+
+    @property
+    def vendor_assets(self):
+        return bool(self.config.get("vendorAssets", False))
+
+    @property
+    def reproducible(self):
+        """Reproducible builds pin the build time and order all output"""
+        return bool(self.config.get("reproducible", False)) or (
+            SOURCE_DATE_EPOCH in os.environ
+        )
+
+    def _build_time(self):
+        """Time the build is considered to happen at, used for relative dates.
+
+        Reproducible builds use `SOURCE_DATE_EPOCH` if it is set, otherwise
+        the date of the newest page, so that the output only depends on the
+        sources.
+        """
+        if not self.reproducible:
+            return arrow.utcnow()
+        if os.environ.get(SOURCE_DATE_EPOCH):
+            return arrow.get(int(os.environ[SOURCE_DATE_EPOCH]))
+        dates = [p.date for p in self.pages if p.date is not None]
+        return max(dates) if dates else arrow.get(0)
+
+    @property
+    def record_history(self):
+        return bool(self.config.get("history", True))
+
+    @property
+    def archives(self):
+        return bool(self.config.get("archives", True))
+
+    @property
+    def precompress(self):
+        return bool(self.config.get("precompress", False))
+
+    @property
+    def atomic_publish(self):
+        return bool(self.config.get("atomicPublish", False))
+
+    @property
+    def releases(self) -> Releases:
+        """Builds published atomically by switching the public/ symlink"""
+        keep = int(self.config.get("keepBuilds", 3))
+        return Releases(self.publish_dir, self.state_dir.joinpath("builds"), keep)
+
+    @property
+    def parse_jobs(self) -> int:
+        """Number of processes parsing pages"""
+        return int(self.jobs or self.config.get("jobs", 1))
+
+    @property
+    def large_page_size(self) -> Optional[int]:
+        """Pages larger than this are converted in chunks"""
+        return parse_size(self.config.get("largePageSize", "1MB")) or None
+
+    @property
+    def split_pages(self) -> Optional[int]:
+        """Pages larger than this are split into parts at their headings"""
+        return parse_size(self.config.get("splitPages") or None)
+
+    @property
+    def check_links(self):
+        return bool(self.config.get("checkLinks", False))
+
+    @property
+    def use_cache(self):
+        return bool(self.config.get("cache", True))
+
+    @property
+    def cache_dir(self) -> Path:
+        """Shared cache directory, from `clog build-all --cache-dir`,
+        $CLOG_CACHE_DIR or `cacheDir` in config.yaml"""
+        path = self.shared.cache_dir if self.shared is not None else None
+        path = path or os.environ.get(CACHE_DIR_ENV) or self.config.get("cacheDir")
+        if not path:
+            return self.state_dir.joinpath("cache")
+        return self.cwd.joinpath(os.path.expanduser(path))
+
+    def open_cache(self) -> Cache:
+        """The site's cache, limited by `cacheSize` (e.g. 500MB) and
+        `cacheMaxAge` (in days) from config.yaml"""
+        max_age = self.config.get("cacheMaxAge")
+        return Cache(
+            self.cache_dir,
+            max_size=parse_size(self.config.get("cacheSize")),
+            max_age=None if max_age is None else float(max_age) * 86400,
+        )
+
+    def _context_hash(self) -> str:
+        """Hash of the site-wide values a single page's HTML depends on besides
+        the page itself: templates, configuration, and the front matter and
+        URLs of all pages, which `site.pages`, `site.collections` and
+        `site.tags` are made of.
+
+        Single page templates that show the content of other pages should be
+        built with `cache: false`.
+        """
+        layouts = self.theme_dir.joinpath("layouts")
+        navigation = [(p.title, p.href) for p in self.toplevel_pages]
+        listed = sorted(
+            (p.html_directory or "", p.href, p.meta.data)
+            for p in self.pages
+        )
+        vendored = sorted(self.vendor.filenames.values()) if self.vendor else []
+        # Relative dates change with the day of the build
+        uses_build_time = any(
+            "date_humanized" in path.read_text(encoding="utf-8")
+            for path in layouts.rglob("*.html")
+        )
+        build_day = self.build_time.format("YYYY-MM-DD") if uses_build_time else ""
+        return digest(
+            __version__,
+            hash_tree(layouts),
+            json.dumps(self.config, sort_keys=True, default=str),
+            json.dumps([navigation, vendored, build_day]),
+            json.dumps(listed, default=str),
+        )
+
+    def url_for(self, path: str) -> str:
+        """URL of a page from its source in content/, e.g. `posts/hello.md`,
+        or from one of its URLs"""
+        return self.routes.url_for(path)
+
+    @property
+    def data(self) -> DataNamespace:
+        return self.data_files.namespace()
+
+    @property
+    def minify(self):
+        return bool(self.config.get("minify", False))
 
     @property
     def base_url(self):
@@ -88,36 +377,61 @@ class Site:
     def _clean_markup(markup):
         return "\n".join([s.strip() for s in markup.splitlines() if len(s.strip()) > 0])
 
+    def _asset_url(self, asset: Asset) -> str:
+        if self.vendor is not None and asset in self.vendor.filenames:
+            return self.vendor.href(asset)
+        return asset.url
+
     def mathjax_imports(self):
-        markup = """
-          <script src="https://polyfill.io/v3/polyfill.min.js?features=es6"></script>
-          <script id="MathJax-script" async src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js"></script>
-          """
-        markup = """
-          <!-- mathjax for formulas -->
-          <script src="https://cdnjs.cloudflare.com/ajax/libs/mathjax/2.7.3/MathJax.js?config=TeX-MML-AM_CHTML" async></script>
+        fonts_url = (self.vendor and self.vendor.fonts_href()) or MATHJAX_FONTS_URL
+        markup = f"""
+          <script>window.MathJax = {{chtml: {{fontURL: "{fonts_url}"}}}};</script>
+          <script id="MathJax-script" async src="{self._asset_url(MATHJAX_SCRIPT)}"></script>
           """
+        if self.vendor is None:
+            markup = """
+              <!-- mathjax for formulas -->
+              <script src="https://cdnjs.cloudflare.com/ajax/libs/mathjax/2.7.3/MathJax.js?config=TeX-MML-AM_CHTML" async></script>
+              """
         return Site._clean_markup(markup)
 
     def highlightjs_imports(self):
-        markup = """
-          <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/9.18.1/styles/default.min.css">
-          <script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/9.18.1/highlight.min.js"></script>
+        markup = f"""
+          <link rel="stylesheet" href="{self._asset_url(HIGHLIGHTJS_STYLE)}">
+          <script src="{self._asset_url(HIGHLIGHTJS_SCRIPT)}"></script>
           """
         return Site._clean_markup(markup)
 
     def highlightjs_init(self):
         return "<script>hljs.initHighlightingOnLoad();</script>"
 
+    def _needs(self, feature):
+        """Whether the page being rendered uses `feature`. Listings don't
+        show page bodies, so they never need MathJax or highlight.js"""
+        return bool(getattr(self.current_page, feature, False))
+
     @property
     def imports(self):
-        imports = "\n".join([self.highlightjs_imports(), self.mathjax_imports()])
-        return imports
+        needs = (self._needs("needs_highlight"), self._needs("needs_math"))
+
+        def render():
+            imports = []
+            if needs[0]:
+                imports.append(self.highlightjs_imports())
+            if needs[1]:
+                imports.append(self.mathjax_imports())
+            return "\n".join(imports)
+
+        return self.fragments.fetch("site.imports", needs, render)
 
     @property
     def scripts(self):
-        scripts = "\n".join([self.highlightjs_init()])
-        return scripts
+        needs = self._needs("needs_highlight")
+
+        def render():
+            return self.highlightjs_init() if needs else ""
+
+        return self.fragments.fetch("site.scripts", needs, render)
 
     def is_valid(self):
         has_content_dir = self.content_dir.exists() and self.content_dir.is_dir()
@@ -152,46 +466,135 @@ class Site:
             yaml.dump(config, writer)
 
     def _get_template(self, package_path: str, template: str):
+        extensions = [FragmentCacheExtension]
         env_layouts = Environment(
             loader=PackageLoader(package_name="clog", package_path=package_path,),
             autoescape=False,
+            bytecode_cache=(
+                None
+                if self.cache is None
+                else TemplateBytecodeCache(self.cache, extensions)
+            ),
+            extensions=extensions,
         )
+        # Fragments are shared by all of the site's templates
+        env_layouts.fragment_cache = self.fragments
         return env_layouts.get_template(template)
 
-    def _generate(self):
-        LOG.info("Creating index page")
-        html = self.template_index.render(title=self.title, pages=self.pages, site=self)
-        self.publish_dir.joinpath("index.html").write_text(html)
+    def _render(self, template: Template, rel_path: str, cache_key=None, **context):
+        """Render `template` into `rel_path` of the output, minifying it if enabled.
 
-        LOG.info("Creating single pages")
+        With a `cache_key`, the HTML is looked up in and stored to the cache,
+        preceded by a line with the hashes of the data files it read.
+        """
+        self.current_page = context.get("page")
+        started = time.perf_counter()
+        if cache_key is not None:
+            cached = self._cached_html(cache_key)
+            if cached is not None:
+                self.output.write_bytes(rel_path, cached)
+                self.events.emit("cache_hit", namespace="html", path=rel_path)
+                self._rendered(rel_path, started, cached=True)
+                return
+
+        chunks = template.generate(**context)
+        if self.minify:
+            chunks = self._minify(chunks)
+        if cache_key is None:
+            self.output.write(rel_path, chunks)
+            self._rendered(rel_path, started)
+            return
+        self.data_files.reads = set()
+        try:
+            data = "".join(chunks).encode("utf-8")
+            reads = self._data_digests(self.data_files.reads)
+        finally:
+            self.data_files.reads = None
+        self.cache.put("html", cache_key, json.dumps(reads).encode() + b"\n" + data)
+        self.output.write_bytes(rel_path, data)
+        self._rendered(rel_path, started)
+
+    def _rendered(self, rel_path: str, started: float, cached=False):
+        seconds = round(time.perf_counter() - started, 6)
+        self.events.emit("page_rendered", path=rel_path, seconds=seconds, cached=cached)
+
+    def _data_digests(self, names) -> List[list]:
+        return [[name, self.data_files.digest(name)] for name in sorted(names)]
+
+    def _cached_html(self, cache_key: str) -> Optional[bytes]:
+        """Rendered HTML from the cache, unless a data file it read changed"""
+        cached = self.cache.get("html", cache_key, validate=self._data_unchanged)
+        if cached is None:
+            return None
+        return cached.partition(b"\n")[2]
+
+    def _data_unchanged(self, cached: bytes) -> bool:
+        """Whether the data files a cached page read are still the same"""
+        header = cached.partition(b"\n")[0]
+        try:
+            reads = json.loads(header)
+        except ValueError:
+            return False
+        # Entries written before data files were tracked start with the HTML
+        return isinstance(reads, list) and reads == self._data_digests(
+            name for name, _ in reads
+        )
+
+    def _minify(self, chunks):
+        minifier = HtmlMinifier()
+        yield from minify_stream(chunks, minifier)
+        self.bytes_saved += minifier.bytes_in - minifier.bytes_out
+        self.bytes_rendered += minifier.bytes_in
+
+    def _generate(self, pages=None, tags=None, archives=None):
+        """Render the site. `pages`, `tags` and `archives` restrict the single
+        pages, tag listings and archive pages that are written, for selective
+        builds"""
+        self.build_time = self._build_time()
+        self.fragments.clear()
         for page in self.pages:
-            html = self.template_single.render(page=page, site=self, title=page.title)
-            if page.html_directory:
-                destination = self.publish_dir.joinpath(
-                    page.html_directory, page.html_filename
-                )
-            else:
-                destination = self.publish_dir.joinpath(page.html_filename)
-
-            if not destination.exists():
-                os.makedirs(destination.as_posix(), exist_ok=True)
-            destination.joinpath("index.html").write_text(html)
-
-        # Copy theme's /static directory to /public directory
-        static_dir_source = self.theme_dir.joinpath("static")
-        static_dir_target = self.publish_dir.joinpath("static")
-        if static_dir_target.exists():
-            shutil.rmtree(static_dir_target.as_posix())
-        shutil.copytree(
-            static_dir_source.as_posix(), static_dir_target.as_posix(),
+            page.build_time = self.build_time
+        if self.reproducible:
+            self.output.mtime = self.build_time.int_timestamp
+        if self.cache is not None:
+            self._render_context_hash = self._context_hash()
+        LOG.info("Creating index page")
+        self._render(
+            self.template_index,
+            "index.html",
+            title=self.title,
+            pages=self.pages,
+            site=self,
         )
-        self._generate_tags()
 
-    def _generate_tags(self):
-        """Create pages based on tags"""
-        tags_dir = self.publish_dir.joinpath("tags")
+        LOG.info("Creating single pages")
+        for page in self.pages if pages is None else pages:
+            if page.parts:
+                self._generate_parts(page)
+                continue
+            self._render(
+                self.template_single,
+                self._output_path(page),
+                cache_key=self._render_cache_key(page),
+                page=page,
+                site=self,
+                title=page.title,
+            )
 
-        os.makedirs(tags_dir.as_posix(), exist_ok=True)
+        self._generate_redirects(pages)
+
+        if pages is None:
+            # Copy theme's /static directory to /public directory
+            self.output.remove("static")
+            self.output.copy_tree("static", self.theme_dir.joinpath("static"))
+        if self.vendor is not None:
+            self.vendor.publish(self.output)
+        self._generate_tags(tags)
+        if self.archives:
+            self._generate_archives(archives)
+
+    def _generate_tags(self, tags=None):
+        """Create pages based on tags"""
 
         def _get_tag_home_iter():
             """Create page that lists all tags"""
@@ -204,16 +607,174 @@ class Site:
         # Create page to list all tags. Clicking on a tag should take the user
         # to another page that lists the pages that correspond to the click tag
         tag_pages = [p for p in list(_get_tag_home_iter())]
-        html = self.template_list.render(title="Tags", pages=tag_pages, site=self)
-        tags_dir.joinpath("index.html").write_text(html)
+        self._render(
+            self.template_list,
+            "tags/index.html",
+            title="Tags",
+            pages=tag_pages,
+            site=self,
+        )
         """Create page that lists articles related to a specific tag"""
-        for tag in self.tags:
-            tag_articles_dir = tags_dir.joinpath(tag)
-            os.makedirs(tag_articles_dir, exist_ok=True)
+        for tag in sorted(self.tags) if tags is None else tags:
+            if tag not in self.tags:
+                # Tag was removed from its last page during a selective build
+                self.output.remove(f"tags/{tag}")
+                continue
+            self._render(
+                self.template_list,
+                f"tags/{tag}/index.html",
+                title=tag,
+                pages=self.collections.by_tag.get(tag, ()),
+                site=self,
+            )
+
+    def _generate_parts(self, page: Page):
+        """Render each part of a split page, the first one at the page's URL
+        and the others at `<url>/<number>/`, with links between them"""
+        hrefs = [f"{page.href}/"] + [
+            f"{page.href}/{n}/" for n in range(2, len(page.parts) + 1)
+        ]
+        for number, part in enumerate(page.parts):
+            rendered = copy.copy(page)
+            rendered.html = "\n".join(
+                [part.html, part_navigation(page.parts, number, hrefs)]
+            )
+            rel_path = self._output_path(page)
+            if number > 0:
+                rel_path = rel_path.replace("/index.html", f"/{number + 1}/index.html")
+            self._render(
+                self.template_single,
+                rel_path,
+                cache_key=self._render_cache_key(page, part=number),
+                page=rendered,
+                site=self,
+                title=page.title,
+            )
+
+    def _generate_redirects(self, pages=None):
+        """Write a page redirecting to its page at each alias"""
+        for alias_path, page in self.routes.redirects(pages):
+            data = redirect_html(page).encode("utf-8")
+            self.output.write_bytes(f"{alias_path}/index.html", data)
+
+    def _generate_archives(self, buckets=None):
+        """Create pages listing the posts of each year and month. `buckets`
+        restricts them to some `(year, month)` pairs, month None for years"""
+        if buckets is None:
+            buckets = self.collections.buckets
+        for year, month in sorted(buckets, key=lambda b: (b[0], b[1] or 0)):
+            path = archive_path(year, month)
+            pages = self.collections.archive(year, month)
+            if not pages:
+                # The last post of the bucket was removed or redated
+                self.output.remove(path)
+                continue
+            if month is None:
+                title = str(year)
+            else:
+                title = arrow.get(year, month, 1).format("MMMM YYYY")
+            self._render(
+                self.template_list,
+                f"{path}/index.html",
+                title=title,
+                pages=pages,
+                site=self,
+            )
+
+    @staticmethod
+    def _previous_buckets(metadata: dict) -> set:
+        """Archives the posts recorded by the previous build appeared in"""
+        buckets = set()
+        for rel_path, entry in metadata.items():
+            if "/" in rel_path:
+                buckets.update(buckets_of(Page.from_meta(entry["meta"]).date))
+        return buckets
+
+    @staticmethod
+    def _output_path(page: Page) -> str:
+        """Path of a page's single page in the output"""
+        return f"{page_path(page)}/index.html"
+
+    def find_broken_links(self, jobs=None) -> List[BrokenLink]:
+        """Check the links and anchors in public/ against the files there,
+        attributing single pages to their source in content/"""
+        sources = {}
+        for rel_path, entry in self._load_page_metadata().items():
+            page = Page.from_meta(entry["meta"])
+            if page.title is None:
+                continue
+            page.html_directory = os.path.dirname(rel_path)
+            sources[self._output_path(page)] = rel_path
+        if isinstance(self.output, DirectoryOutput):
+            root = self.output.root
+        else:
+            root = self.publish_dir
+        checker = LinkChecker(
+            root,
+            state_path=self.state_dir.joinpath("links.json"),
+            base_url=self.base_url,
+            sources=sources,
+            jobs=jobs,
+        )
+        return checker.check()
+
+    @property
+    def manifest(self) -> Manifest:
+        return Manifest(self.publish_dir, self.state_dir.joinpath(MANIFEST_FILE)).load()
 
-            tag_articles = [p for p in self.pages if tag in p.tags]
-            html = self.template_list.render(title=tag, pages=tag_articles, site=self)
-            tag_articles_dir.joinpath("index.html").write_text(html)
+    def _update_manifest(self):
+        """Write compressed siblings of the files written if enabled, publish
+        a staged build, and record the digests of the files in public/ for
+        `clog serve`"""
+        if isinstance(self.output, StagedOutput):
+            self.output.finish()
+        written = list(self.output.written)
+        if self.precompress:
+            written += precompress(self.output.root, written)
+        if isinstance(self.output, StagedOutput):
+            name = self.releases.publish(self.output)
+            LOG.info(f"Published build {name}")
+        if self.output.root.resolve() == self.publish_dir.resolve():
+            manifest = self.manifest
+            manifest.update(written)
+            manifest.save()
+
+    def _report_broken_links(self):
+        broken = self.find_broken_links()
+        for link in broken:
+            page = link.source or link.page
+            secho(f"{page}: {link.reason}: {link.url}", fg="yellow", indent="  ")
+        if broken:
+            secho(f"Found {len(broken)} broken links", fg="yellow")
+
+    @property
+    def _page_metadata_path(self):
+        return self.state_dir.joinpath("pages.json")
+
+    def _load_page_metadata(self) -> dict:
+        """Front matter of each source recorded by the previous build"""
+        try:
+            return json.loads(self._page_metadata_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_page_metadata(self, entries: dict):
+        self.state_dir.mkdir(exist_ok=True)
+        self._page_metadata_path.write_text(json.dumps(entries))
+
+    def load_config(self):
+        self.config = yaml.load(self.config_path.read_text(), yaml.SafeLoader) or {}
+
+    def scan_content(self) -> ContentIndex:
+        """Lists the Markdown sources in content/ in one pass"""
+        self.index = ContentIndex(
+            self.content_dir,
+            ignore=read_ignore_patterns(self.cwd.joinpath(IGNORE_FILE)),
+            include_drafts=self.include_drafts,
+            cache_path=self.state_dir.joinpath("content-index.json"),
+        )
+        self.index.scan()
+        return self.index
 
     def validate(self):
         secho("Validating current directory...")
@@ -226,36 +787,421 @@ class Site:
                 "Ensure that command is run from your site's root directory"
             )
 
-        if len(list(self.content_dir.rglob("*.md"))) == 0:
+        self.load_config()
+        if not self.scan_content().sources:
             raise MissingContent("Cannot continue because content directory is empty")
 
-    def build(self):
-        secho("Converting Markdown to HTML in public/", bold=True)
-        self.validate()
-        # Load configuration
-        self.config = yaml.load(self.config_path.read_text(), yaml.SafeLoader)
+    def _prepare(self):
+        """Reset the state of a previous build, keeping whatever is still valid
+        such as compiled templates, so that a `Site` can build repeatedly"""
+        self.pages = []
+        self.toplevel_pages = []
+        self.tags = set()
+        self.bytes_rendered = self.bytes_saved = 0
+        self._prepare_resources()
+
+    def _prepare_resources(self):
+        """Open the cache and get the templates and the pipeline ready for
+        the current config, leaving the pages of the last build alone"""
+        self.cache = self.open_cache() if self.use_cache else None
+        self.data_files.reset(self.cache)
         self.theme_dir = self.cwd.joinpath("themes/{}".format(self.config["theme"]))
-        if not self.publish_dir.exists():
-            self.publish_dir.mkdir()
-
-        for c in os.walk(self.content_dir.as_posix(), topdown=True):
-            dirpath, dirnames, filenames = c
-            is_toplevel_page = len(dirnames) == 1 and dirnames[0] == "posts"
-            target_rel_dir = dirpath.replace(self.content_dir.as_posix(), "")
-            for fname in filenames:
-                if not fname.endswith(".md"):
-                    continue
-                fpath = Path(dirpath).joinpath(fname).as_posix()
-                click.echo(click.style("  ↠ {}...".format(fpath), dim=True))
-                page = Page.parse(fpath)
-                page.is_toplevel = is_toplevel_page
-                page.html_directory = target_rel_dir[1:]  # Remove the / prefix
-                self.pages.append(page)
-                self.tags.update(page.tags)
-                if is_toplevel_page:
-                    self.toplevel_pages.append(page)
-
-        self._generate()
+        # Templates may be shared with other sites, which have their own fragments
+        for template in (self.template_index, self.template_list, self.template_single):
+            template.environment.fragment_cache = self.fragments
+        pipeline_key = json.dumps(
+            [self.config.get("plugins") or [], self.config.get("markdownEngine")],
+            default=str,
+        )
+        if pipeline_key != self._pipeline_key:
+            self.pipeline = self._make_pipeline(pipeline_key)
+            self._pipeline_key = pipeline_key
+            self._parsed = {}
+        self.pipeline.timings.clear()
+        self.costs.load()
+        self._page_keys = {}
+
+    def _make_pipeline(self, key: str) -> Pipeline:
+        """Pipeline for the configured plugins, shared with other sites using
+        the same plugins and Markdown engine"""
+        if self.shared is None:
+            return Pipeline.from_config(self.config)
+        if key in self.shared.pipelines:
+            self.shared.counters["pipelines"] += 1
+        else:
+            self.shared.pipelines[key] = Pipeline.from_config(self.config)
+        return self.shared.pipelines[key]
+
+    def _parse(self, source: Source) -> Page:
+        key = (source.mtime_ns, source.size)
+        cached = self._parsed.get(source.path)
+        if cached is not None and cached[0] == key:
+            self.counters["reused"] += 1
+            return cached[1]
+        page = None
+        cache_key = self._page_cache_key(source)
+        if cache_key is not None:
+            cached = self.cache.get_json("pages", cache_key)
+            if cached is not None:
+                page = Page.from_cache(cached, source.path)
+                self.events.emit("cache_hit", namespace="pages", path=source.rel_path)
+        if page is None:
+            self.counters["parsed"] += 1
+            page = self._parse_source(source)
+            if cache_key is not None:
+                self.cache.put_json("pages", cache_key, page.to_cache())
+        page.cache_key = cache_key
+        self._parsed[source.path] = (key, page)
+        return page
+
+    def _parse_source(self, source: Source) -> Page:
+        """Parse a source, or take it from the pages parsed by workers"""
+        parsed = self._parsed_by_workers.pop(source.path, None)
+        if parsed is not None:
+            data, seconds, timings = parsed
+            page = Page.from_cache(data, source.path)
+            page.timings = timings
+            self.pipeline.add_timings(timings)
+        else:
+            started = time.perf_counter()
+            page = Page.parse(
+                source.path,
+                self.pipeline,
+                large_size=self.large_page_size,
+                split_size=self.split_pages,
+            )
+            seconds = time.perf_counter() - started
+        self.costs.record(source, seconds)
+        return page
+
+    def _parse_in_pool(self, sources: List[Source]):
+        """Parse the sources that are neither parsed yet nor cached in
+        `parse_jobs` worker processes, the most expensive ones first"""
+        jobs = self.parse_jobs
+        if jobs <= 1 or not self.pipeline.cacheable:
+            # Plugins that aren't cacheable may keep state between pages
+            return
+        todo = []
+        for source in sources:
+            memo = self._parsed.get(source.path)
+            if memo is not None and memo[0] == (source.mtime_ns, source.size):
+                continue
+            cache_key = self._page_cache_key(source)
+            if cache_key is None or not self.cache.contains("pages", cache_key):
+                todo.append(source)
+        if len(todo) < 2:
+            return
+        self._parsed_by_workers, report = parse_in_pool(
+            todo,
+            self.costs,
+            jobs,
+            self.pipeline,
+            large_size=self.large_page_size,
+            split_size=self.split_pages,
+        )
+        secho(
+            f"Parsed {len(todo)} pages in {report.batches} batches on {report.jobs} "
+            f"workers, {report.utilisation:.0%} busy over {report.duration:.2f}s",
+            dim=True,
+        )
+        self.events.emit(
+            "pool_finished",
+            jobs=report.jobs,
+            batches=report.batches,
+            seconds=round(report.duration, 6),
+            utilisation=round(report.utilisation, 4),
+        )
+
+    def _page_cache_key(self, source: Source) -> Optional[str]:
+        """Key of a page in the shared cache: the hash of its source and of
+        everything that transforms it"""
+        if self.cache is None or not self.pipeline.cacheable:
+            return None
+        memo = (source.path, source.mtime_ns, source.size)
+        if memo not in self._page_keys:
+            self._page_keys[memo] = digest(
+                __version__,
+                self.pipeline.signature,
+                json.dumps([self.large_page_size, self.split_pages]),
+                file_digest(source.path),
+            )
+        return self._page_keys[memo]
+
+    def _render_cache_key(self, page: Page, part: int = 0) -> Optional[str]:
+        """Key of a rendered single page (or a part of it) in the shared cache"""
+        if self.cache is None or page.cache_key is None:
+            return None
+        return digest(
+            page.cache_key, page.html_directory, str(part), self._render_context_hash
+        )
+
+    def invalidate(self, paths=None, templates=False):
+        """Forget parsed pages (all of them if `paths` is None) and, optionally,
+        the compiled templates"""
+        if paths is None:
+            self._parsed = {}
+        for path in paths or []:
+            self._parsed.pop(self.content_dir.joinpath(path).as_posix(), None)
+        if templates:
+            self._theme_dir = None
+            self.template_single = None
+
+    def render_source(self, rel_path: str) -> str:
+        """Render a single page to HTML without writing it, e.g. for previews"""
+        if not self.config:
+            self.load_config()
+        # Rendered against the pages of the last build, e.g. for navigation
+        self._prepare_resources()
+        if not self.pages:
+            self._restore_pages()
+        path = self.content_dir.joinpath(rel_path)
+        if not path.is_file():
+            raise CLogException(f"Cannot find {rel_path} in content/")
+        stat = path.stat()
+        rel_dir = Path(rel_path).parent.as_posix()
+        source = Source(
+            path.as_posix(),
+            "" if rel_dir == "." else rel_dir,
+            stat.st_size,
+            stat.st_mtime_ns,
+        )
+        page = self._parse(source)
+        page.is_toplevel = source.is_toplevel
+        page.html_directory = source.rel_dir
+        self.current_page = page
+        self.fragments.clear()
+        return self.template_single.render(page=page, site=self, title=page.title)
+
+    def _restore_pages(self):
+        """Pages, collections and routes of the last build, from the front
+        matter it recorded, when this `Site` hasn't built yet"""
+        for rel_path, entry in sorted(self._load_page_metadata().items()):
+            page = Page.from_meta(entry["meta"], self.content_dir.joinpath(rel_path))
+            if page.is_draft and not self.include_drafts:
+                continue
+            page.html_directory = posixpath.dirname(rel_path)
+            page.is_toplevel = page.html_directory == ""
+            self.pages.append(page)
+            self.tags.update(page.tags)
+            if page.is_toplevel:
+                self.toplevel_pages.append(page)
+        self.collections = Collections(self.pages)
+        self.routes = self._route_pages()
+
+    def build(self, only=None, output: Optional[Output] = None) -> "BuildResult":
+        """Build the site into `output`, the public/ directory by default.
+
+        `only` is a list of patterns understood by
+        :class:`clog.selection.Selection`; when given, only the matching pages
+        and the listings they appear on are rendered.
+        """
+        secho("Converting Markdown to HTML in public/", bold=True)
+        started = time.perf_counter()
+        self.timer = PhaseTimer()
+        self.counters = Counter()
+        with self.timer("scan"):
+            self.validate()
+        self.events.emit("build_started", sources=len(self.index.sources))
+        if output is not None:
+            self.output = output
+        elif self.atomic_publish:
+            with self.timer("stage"):
+                self.output = self.releases.stage()
+        else:
+            self.output = DirectoryOutput(self.publish_dir)
+        self._prepare()
+        if self.vendor_assets:
+            self.vendor = Vendor(self.cache or self.open_cache(), self.base_url)
+            self.vendor.prepare()
+
+        metadata = self._load_page_metadata()
+        selection = Selection(only) if only else None
+        if selection is not None and not metadata:
+            secho("No previous build found, building all pages", fg="yellow")
+            selection = None
+
+        self.events.emit("phase", name="parse", total=len(self.index.sources))
+        with self.timer("parse"):
+            selected, affected, entries = self._collect_pages(selection, metadata)
+            self.collections = Collections(self.pages)
+            self.routes = self._route_pages()
+
+        rendered = self.pages if selection is None else selected
+        self.selective = selection is not None
+        self.counters["rendered"] = len(rendered)
+        self.events.emit("phase", name="render", total=len(rendered) + 1)
+        with self.timer("render"):
+            if selection is None:
+                # Archives of the previous build may have no posts left
+                buckets = set(self.collections.buckets) | self._previous_buckets(metadata)
+                self._generate(archives=buckets)
+            else:
+                secho(f"Rendering {len(selected)} of {len(self.pages)} pages")
+                self._remove_stale(affected.stale)
+                self._generate(
+                    pages=selected,
+                    tags=sorted(affected.tags),
+                    archives=affected.archives,
+                )
+        self._save_page_metadata(entries)
+        self.costs.forget_except(entries)
+        self.costs.save()
+        with self.timer("post_build"):
+            self.pipeline.post_build(self)
+        if isinstance(self.output, DirectoryOutput):
+            with self.timer("manifest"):
+                self._update_manifest()
+        if self.check_links and isinstance(self.output, DirectoryOutput):
+            with self.timer("links"):
+                self._report_broken_links()
+        self._report_plugin_timings()
+        self._report_fragments()
+        self._report_cache()
+        if self.minify and self.bytes_rendered:
+            percent = 100 * self.bytes_saved / self.bytes_rendered
+            secho(f"Minified HTML: saved {self.bytes_saved} bytes ({percent:.1f}%)")
+        result = BuildResult(self, self.output, time.perf_counter() - started)
+        self.events.emit(
+            "build_finished",
+            seconds=round(result.duration, 6),
+            pages=len(result.pages),
+            files=len(result.files),
+            bytes_written=result.bytes_written,
+        )
+        if self.record_history:
+            History(self.state_dir.joinpath(HISTORY_FILE)).append(result.record())
+        return result
+
+    def _route_pages(self) -> Routes:
+        """Routing table of the pages, raising an error if two of them (or a
+        page and a listing) would be written to the same place"""
+        reserved = {"", *reserved_dirs(self.archives)}
+        routes = Routes(reserved)
+        for page in self.pages:
+            rel_path = Path(page.source_path).relative_to(self.content_dir)
+            routes.add(rel_path.as_posix(), page)
+        routes.check()
+        return routes
+
+    def _collect_pages(self, selection: Optional[Selection], metadata: dict):
+        """Parse the sources, or restore them from `metadata` if they are not
+        part of a selective build. Returns the selected pages, the listings
+        they affect and the metadata to record for the next build"""
+        selected, affected, entries = [], Affected(set(), set(), []), {}
+        if selection is None:
+            self._parse_in_pool(self.index.sources)
+        for source in self.index.sources:
+            page, is_selected = None, True
+            if selection is not None:
+                previous = metadata.get(source.rel_path)
+                is_current = previous and previous["mtime_ns"] == source.mtime_ns
+                if is_current:
+                    page = Page.from_meta(previous["meta"], source.path)
+                else:
+                    page = Page.parse_meta(source.path)
+                # New sources have nothing to reuse, e.g. after a rename
+                is_selected = not previous or selection.matches(
+                    source.rel_path, page.tags
+                )
+                if is_selected and previous:
+                    self._forget_previous(source.rel_path, previous, affected)
+                elif is_current:
+                    self.counters["reused"] += 1
+            if is_selected:
+                started, parsed = time.perf_counter(), self.counters["parsed"]
+                page = self._parse(source)
+                seconds = time.perf_counter() - started
+                parsed = self.counters["parsed"] > parsed
+                if parsed:
+                    # Also the time taken by a worker
+                    seconds = self.costs.entries[source.rel_path][1]
+                self.events.emit(
+                    "file_parsed",
+                    path=source.rel_path,
+                    seconds=round(seconds, 6),
+                    parsed=parsed,
+                )
+                affected.tags.update(page.tags)
+                if not source.is_toplevel:
+                    affected.archives.update(buckets_of(page.date))
+            entries[source.rel_path] = {
+                "mtime_ns": source.mtime_ns,
+                "meta": page.meta.data,
+            }
+            if page.is_draft and not self.include_drafts:
+                continue
+            page.is_toplevel = source.is_toplevel
+            page.html_directory = source.rel_dir
+            if is_selected:
+                selected.append(page)
+            self.pages.append(page)
+            self.tags.update(page.tags)
+            if source.is_toplevel:
+                self.toplevel_pages.append(page)
+        if selection is not None:
+            for rel_path in sorted(set(metadata) - set(entries)):
+                # Deleted or renamed since the previous build
+                self._forget_previous(rel_path, metadata[rel_path], affected)
+        return selected, affected, entries
+
+    @staticmethod
+    def _forget_previous(rel_path: str, previous: dict, affected: Affected):
+        """Add the listings a page appeared on in the previous build, and the
+        page itself, to those `affected` by a selective build"""
+        before = Page.from_meta(previous["meta"])
+        before.html_directory = posixpath.dirname(rel_path)
+        affected.tags.update(before.tags)
+        if before.html_directory:
+            affected.archives.update(buckets_of(before.date))
+        affected.stale.append(before)
+
+    def _remove_stale(self, pages: List[Page]):
+        """Remove the single pages and redirects of the previous build at
+        URLs no page or alias uses anymore"""
+        for page in pages:
+            if page.title is None:
+                continue
+            paths = [page_path(page)] + [normalize(str(a)) for a in page.aliases]
+            for path in paths:
+                if not self.routes.claims(path):
+                    self.output.remove(path)
+                elif path not in self.routes:
+                    self.output.remove(f"{path}/index.html")  # Pages below remain
+
+    def _report_cache(self):
+        """Show cache hits and misses, and evict old entries if needed"""
+        if self.cache is None:
+            return
+        self.counters["cache_hits"] = sum(self.cache.hits.values())
+        self.counters["cache_misses"] = sum(self.cache.misses.values())
+        namespaces = sorted(set(self.cache.hits) | set(self.cache.misses))
+        if namespaces:
+            summary = ", ".join(
+                f"{n} {self.cache.hits[n]}/{self.cache.hits[n] + self.cache.misses[n]}"
+                for n in namespaces
+            )
+            secho(f"Cache hits: {summary}", dim=True)
+        removed, freed = self.cache.maybe_prune()
+        if removed:
+            secho(f"Evicted {removed} cache entries ({freed} bytes)", dim=True)
+
+    def _report_fragments(self):
+        """Show how many renders each cached fragment saved"""
+        summary = self.fragments.summary()
+        self.counters["fragment_hits"] = sum(hits for _, hits, _ in summary)
+        if not self.counters["fragment_hits"]:
+            return
+        saved = ", ".join(f"{name} {hits}/{total}" for name, hits, total in summary)
+        secho(f"Fragments reused: {saved}", dim=True)
+
+    def _report_plugin_timings(self):
+        """Show the plugin hooks that took the most time during the build"""
+        slowest = self.pipeline.slowest()
+        if not slowest:
+            return
+        secho("Plugin timings:", dim=True)
+        for name, hook, seconds in slowest:
+            secho(f"{name}.{hook}: {seconds * 1000:.1f}ms", dim=True, indent="  ")
 
     def _has_remotes(self):
         return len(run("git remote -v").strip()) > 0
@@ -350,6 +1296,40 @@ class Site:
             secho("Git repository in a status not handled by CLog")
             raise CLogException()
 
+    def deploy_to(self, target: Union[str, Target], jobs: int = 8) -> DeployResult:
+        """Build the site and copy the files that changed since the last
+        deploy to `target`, e.g. `dir:/srv/www`"""
+        if isinstance(target, str):
+            target = open_target(target)
+        self.build()
+        secho("Deploying changed files", bold=True)
+        result = deploy(self.publish_dir, target, manifest=self.manifest, jobs=jobs)
+        plan = result.plan
+        secho(
+            f"{len(plan.added)} added, {len(plan.changed)} changed, "
+            f"{len(plan.removed)} removed, {len(plan.unchanged)} unchanged"
+        )
+        secho(
+            f"Transferred {result.bytes_transferred} of {result.bytes_total} bytes "
+            f"in {result.duration:.2f}s"
+        )
+        return result
+
+    def rollback(self, name: Optional[str] = None) -> str:
+        """Point public/ back at a build kept by `atomicPublish`, by default
+        the one before the current. Returns the name of the build"""
+        self.load_config()
+        name = self.releases.rollback(name)
+        manifest = self.manifest
+        manifest.update(
+            path.relative_to(self.publish_dir).as_posix()
+            for path in self.publish_dir.rglob("*")
+            if path.is_file()
+        )
+        manifest.save()
+        secho(f"Rolled back to build {name}", bold=True)
+        return name
+
     def deploy(self, autocommit=False):
         """Publish to gh-phages branch on GitHub"""
 
@@ -0,0 +1,325 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Union
+
+from .cache import file_digest
+from .exceptions import CLogException
+
+try:
+    import brotli
+except ImportError:  # Optional, only needed for .br siblings
+    brotli = None
+
+# Zip archives cannot store dates before 1980
+ZIP_EPOCH = 315532800
+TAR_COMPRESSION = {".tar": "", ".tar.gz": "gz", ".tgz": "gz", ".tar.bz2": "bz2", ".tar.xz": "xz"}
+
+
+class Output:
+    """Destination of the files generated by a build.
+
+    Paths are relative to the root of the site, e.g. `posts/hello/index.html`.
+    Every backend keeps track of the files written and their sizes.
+    """
+
+    def __init__(self):
+        self.written = {}  # type: Dict[str, int]
+        # Timestamp recorded for files in archives, the current time if None
+        self.mtime = None  # type: Optional[float]
+
+    @property
+    def bytes_written(self) -> int:
+        return sum(self.written.values())
+
+    def write(self, rel_path: str, chunks: Iterable[str]):
+        """Write a text file from an iterable of chunks"""
+        data = "".join(chunks).encode("utf-8")
+        self.write_bytes(rel_path, data)
+
+    def write_bytes(self, rel_path: str, data: bytes):
+        raise NotImplementedError
+
+    def copy_file(self, rel_path: str, source: Path):
+        self.write_bytes(rel_path, source.read_bytes())
+
+    def copy_tree(self, rel_path: str, source_dir: Path):
+        """Copy the contents of `source_dir` into `rel_path`"""
+        for dirpath, dirnames, filenames in os.walk(source_dir.as_posix()):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                source = Path(dirpath, filename)
+                target = Path(rel_path, source.relative_to(source_dir)).as_posix()
+                self.copy_file(target, source)
+
+    def exists(self, rel_path: str) -> bool:
+        return rel_path in self.written
+
+    def remove(self, rel_path: str):
+        """Remove a file or directory left over from a previous build, if the
+        backend holds any"""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DirectoryOutput(Output):
+    """Writes files into a directory, `public/` by default"""
+
+    def __init__(self, root: Path):
+        super().__init__()
+        self.root = root
+
+    def _path(self, rel_path: str) -> Path:
+        path = self.root.joinpath(rel_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def write(self, rel_path: str, chunks: Iterable[str]):
+        path = self._path(rel_path)
+        with path.open("w", encoding="utf-8") as writer:
+            writer.writelines(chunks)
+        self.written[rel_path] = path.stat().st_size
+
+    def write_bytes(self, rel_path: str, data: bytes):
+        self._path(rel_path).write_bytes(data)
+        self.written[rel_path] = len(data)
+
+    def copy_file(self, rel_path: str, source: Path):
+        shutil.copyfile(source.as_posix(), self._path(rel_path).as_posix())
+        self.written[rel_path] = source.stat().st_size
+
+    def exists(self, rel_path: str) -> bool:
+        return self.root.joinpath(rel_path).exists()
+
+    def remove(self, rel_path: str):
+        path = self.root.joinpath(rel_path)
+        if path.is_dir():
+            shutil.rmtree(path.as_posix())
+        elif path.exists():
+            path.unlink()
+
+
+class MemoryOutput(Output):
+    """Keeps the generated files in a dict, for tests and embedding"""
+
+    def __init__(self):
+        super().__init__()
+        self.files = {}  # type: Dict[str, bytes]
+
+    def write_bytes(self, rel_path: str, data: bytes):
+        self.files[rel_path] = data
+        self.written[rel_path] = len(data)
+
+    def read_text(self, rel_path: str) -> str:
+        return self.files[rel_path].decode("utf-8")
+
+    def remove(self, rel_path: str):
+        prefix = rel_path.rstrip("/") + "/"
+        for path in [p for p in self.files if p == rel_path or p.startswith(prefix)]:
+            del self.files[path]
+            del self.written[path]
+
+
+class _ArchiveOutput(Output):
+    def __init__(self, target: Union[Path, BinaryIO]):
+        super().__init__()
+        self._owns_file = isinstance(target, (str, Path))
+        if not self._owns_file:
+            self.fileobj = target
+            return
+        try:
+            self.fileobj = open(target, "wb")
+        except OSError as ex:
+            raise CLogException(f"Cannot write {target}: {ex.strerror or ex}")
+
+    def close(self):
+        if self._owns_file:
+            self.fileobj.close()
+
+
+class TarOutput(_ArchiveOutput):
+    """Streams the generated files into a tar archive, compressed if `compression`
+    is "gz", "bz2" or "xz". The target may be a pipe such as stdout"""
+
+    def __init__(self, target: Union[Path, BinaryIO], compression: str = ""):
+        super().__init__(target)
+        self.compression = compression
+        self._gzip = None
+        self._archive = None
+
+    @property
+    def archive(self) -> tarfile.TarFile:
+        # Opened on first write so that `mtime` can be set after construction
+        if self._archive is None:
+            fileobj, mode = self.fileobj, f"w|{self.compression}"
+            if self.compression == "gz":
+                # tarfile stamps the gzip header with the current time
+                fileobj = self._gzip = gzip.GzipFile(
+                    filename="", fileobj=self.fileobj, mode="wb", mtime=self.mtime
+                )
+                mode = "w|"
+            self._archive = tarfile.open(fileobj=fileobj, mode=mode)
+        return self._archive
+
+    def write_bytes(self, rel_path: str, data: bytes):
+        info = tarfile.TarInfo(rel_path)
+        info.size = len(data)
+        info.mtime = time.time() if self.mtime is None else self.mtime
+        info.mode = 0o644
+        self.archive.addfile(info, io.BytesIO(data))
+        self.written[rel_path] = len(data)
+
+    def close(self):
+        self.archive.close()
+        if self._gzip is not None:
+            self._gzip.close()
+        super().close()
+
+
+class ZipOutput(_ArchiveOutput):
+    """Streams the generated files into a zip archive"""
+
+    def __init__(self, target: Union[Path, BinaryIO]):
+        super().__init__(target)
+        self.archive = zipfile.ZipFile(self.fileobj, "w", zipfile.ZIP_DEFLATED)
+
+    def write_bytes(self, rel_path: str, data: bytes):
+        mtime = time.time() if self.mtime is None else self.mtime
+        info = zipfile.ZipInfo(rel_path, time.gmtime(max(mtime, ZIP_EPOCH))[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        self.archive.writestr(info, data)
+        self.written[rel_path] = len(data)
+
+    def close(self):
+        self.archive.close()
+        super().close()
+
+
+def open_output(spec: str, stdout: Optional[BinaryIO] = None) -> Output:
+    """Creates an output from a command line `spec`:
+
+      * `dir:<path>` or a plain path - a directory
+      * `tar:<path>`, `tar.gz:<path>` - a tar archive, `-` for stdout
+      * `zip:<path>` - a zip archive, `-` for stdout
+      * a path ending with `.zip`, `.tar`, `.tar.gz`, `.tgz`, ... - inferred
+    """
+    kind, _, target = spec.partition(":")
+    if not target:
+        kind, target = "", spec
+        for suffix in sorted(TAR_COMPRESSION, key=len, reverse=True):
+            if target.endswith(suffix):
+                kind = suffix.lstrip(".")
+                break
+        if target.endswith(".zip"):
+            kind = "zip"
+    destination = (stdout or sys.stdout.buffer) if target == "-" else Path(target)
+    if kind in ("", "dir"):
+        if target == "-":
+            raise CLogException("Cannot write a directory to stdout")
+        return DirectoryOutput(Path(target).resolve())
+    if kind == "zip":
+        return ZipOutput(destination)
+    compression = TAR_COMPRESSION.get(f".{kind}")
+    if compression is None:
+        raise CLogException(f"Unknown output: {spec}")
+    return TarOutput(destination, compression)
+
+
+# Text files worth serving compressed, and the smallest size worth it
+COMPRESSIBLE = (".html", ".css", ".js", ".json", ".xml", ".svg", ".txt")
+MIN_COMPRESS_SIZE = 256
+
+
+def _compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", brotli.compress
+
+
+def precompress(root: Path, rel_paths: Iterable[str]) -> List[str]:
+    """Write `.gz` siblings of the text files among `rel_paths`, and `.br`
+    ones if the brotli module is installed, for servers to send as is.
+    Returns the paths written"""
+    written = []
+    for rel_path in rel_paths:
+        if not rel_path.endswith(COMPRESSIBLE):
+            continue
+        path = root.joinpath(rel_path)
+        data = path.read_bytes()
+        for suffix, compress in _compressors():
+            sibling = Path(f"{path}{suffix}")
+            compressed = compress(data) if len(data) >= MIN_COMPRESS_SIZE else None
+            # Don't leave a sibling of a previous version behind, and don't
+            # write into one that may be linked from a previous build
+            if sibling.exists():
+                sibling.unlink()
+            if compressed is None or len(compressed) >= len(data):
+                continue
+            sibling.write_bytes(compressed)
+            written.append(f"{rel_path}{suffix}")
+    return written
+
+
+class Manifest:
+    """Size, mtime and digest of each file in an output directory.
+
+    Recorded after every build so that servers can send strong ETags
+    without reading the files. An entry is only trusted while the file's
+    size and mtime match, so files changed outside of a build are ignored.
+    """
+
+    def __init__(self, root: Path, path: Path):
+        self.root = root
+        self.path = path
+        self.entries = {}  # type: Dict[str, list]
+        self._loaded_mtime = None
+
+    def load(self) -> "Manifest":
+        try:
+            self._loaded_mtime = self.path.stat().st_mtime_ns
+            self.entries = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.entries, sort_keys=True))
+
+    def update(self, rel_paths: Iterable[str]):
+        """Record the files at `rel_paths` and forget the removed ones"""
+        for rel_path in rel_paths:
+            path = self.root.joinpath(rel_path)
+            stat = path.stat()
+            self.entries[rel_path] = [stat.st_size, stat.st_mtime_ns, file_digest(path)]
+        for rel_path in list(self.entries):
+            if not self.root.joinpath(rel_path).is_file():
+                del self.entries[rel_path]
+
+    def digest(self, rel_path: str) -> Optional[str]:
+        """Digest of the file at `rel_path`, None if unknown or changed since"""
+        try:
+            if self.path.stat().st_mtime_ns != self._loaded_mtime:
+                self.load()  # Rebuilt since it was loaded
+            stat = self.root.joinpath(rel_path).stat()
+        except FileNotFoundError:
+            return None
+        entry = self.entries.get(rel_path)
+        if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+            return None
+        return entry[2]
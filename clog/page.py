@@ -1,16 +1,23 @@
 import os
 from io import StringIO
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from urllib.parse import urljoin
 
 import yaml
-from markdown import Markdown
 from slugify import slugify
 
+from clog.assets import has_codeblock, has_math
 from clog.exceptions import CLogException
-
-CODE_BACKTICKS = "```"
+from clog.plugins import CodeBlockPlugin, Pipeline
+from clog.split import (
+    CHUNK_SIZE,
+    SPLIT_LEVEL,
+    PagePart,
+    heading,
+    scan_definitions,
+    split_blocks,
+)
 
 
 class PageMeta:
@@ -71,45 +78,23 @@ class PageMeta:
         return self._complete
 
 
-def format_codeblock(text: str) -> str:
-    """Formats a markdown code block a HighlightJS friendly manner"""
+def read_markdown(path) -> str:
+    """Markdown of a page, without its front matter if it has one"""
+    with open(path, encoding="utf-8") as fp:
+        text = fp.read()
+    if not PageMeta.is_delimeter(text.lstrip()):
+        return text
+    meta, lines = PageMeta(), text.splitlines(keepends=True)
+    for number, line in enumerate(lines):
+        meta.parse(line.strip())
+        if meta.complete:
+            return "".join(lines[number + 1 :])
+    return ""
 
-    def _get_backticks_prefix(text):
-        """Get the text before the backticks in a line"""
-        backticks_pos = text.find(CODE_BACKTICKS)
-        return "" if backticks_pos == -1 else text[:backticks_pos]
-
-    lines = text.split("\n")
-    codeblocks = []
-    languages = {}
-
-    # Find all codeblocks
-    for idx, line in enumerate(lines):
-        if line.strip().startswith(CODE_BACKTICKS):
-            codeblocks.append(idx)
-            lang = line.replace(CODE_BACKTICKS, "").strip()
-            if len(lang) > 0:
-                languages[idx] = lang
-
-    if len(codeblocks) % 2 != 0:
-        raise ValueError("Inconsistent code block")
-
-    for i in range(0, len(codeblocks), 2):
-        start, end = codeblocks[i], codeblocks[i + 1]
-        bt_prefix = _get_backticks_prefix(lines[start])
-        lang = languages.get(start, "")
-        if lang:
-            lines[start] = (
-                bt_prefix + f'<pre class="highlight"><code class="language-{lang}">'
-            )
-        else:
-            lines[start] = bt_prefix + "<pre><code>"
 
-        lines[end] = lines[end].replace(CODE_BACKTICKS, f"</code></pre>")
-        codeblocks.pop(0)
-        codeblocks.pop(0)
-
-    return "\n".join(lines)
+def format_codeblock(text: str) -> str:
+    """Formats a markdown code block a HighlightJS friendly manner"""
+    return "\n".join(CodeBlockPlugin().preprocess(text.split("\n"), None))
 
 
 class Page:
@@ -119,12 +104,26 @@ class Page:
         self.source_path: Optional[str] = None
         self.base_url = "./"
         self._html_filename = None
+        self._href = None
         self._title = None
         self.html_directory = None
         self.is_toplevel = False
+        # Reference time for `date_humanized`, set by the site being built
+        self.build_time = None
+        # Hash of everything `parse` depends on, set when the site cache is used
+        self.cache_key = None  # type: Optional[str]
+        # Seconds spent in each plugin hook while parsing this page
+        self.timings = {}
+        # Whether the page needs MathJax and highlight.js, set by `parse`
+        self.needs_math = False
+        self.needs_highlight = False
+        # Parts of a page split at its headings, empty if it isn't split
+        self.parts = []  # type: List[PagePart]
 
     @property
     def href(self):
+        if self._href is not None:
+            return self._href
         if len(self.html_directory.strip()) > 0:
             url = urljoin(self.base_url, self.html_directory) + "/" + self.html_filename
         else:
@@ -132,6 +131,11 @@ class Page:
 
         return f"/{url}"
 
+    @href.setter
+    def href(self, value):
+        """Set by the routing table, which computes every URL once per build"""
+        self._href = value
+
     @property
     def date(self):
         import arrow
@@ -141,7 +145,7 @@ class Page:
 
     @property
     def date_humanized(self):
-        return None if self.date is None else self.date.humanize()
+        return None if self.date is None else self.date.humanize(self.build_time)
 
     @property
     def title(self):
@@ -157,10 +161,25 @@ class Page:
     def title_slug(self):
         return None if self.title is None else slugify(self.title.encode())
 
+    @property
+    def slug(self):
+        """Last part of the page's URL: the `slug` front matter if set,
+        otherwise the slug of the title"""
+        slug = self.meta.get_entry("slug", None)
+        if slug is None:
+            return self.title_slug
+        return slugify(str(slug))
+
+    @property
+    def aliases(self):
+        """Other URLs of the page, from the `aliases` front matter"""
+        aliases = self.meta.get_entry("aliases", [])
+        return [aliases] if isinstance(aliases, str) else list(aliases or [])
+
     @property
     def html_filename(self):
         if self._html_filename is None:
-            self._html_filename = self.title_slug
+            self._html_filename = self.slug
         return self._html_filename
 
     @html_filename.setter
@@ -171,31 +190,125 @@ class Page:
     def tags(self):
         return self.meta.get_entry("tags", [])
 
+    @property
+    def is_draft(self):
+        return bool(self.meta.get_entry("draft", False))
+
     @property
     def source_file(self):
         return os.path.split(self.source_path)
 
     @staticmethod
-    def parse(path) -> Optional["Page"]:
+    def from_meta(data: dict, path=None) -> "Page":
+        """Creates a page without HTML from front matter recorded by a previous build"""
+        page = Page()
+        page.source_path = None if path is None else Path(path)
+        page.meta.data = dict(data)
+        page.meta._complete = True
+        return page
+
+    def to_cache(self) -> dict:
+        """The result of `parse`, in a form that can be stored as JSON"""
+        return {
+            "meta": self.meta.data,
+            "html": self.html,
+            "needs_math": self.needs_math,
+            "needs_highlight": self.needs_highlight,
+            "parts": [list(part) for part in self.parts],
+        }
+
+    @staticmethod
+    def from_cache(data: dict, path=None) -> "Page":
+        page = Page.from_meta(data["meta"], path)
+        page.html = data["html"]
+        page.needs_math = data["needs_math"]
+        page.needs_highlight = data["needs_highlight"]
+        page.parts = [PagePart(*part) for part in data.get("parts", [])]
+        return page
+
+    def _convert_parts(self, parts, pipeline: Pipeline, references: str):
+        """Converts each part, a stream of Markdown lines, in chunks that are
+        each followed by the page's link `references`"""
+        engine = pipeline.markdown()
+        for lines in parts:
+            html, title = [], self.title
+            for chunk in split_blocks(lines, CHUNK_SIZE):
+                if self.parts and not html and heading(chunk[0]) is not None:
+                    title = heading(chunk[0])[1]  # Parts start at a heading
+                html.append(engine.convert("\n".join(chunk) + references))
+            part = PagePart(title, pipeline.postprocess("\n".join(html), self))
+            self.parts.append(part)
+        self.html = self.parts[0].html if self.parts else ""
+        if len(self.parts) == 1:
+            self.parts = []  # Only converted in chunks
+
+    @staticmethod
+    def parse_meta(path) -> "Page":
+        """Reads only the front matter of a page, stopping at its closing delimeter"""
+        page = Page()
+        page.source_path = Path(path)
+        with page.source_path.open(encoding="utf-8") as fp:
+            for line in fp:
+                page.meta.parse(line.strip())
+                if page.meta.complete:
+                    break
+        return page
+
+    @staticmethod
+    def parse(
+        path,
+        pipeline: Optional[Pipeline] = None,
+        large_size: Optional[int] = None,
+        split_size: Optional[int] = None,
+    ) -> Optional["Page"]:
+        """Converts a page to HTML.
+
+        Pages larger than `large_size` bytes are converted in chunks, so that
+        the converter never holds the whole document. Pages larger than
+        `split_size` are also split into `parts` at their headings.
+        """
         if not isinstance(path, Path):
             path = Path(path)
+        if pipeline is None:
+            pipeline = Pipeline()
 
         page = Page()
         page.source_path = path
 
-        def _extract():
-            with path.open(encoding="utf-8") as fp:
-                # formatted = format_codeblock(fp.read())
-                formatted = fp.read()
-                for line in formatted.splitlines():
-                    if not page.meta.complete:
-                        page.meta.parse(line.strip())
-                    else:
-                        yield line
-
-        extracted = "\n".join(_extract())
-        page.html = Markdown(extensions=["pymdownx.extra"]).convert(extracted)
-        if page.title is None:  # TODO Write test for this
-            raise CLogException()
+        def _extract(fp):
+            in_code = False
+            for line in fp:
+                line = line.rstrip("\r\n")
+                if not page.meta.complete:
+                    page.meta.parse(line.strip())
+                    continue
+                if has_codeblock(line):
+                    in_code = not in_code
+                    page.needs_highlight = True
+                elif not in_code and not page.needs_math and has_math(line):
+                    page.needs_math = True
+                yield line
+
+        size = path.stat().st_size
+        references = ""
+        if (split_size and size > split_size) or (large_size and size > large_size):
+            references, footnotes = scan_definitions(path)
+            if footnotes:
+                split_size = large_size = None  # Converted whole
+        with path.open(encoding="utf-8") as fp:
+            lines = pipeline.preprocess(_extract(fp), page)
+            if split_size and size > split_size:
+                page._convert_parts(
+                    split_blocks(lines, split_size, SPLIT_LEVEL), pipeline, references
+                )
+            elif large_size and size > large_size:
+                page._convert_parts([lines], pipeline, references)
+            else:
+                html = pipeline.markdown().convert("\n".join(lines))
+                page.html = pipeline.postprocess(html, page)
+        # Indented code blocks and plugins can produce code without a fence
+        page.needs_highlight = page.needs_highlight or "<pre" in page.html
+        if page.title is None:
+            raise CLogException(f"{path}: missing title")
 
         return page
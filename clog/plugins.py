@@ -0,0 +1,230 @@
+import importlib
+from collections import defaultdict
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .engines import DEFAULT_EXTENSIONS, Engine, create_engine
+from .exceptions import CLogException
+
+CODE_BACKTICKS = "```"
+
+# Plugins that can be enabled by name from the `plugins` entry in config.yaml
+REGISTRY = {}
+
+
+def register(name):
+    """Class decorator that makes a plugin available by `name` in config.yaml"""
+
+    def _register(cls):
+        cls.name = name
+        REGISTRY[name] = cls
+        return cls
+
+    return _register
+
+
+class Plugin:
+    """Base class for content transforms hooked into the build.
+
+    Subclasses override only the hooks they need. `preprocess` receives the
+    stream of Markdown lines after the front matter and must yield lines, so
+    that every plugin runs over the page in one pass instead of re-splitting
+    and re-joining the text.
+    """
+
+    name = None  # type: Optional[str]
+    # Set to False if the output of a hook depends on anything but its input
+    # (e.g. the current time or files outside the page), so it is never cached
+    cacheable = True
+    version = "1"
+
+    def preprocess(self, lines: Iterable[str], page) -> Iterable[str]:
+        return lines
+
+    def markdown_extensions(self) -> List[str]:
+        return []
+
+    def postprocess(self, html: str, page) -> str:
+        return html
+
+    def post_build(self, site):
+        pass
+
+
+@register("codeblocks")
+class CodeBlockPlugin(Plugin):
+    """Rewrites fenced code blocks into HighlightJS friendly markup"""
+
+    def preprocess(self, lines, page):
+        is_open = False
+        for line in lines:
+            if not line.strip().startswith(CODE_BACKTICKS):
+                yield line
+                continue
+            prefix = line[: line.find(CODE_BACKTICKS)]
+            if is_open:
+                yield line.replace(CODE_BACKTICKS, "</code></pre>")
+            else:
+                lang = line.replace(CODE_BACKTICKS, "").strip()
+                if lang:
+                    yield prefix + f'<pre class="highlight"><code class="language-{lang}">'
+                else:
+                    yield prefix + "<pre><code>"
+            is_open = not is_open
+        if is_open:
+            raise ValueError("Inconsistent code block")
+
+
+def _load(entry) -> Plugin:
+    """Instantiate a plugin from a registry name or a `module:Class` path"""
+    if isinstance(entry, Plugin):
+        return entry
+    if entry in REGISTRY:
+        return REGISTRY[entry]()
+    module_name, _, class_name = str(entry).partition(":")
+    if not class_name:
+        raise CLogException(f"Unknown plugin: {entry}")
+    try:
+        cls = getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError) as ex:
+        raise CLogException(f"Cannot load plugin {entry}: {ex}")
+    if cls.name is None:
+        cls.name = entry
+    return cls()
+
+
+class Pipeline:
+    """Runs the registered plugins over each page and records their cost"""
+
+    def __init__(
+        self, plugins: Optional[Iterable] = None, engine: Optional[str] = None
+    ):
+        # Entries as given in config.yaml, to tell if the pipeline is still current
+        self.entries = list(plugins or [])
+        self.engine_name = engine
+        self.plugins = [_load(p) for p in self.entries]
+        self._engine = None  # type: Optional[Engine]
+        # Seconds spent per (plugin, hook) summed over the whole build
+        self.timings = defaultdict(float)  # type: Dict[Tuple[str, str], float]
+
+    @staticmethod
+    def from_config(config: dict) -> "Pipeline":
+        return Pipeline(config.get("plugins") or [], config.get("markdownEngine"))
+
+    def register(self, plugin):
+        self.plugins.append(_load(plugin))
+        self._engine = None
+
+    def markdown(self) -> Engine:
+        """Returns the Markdown engine for the pipeline's extensions, created
+        once and reused for every page"""
+        if self._engine is None:
+            self._engine = create_engine(self.engine_name, self.extensions)
+        return self._engine
+
+    @property
+    def extensions(self) -> List[str]:
+        extensions = list(DEFAULT_EXTENSIONS)
+        for plugin in self.plugins:
+            for ext in plugin.markdown_extensions():
+                if ext not in extensions:
+                    extensions.append(ext)
+        return extensions
+
+    @property
+    def cacheable(self) -> bool:
+        return all(p.cacheable for p in self.plugins)
+
+    @property
+    def signature(self) -> str:
+        """Identifies the transforms applied to a page, for use in cache keys"""
+        names = [f"{p.name}@{p.version}" for p in self.plugins]
+        return ",".join(names + self.extensions + [self.markdown().signature])
+
+    def _record(self, page, plugin, hook, seconds):
+        self.timings[(plugin.name, hook)] += seconds
+        if page is not None:
+            key = f"{plugin.name}.{hook}"
+            page.timings[key] = page.timings.get(key, 0.0) + seconds
+
+    def add_timings(self, page_timings: Dict[str, float]):
+        """Add the timings of a page parsed by another pipeline, e.g. in a
+        worker process"""
+        for key, seconds in page_timings.items():
+            name, _, hook = key.rpartition(".")
+            self.timings[(name, hook)] += seconds
+
+    def preprocess(self, lines: Iterable[str], page) -> Iterator[str]:
+        """Chain every plugin's `preprocess` hook over a single stream of lines"""
+        stream = iter(lines)
+        upstream = None  # Inclusive timer of the previous stage
+        for plugin in self.plugins:
+            if type(plugin).preprocess is Plugin.preprocess:
+                continue
+            stream = _TimedStream(plugin.preprocess(stream, page), upstream)
+            stream.on_close = (
+                lambda seconds, plugin=plugin: self._record(
+                    page, plugin, "preprocess", seconds
+                )
+            )
+            upstream = stream
+        return stream
+
+    def postprocess(self, html: str, page) -> str:
+        for plugin in self.plugins:
+            if type(plugin).postprocess is Plugin.postprocess:
+                continue
+            start = perf_counter()
+            html = plugin.postprocess(html, page)
+            self._record(page, plugin, "postprocess", perf_counter() - start)
+        return html
+
+    def post_build(self, site):
+        for plugin in self.plugins:
+            start = perf_counter()
+            plugin.post_build(site)
+            self._record(None, plugin, "post_build", perf_counter() - start)
+
+    def slowest(self, n=5) -> List[Tuple[str, str, float]]:
+        """Returns the `n` most expensive (plugin, hook, seconds) entries"""
+        ranked = sorted(self.timings.items(), key=lambda item: item[1], reverse=True)
+        return [(name, hook, seconds) for (name, hook), seconds in ranked[:n]]
+
+
+class _TimedStream:
+    """Iterator that measures the time spent producing its items.
+
+    Stages are chained, so pulling from one stage also pulls from the stages
+    before it. The upstream stage's time is subtracted so that each plugin
+    is only charged for its own work.
+    """
+
+    def __init__(self, iterable, upstream: Optional["_TimedStream"]):
+        self._iterator = iter(iterable)
+        self._upstream = upstream
+        self.elapsed = 0.0
+        self.on_close = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            item = next(self._iterator)
+        except StopIteration:
+            self.elapsed += perf_counter() - start
+            self._close()
+            raise
+        self.elapsed += perf_counter() - start
+        return item
+
+    @property
+    def exclusive(self):
+        upstream = self._upstream.elapsed if self._upstream is not None else 0.0
+        return max(self.elapsed - upstream, 0.0)
+
+    def _close(self):
+        if self.on_close is not None:
+            on_close, self.on_close = self.on_close, None
+            on_close(self.exclusive)
@@ -0,0 +1,217 @@
+import filecmp
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .exceptions import CLogException
+from .output import DirectoryOutput
+
+# Prefix of builds being written, followed by the PID of the process writing
+# them, and removed once that process is gone if they never got published
+STAGING_PREFIX = ".staging-"
+
+
+def _link_or_copy(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError:  # Not supported by the file system
+        shutil.copy2(source, target)
+
+
+def _is_running(pid: str) -> bool:
+    """Whether the process writing a staging directory is still running"""
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass  # Running as another user
+    return True
+
+
+class StagedOutput(DirectoryOutput):
+    """Writes a build into a staging directory that starts as a copy of the
+    previous build, with its files hard-linked.
+
+    Files are replaced rather than written in place, so that the linked
+    files of the previous build are never modified, and files whose content
+    didn't change stay linked (keeping their mtime, and so their ETag).
+    """
+
+    def __init__(self, root: Path):
+        super().__init__(root)
+        # Files and directories removed during the build
+        self.removed = []  # type: List[str]
+
+    def _path(self, rel_path: str) -> Path:
+        path = super()._path(rel_path)
+        if path.is_file() or path.is_symlink():
+            path.unlink()
+        return path
+
+    def _unchanged(self, rel_path: str, data: bytes) -> bool:
+        path = self.root.joinpath(rel_path)
+        try:
+            if path.stat().st_size != len(data) or path.read_bytes() != data:
+                return False
+        except OSError:
+            return False
+        self.written[rel_path] = len(data)
+        return True
+
+    def write(self, rel_path: str, chunks: Iterable[str]):
+        self.write_bytes(rel_path, "".join(chunks).encode("utf-8"))
+
+    def write_bytes(self, rel_path: str, data: bytes):
+        if not self._unchanged(rel_path, data):
+            super().write_bytes(rel_path, data)
+
+    def copy_file(self, rel_path: str, source: Path):
+        target = self.root.joinpath(rel_path)
+        if target.is_file() and filecmp.cmp(source, target, shallow=False):
+            self.written[rel_path] = target.stat().st_size
+        else:
+            super().copy_file(rel_path, source)
+
+    def exists(self, rel_path: str) -> bool:
+        return super().exists(rel_path) and not self._removed(rel_path)
+
+    def remove(self, rel_path: str):
+        # Only removed when the build is done, if they weren't written again,
+        # so that unchanged files of rewritten directories stay linked
+        self.removed.append(rel_path.rstrip("/"))
+
+    def _removed(self, rel_path: str) -> bool:
+        return rel_path not in self.written and any(
+            rel_path == prefix or rel_path.startswith(f"{prefix}/")
+            for prefix in self.removed
+        )
+
+    def finish(self):
+        """Delete the files removed during the build and not written again"""
+        for prefix in self.removed:
+            path = self.root.joinpath(prefix)
+            paths = [path] if path.is_file() else sorted(path.rglob("*"), reverse=True)
+            for path in paths:
+                rel_path = path.relative_to(self.root).as_posix()
+                if path.is_dir() and not path.is_symlink():
+                    if not any(path.iterdir()):
+                        path.rmdir()
+                elif self._removed(rel_path):
+                    path.unlink()
+            path = self.root.joinpath(prefix)
+            if path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+        self.removed = []
+
+
+class Releases:
+    """Builds published by swapping a symlink, `public/` by default.
+
+    Each build is written to its own directory in `builds_dir` and `link` is
+    then atomically pointed at it. The `keep` previous builds are kept, so
+    that going back to one of them is just as quick.
+    """
+
+    def __init__(self, link: Path, builds_dir: Path, keep: int = 3):
+        self.link = link
+        self.builds_dir = builds_dir
+        self.keep = keep
+
+    @property
+    def current(self) -> Optional[str]:
+        """Name of the published build, None if `link` isn't one of them"""
+        if not self.link.is_symlink():
+            return None
+        target = Path(os.readlink(self.link))
+        if target.parent.name != self.builds_dir.name:
+            return None
+        return target.name
+
+    def list(self) -> List[str]:
+        """Names of the published builds, oldest first"""
+        if not self.builds_dir.is_dir():
+            return []
+        return sorted(
+            p.name
+            for p in self.builds_dir.iterdir()
+            if p.is_dir() and not p.name.startswith(STAGING_PREFIX)
+        )
+
+    def stage(self) -> StagedOutput:
+        """Output for a new build, starting from the files of the current one"""
+        self.builds_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.builds_dir.glob(f"{STAGING_PREFIX}*"):
+            if not _is_running(path.name[len(STAGING_PREFIX) :]):
+                shutil.rmtree(path.as_posix(), ignore_errors=True)  # Failed builds
+        staging = self.builds_dir.joinpath(f"{STAGING_PREFIX}{os.getpid()}")
+        # Left by a failed build of this process, e.g. a daemon
+        shutil.rmtree(staging.as_posix(), ignore_errors=True)
+        if self.link.is_dir():
+            shutil.copytree(
+                self.link.as_posix(),
+                staging.as_posix(),
+                symlinks=True,
+                copy_function=_link_or_copy,
+            )
+        else:
+            staging.mkdir()
+        return StagedOutput(staging)
+
+    def _new_name(self) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        existing = self.list()
+        name, number = stamp, 1
+        while name in existing:
+            number += 1
+            name = f"{stamp}-{number}"
+        return name
+
+    def publish(self, output: StagedOutput) -> str:
+        """Make the build in `output` the live one and prune old builds.
+        Returns the name of the build"""
+        output.finish()
+        name = self._new_name()
+        build_dir = self.builds_dir.joinpath(name)
+        os.rename(output.root.as_posix(), build_dir.as_posix())
+        output.root = build_dir
+        if self.link.exists() and not self.link.is_symlink():
+            # Directory written by a build that wasn't staged, kept as the
+            # previous build. The only moment the link is missing
+            previous = self.builds_dir.joinpath(f"0-previous-{int(time.time())}")
+            os.rename(self.link.as_posix(), previous.as_posix())
+        self._point_to(name)
+        self.prune()
+        return name
+
+    def _point_to(self, name: str):
+        target = os.path.relpath(self.builds_dir.joinpath(name), self.link.parent)
+        temp_link = self.link.with_name(f".{self.link.name}.link")
+        if os.path.lexists(temp_link):
+            temp_link.unlink()
+        temp_link.symlink_to(target)
+        os.replace(temp_link.as_posix(), self.link.as_posix())
+
+    def prune(self):
+        """Remove all but the current build and the `keep` previous ones"""
+        current = self.current
+        names = [name for name in self.list() if name != current]
+        for name in names[: max(len(names) - self.keep, 0)]:
+            shutil.rmtree(self.builds_dir.joinpath(name).as_posix())
+
+    def rollback(self, name: Optional[str] = None) -> str:
+        """Publish build `name` again, by default the one before the current.
+        Returns the name of the build now live"""
+        names = self.list()
+        if name is None:
+            current = self.current
+            previous = [n for n in names if current is None or n < current]
+            if not previous:
+                raise CLogException("No previous build to roll back to")
+            name = previous[-1]
+        elif name not in names:
+            raise CLogException(f"Unknown build: {name} (kept: {', '.join(names)})")
+        self._point_to(name)
+        return name
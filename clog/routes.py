@@ -0,0 +1,143 @@
+import html
+import posixpath
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .exceptions import CLogException
+from .page import Page
+
+# Output directories written by the build itself, besides the home page
+RESERVED_DIRS = ("static", "tags")
+# Directory of the archive pages, when they are enabled
+ARCHIVE_DIR = "archive"
+
+REDIRECT_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="canonical" href="{url}">
+<meta http-equiv="refresh" content="0; url={url}">
+</head>
+<body><a href="{url}">{title}</a></body>
+</html>
+"""
+
+
+def normalize(path: str) -> str:
+    """Output directory of a URL path, e.g. `posts/hello` for `/posts/hello/`"""
+    path = path.split("#", 1)[0].split("?", 1)[0].strip("/")
+    if posixpath.basename(path) == "index.html":
+        path = posixpath.dirname(path)
+    normalized = posixpath.normpath(path) if path else ""
+    if normalized.startswith("..") or normalized == ".":
+        raise CLogException(f"Invalid URL path: {path}")
+    return normalized
+
+
+def page_path(page: Page) -> str:
+    """Output directory of a page's single page, e.g. `posts/hello`"""
+    if page.html_directory:
+        return f"{page.html_directory}/{page.html_filename}"
+    return page.html_filename
+
+
+def reserved_dirs(archives: bool = True) -> Tuple[str, ...]:
+    """Output directories written by the build itself"""
+    return RESERVED_DIRS + (ARCHIVE_DIR,) if archives else RESERVED_DIRS
+
+
+def redirect_html(page: Page) -> str:
+    """Page sent from an alias, pointing browsers and crawlers to `page`"""
+    return REDIRECT_TEMPLATE.format(
+        title=html.escape(page.title or ""), url=html.escape(page.href)
+    )
+
+
+class Routes:
+    """Routing table of a build: the page behind every URL of the site.
+
+    It is built once all pages are known, so that URLs are computed once per
+    build and two pages written to the same place are reported before
+    anything is rendered. Paths are output directories without slashes, e.g.
+    `posts/hello`. `reserved` paths, and everything under them except for
+    the home page, are generated by the build itself.
+    """
+
+    def __init__(self, reserved: Iterable[str] = ()):
+        self.reserved = set(reserved)
+        self.pages = {}  # type: Dict[str, Page]
+        self.aliases = {}  # type: Dict[str, Page]
+        self._sources = {}  # type: Dict[str, Page]
+        self._owners = defaultdict(list)  # type: Dict[str, List[str]]
+
+    def add(self, rel_path: str, page: Page):
+        """Route the page whose source is `rel_path` in content/"""
+        path = page_path(page)
+        # Forget the URL of a previous build, then keep the current one
+        page.href = None
+        page.href = page.href
+        self._sources[rel_path] = page
+        self.pages.setdefault(path, page)
+        self._owners[path].append(rel_path)
+        for number in range(2, len(page.parts) + 1):
+            self._owners[f"{path}/{number}"].append(rel_path)
+        for alias in page.aliases:
+            alias_path = normalize(str(alias))
+            if alias_path == path:
+                continue
+            self.aliases.setdefault(alias_path, page)
+            self._owners[alias_path].append(rel_path)
+
+    def collisions(self) -> List[Tuple[str, List[str]]]:
+        """URLs claimed by more than one page or alias, or by a page and the
+        build itself, with the sources claiming them"""
+        return sorted(
+            (path, owners)
+            for path, owners in self._owners.items()
+            if len(owners) > 1 or self.is_reserved(path)
+        )
+
+    def __contains__(self, path: str) -> bool:
+        """Whether a page or alias is routed at `path`"""
+        return path in self._owners
+
+    def claims(self, path: str) -> bool:
+        """Whether a page or alias is routed at `path` or below it"""
+        return any(p == path or p.startswith(f"{path}/") for p in self._owners)
+
+    def is_reserved(self, path: str) -> bool:
+        return path in self.reserved or any(
+            path.startswith(f"{reserved}/") for reserved in self.reserved if reserved
+        )
+
+    def check(self):
+        """Raise an error listing every URL used more than once"""
+        messages = []
+        for path, owners in self.collisions():
+            if self.is_reserved(path):
+                owners = owners + ["a generated listing"]
+            url = f"/{path}/" if path else "/"
+            messages.append(f"URL {url} is used by {', '.join(owners)}")
+        if messages:
+            raise CLogException("\n".join(messages))
+
+    def url_for(self, path: str) -> str:
+        """URL of a page from its source in content/ (`posts/hello.md`) or
+        one of its URLs (`/posts/hello/`, including aliases)"""
+        page = self._sources.get(path.lstrip("/"))
+        if page is None:
+            key = normalize(path)
+            page = self.pages.get(key) or self.aliases.get(key)
+        if page is None:
+            raise CLogException(f"No page found for {path}")
+        return page.href
+
+    def redirects(
+        self, pages: Optional[Iterable[Page]] = None
+    ) -> Iterator[Tuple[str, Page]]:
+        """Aliases and the page they redirect to, only those of `pages` if given"""
+        selected = None if pages is None else {id(p) for p in pages}
+        for alias_path, page in sorted(self.aliases.items()):
+            if selected is None or id(page) in selected:
+                yield alias_path, page
@@ -0,0 +1,152 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .discovery import Source
+from .page import Page
+from .plugins import Pipeline
+
+COSTS_FILE = "costs.json"
+# Seconds per byte of Markdown assumed until pages have been timed
+DEFAULT_SECONDS_PER_BYTE = 1e-6
+# Batches per worker: enough for the pool to even out the estimates' errors
+BATCHES_PER_WORKER = 4
+
+
+class CostModel:
+    """Time taken to parse each page by previous builds, used to estimate
+    the cost of parsing it again.
+
+    Pages that were never timed are estimated from their size, at the
+    average rate of the pages that were.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries = {}  # type: Dict[str, list]
+
+    def load(self) -> "CostModel":
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.entries, sort_keys=True))
+
+    def record(self, source: Source, seconds: float):
+        self.entries[source.rel_path] = [source.size, round(seconds, 6)]
+
+    def forget_except(self, rel_paths: Iterable[str]):
+        """Drop the pages that no longer exist"""
+        kept = set(rel_paths)
+        self.entries = {p: e for p, e in self.entries.items() if p in kept}
+
+    @property
+    def seconds_per_byte(self) -> float:
+        size = sum(entry[0] for entry in self.entries.values())
+        seconds = sum(entry[1] for entry in self.entries.values())
+        return seconds / size if size and seconds else DEFAULT_SECONDS_PER_BYTE
+
+    def estimate(self, sources: List[Source]) -> Dict[str, float]:
+        """Estimated seconds to parse each source, by path"""
+        rate = self.seconds_per_byte
+        estimates = {}
+        for source in sources:
+            entry = self.entries.get(source.rel_path)
+            if entry is None or not entry[0]:
+                estimates[source.path] = source.size * rate
+            else:
+                # Scaled by how much the page grew or shrank since
+                estimates[source.path] = entry[1] * source.size / entry[0]
+        return estimates
+
+
+def schedule(costs: Dict[str, float], jobs: int) -> List[List[str]]:
+    """Group the keys of `costs` into batches for `jobs` workers, most
+    expensive first.
+
+    Expensive items get a batch of their own and start first, so that they
+    don't finish last while other workers are idle. Cheap ones are grouped
+    into batches of about the same total cost, to save round trips.
+    """
+    ordered = sorted(costs, key=lambda key: (-costs[key], key))
+    target = sum(costs.values()) / (jobs * BATCHES_PER_WORKER)
+    batches, batch, batch_cost = [], [], 0.0
+    for key in ordered:
+        batch.append(key)
+        batch_cost += costs[key]
+        if batch_cost >= target:
+            batches.append(batch)
+            batch, batch_cost = [], 0.0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class PoolReport(NamedTuple):
+    jobs: int
+    batches: int
+    duration: float
+    busy: float  # Seconds spent working, summed over workers
+
+    @property
+    def utilisation(self) -> float:
+        capacity = self.jobs * self.duration
+        return min(self.busy / capacity, 1.0) if capacity else 0.0
+
+
+# Pipeline and options of a worker process of `parse_in_pool`
+_WORKER = None  # type: Optional[tuple]
+
+
+def _init_worker(plugins: list, engine: Optional[str], large_size, split_size):
+    global _WORKER
+    _WORKER = (Pipeline(plugins, engine), large_size, split_size)
+
+
+def _parse_batch(paths: List[str]) -> List[Tuple[str, dict, float, dict]]:
+    pipeline, large_size, split_size = _WORKER
+    results = []
+    for path in paths:
+        started = time.perf_counter()
+        page = Page.parse(path, pipeline, large_size=large_size, split_size=split_size)
+        seconds = time.perf_counter() - started
+        results.append((path, page.to_cache(), seconds, page.timings))
+    return results
+
+
+def parse_in_pool(
+    sources: List[Source],
+    costs: CostModel,
+    jobs: int,
+    pipeline: Pipeline,
+    large_size: Optional[int] = None,
+    split_size: Optional[int] = None,
+) -> Tuple[Dict[str, Tuple[dict, float, dict]], PoolReport]:
+    """Parse `sources` in `jobs` worker processes, longest first.
+
+    Returns `Page.to_cache()` data, the seconds taken and the plugin timings
+    of each source by path, and how busy the workers were.
+    """
+    started = time.perf_counter()
+    batches = schedule(costs.estimate(sources), jobs)
+    results = {}
+    workers = min(jobs, len(batches)) or 1
+    initargs = (pipeline.entries, pipeline.engine_name, large_size, split_size)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=initargs,
+    ) as executor:
+        futures = [executor.submit(_parse_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            for path, data, seconds, timings in future.result():
+                results[path] = (data, seconds, timings)
+    duration = time.perf_counter() - started
+    busy = sum(seconds for _, seconds, _ in results.values())
+    return results, PoolReport(workers, len(batches), duration, busy)
@@ -0,0 +1,31 @@
+from fnmatch import fnmatch
+from typing import Iterable
+
+TAG_PREFIX = "tag:"
+
+
+class Selection:
+    """Decides which sources a selective build (`clog build --only`) renders.
+
+    Each pattern is one of
+      * `tag:<name>` - pages tagged with `<name>`
+      * a section such as `posts/2024` - every page below that directory
+      * a glob such as `posts/*-draft.md` - matched against the path in content/
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.tags = set()
+        self.patterns = []
+        for pattern in patterns:
+            if pattern.startswith(TAG_PREFIX):
+                self.tags.add(pattern[len(TAG_PREFIX) :])
+            else:
+                self.patterns.append(pattern.strip("/"))
+
+    def matches(self, rel_path: str, tags: Iterable[str] = ()) -> bool:
+        if self.tags.intersection(tags or ()):
+            return True
+        for pattern in self.patterns:
+            if rel_path.startswith(pattern + "/") or fnmatch(rel_path, pattern):
+                return True
+        return False
@@ -0,0 +1,206 @@
+import asyncio
+import mimetypes
+import mmap
+import os
+import re
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from tornado import httpclient, web
+
+from .cache import file_digest
+from .output import Manifest
+
+# Files named by `clog.assets.fingerprinted_name`, or in a directory
+# fingerprinted as a whole, whose content never changes
+RE_FINGERPRINTED = re.compile(r"\.[0-9a-f]{10}(\.[A-Za-z0-9]+$|/)")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Precompressed siblings, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+CHUNK_SIZE = 1024 * 1024
+
+
+def accepted_encodings(header: str) -> set:
+    """Content codings from an Accept-Encoding header, leaving out q=0"""
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip().replace(" ", "")
+        if coding and quality not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class SiteFileHandler(web.StaticFileHandler):
+    """Serves a built site the way a production web server would.
+
+    ETags are the digests recorded in the build manifest, so files are not
+    read to answer conditional requests. Fingerprinted assets are cacheable
+    forever, everything else must be revalidated. `.br` and `.gz` siblings
+    written by `precompress` are sent to clients accepting them.
+    """
+
+    def initialize(self, path: str, manifest: Optional[Manifest] = None):
+        super().initialize(path, default_filename="index.html")
+        self.manifest = manifest
+        self.encoding = None  # type: Optional[str]
+        self.original_path = None  # type: Optional[str]
+
+    def validate_absolute_path(self, root: str, absolute_path: str) -> Optional[str]:
+        absolute_path = super().validate_absolute_path(root, absolute_path)
+        if absolute_path is None:
+            return None
+        self.original_path = absolute_path
+        accepted = accepted_encodings(self.request.headers.get("Accept-Encoding", ""))
+        modified = os.stat(absolute_path).st_mtime_ns
+        for encoding, suffix in ENCODINGS:
+            sibling = absolute_path + suffix
+            if encoding not in accepted or not os.path.isfile(sibling):
+                continue
+            stat = os.stat(sibling)
+            if stat.st_mtime_ns < modified:
+                continue  # Left over from a previous version of the file
+            self.encoding = encoding
+            # Sizes and dates are taken from the stat of the validated path
+            self._stat_result = stat
+            return sibling
+        return absolute_path
+
+    def compute_etag(self) -> Optional[str]:
+        digest = None
+        if self.manifest is not None:
+            rel_path = os.path.relpath(self.absolute_path, self.root)
+            digest = self.manifest.digest(Path(rel_path).as_posix())
+        if digest is None:
+            # Not recorded or changed since the build. Hashed on every request,
+            # since Tornado's class-wide hash cache would keep stale digests
+            digest = file_digest(self.absolute_path)
+        return f'"{digest[:32]}"'
+
+    @classmethod
+    def get_content_version(cls, abspath: str) -> str:
+        # Tornado's version reads the file with `get_content`, which this
+        # handler streams from an instance
+        return file_digest(abspath)
+
+    def get_content_type(self) -> str:
+        mime_type, _ = mimetypes.guess_type(self.original_path)
+        if mime_type is None:
+            return "application/octet-stream"
+        if mime_type.startswith("text/") or mime_type == "application/javascript":
+            return f"{mime_type}; charset=UTF-8"
+        return mime_type
+
+    def set_headers(self):
+        super().set_headers()
+        self.set_header("Vary", "Accept-Encoding")
+        if self.encoding is not None:
+            self.set_header("Content-Encoding", self.encoding)
+        if RE_FINGERPRINTED.search(self.original_path):
+            self.set_header("Cache-Control", IMMUTABLE)
+        else:
+            self.clear_header("Expires")
+            self.set_header("Cache-Control", "no-cache")
+
+    def get_content(self, abspath: str, start=None, end=None):
+        """Hands slices of the memory-mapped file to the connection.
+
+        Tornado's IOStream has no sendfile(), but it sends memoryviews
+        without copying them, so the file's pages go from the page cache to
+        the socket without being copied into Python objects. The empty
+        chunks yielded make `StaticFileHandler.get` flush the headers and
+        then wait for each slice to be sent.
+        """
+        size = os.path.getsize(abspath)
+        if size == 0:
+            return
+        with open(abspath, "rb") as reader:
+            mapped = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield b""  # Send the headers before writing to the connection
+            position, stop = start or 0, size if end is None else end
+            while position < stop:
+                view = memoryview(mapped)[position : min(position + CHUNK_SIZE, stop)]
+                self.request.connection.write(view)
+                position += len(view)
+                del view
+                yield b""
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # Still referenced by a closed stream, freed with it
+
+
+def make_app(root: Path, manifest: Optional[Manifest] = None) -> web.Application:
+    return web.Application(
+        [(r"/(.*)", SiteFileHandler, {"path": root.as_posix(), "manifest": manifest})],
+        # Files change between builds, so their hashes must not be kept
+        static_hash_cache=False,
+    )
+
+
+class LoadTestResult(NamedTuple):
+    requests: int
+    errors: int
+    duration: float
+    latencies: List[float]  # Seconds, sorted
+    bytes_received: int
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.duration if self.duration else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Latency below which `percent` of the requests completed"""
+        if not self.latencies:
+            return 0.0
+        rank = max(0, int(round(percent / 100 * len(self.latencies))) - 1)
+        return self.latencies[min(rank, len(self.latencies) - 1)]
+
+
+async def load_test(
+    base_url: str,
+    paths: List[str],
+    requests: int = 1000,
+    concurrency: int = 10,
+    headers: Optional[dict] = None,
+) -> LoadTestResult:
+    """Fetch `paths` in turn from `base_url` until `requests` have been made,
+    with `concurrency` requests in flight"""
+    client = httpclient.AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+    latencies, errors, received = [], 0, 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors, received
+        for number in counter:
+            url = base_url.rstrip("/") + "/" + paths[number % len(paths)].lstrip("/")
+            started = time.perf_counter()
+            response = await client.fetch(
+                url, headers=headers, raise_error=False, decompress_response=False
+            )
+            latencies.append(time.perf_counter() - started)
+            if response.code >= 400:  # Includes 599 for connection errors
+                errors += 1
+            received += len(response.body or b"")
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        client.close()
+    duration = time.perf_counter() - started
+    return LoadTestResult(requests, errors, duration, sorted(latencies), received)
+
+
+def page_urls(manifest: Manifest) -> List[str]:
+    """URLs of the pages recorded in a build manifest"""
+    urls = []
+    for rel_path in sorted(manifest.entries):
+        if rel_path == "index.html":
+            urls.append("/")
+        elif rel_path.endswith("/index.html"):
+            urls.append("/" + rel_path[: -len("index.html")])
+    return urls
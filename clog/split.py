@@ -0,0 +1,102 @@
+import html
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+
+from .assets import RE_FENCE
+
+# Size of the pieces large documents are converted in
+CHUNK_SIZE = 256 * 1024
+# Headings up to this level start a new part of a split page
+SPLIT_LEVEL = 2
+
+RE_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+# Link reference definitions, e.g. `[id]: https://example.com` (not footnotes)
+RE_REFERENCE = re.compile(r"^ {0,3}\[[^\]^][^\]]*\]:\s*\S")
+RE_FOOTNOTE = re.compile(r"^ {0,3}\[\^[^\]]+\]:")
+# Lines that may continue the block before them even after a blank line:
+# indented code or list content, list items, definitions and raw HTML
+RE_CONTINUATION = re.compile(r"^(\s|[-*+]\s|\d+[.)]\s|:|<)")
+
+
+class PagePart(NamedTuple):
+    title: str
+    html: str
+
+
+def heading(line: str):
+    """`(level, text)` of an ATX heading line, None for other lines"""
+    match = RE_HEADING.match(line)
+    if match is None:
+        return None
+    return len(match.group(1)), match.group(2)
+
+
+def split_blocks(
+    lines: Iterable[str], size: int, level: int = 6
+) -> Iterator[List[str]]:
+    """Group a stream of Markdown lines into blocks of about `size` characters.
+
+    A new block only starts at a heading of at most `level`, once the current
+    block is at least `size` long, and never inside a code block, so that
+    each block can be converted on its own. Blocks without such headings
+    are cut at the start of a paragraph once twice as long. Blocks are
+    yielded as soon as they are complete.
+    """
+    block, block_size, in_code = [], 0, False
+    for line in lines:
+        if not in_code and block_size >= size:
+            found = heading(line)
+            if (found is not None and found[0] <= level) or (
+                block_size >= 2 * size
+                and not block[-1].strip()
+                and line.strip()
+                and not RE_CONTINUATION.match(line)
+            ):
+                yield block
+                block, block_size = [], 0
+        if RE_FENCE.match(line):
+            in_code = not in_code
+        elif "<pre" in line and "</pre>" not in line:
+            in_code = True  # Code blocks rewritten by the codeblocks plugin
+        elif "</pre>" in line and "<pre" not in line:
+            in_code = False
+        block.append(line)
+        block_size += len(line) + 1
+    if block:
+        yield block
+
+
+def scan_definitions(path) -> Tuple[str, bool]:
+    """Link reference definitions of a document, added to each block so that
+    references resolve wherever they are defined, and whether it defines
+    footnotes, which are numbered per conversion and so can't be converted
+    in blocks. Both are needed before the first block is converted, so they
+    are read in a pass of their own"""
+    definitions, footnotes = [], False
+    with open(path, encoding="utf-8") as fp:
+        for line in fp:
+            if RE_REFERENCE.match(line):
+                definitions.append(line.strip())
+            elif not footnotes and RE_FOOTNOTE.match(line):
+                footnotes = True
+    return ("\n\n" + "\n".join(definitions) if definitions else ""), footnotes
+
+
+def part_navigation(parts: List[PagePart], current: int, hrefs: List[str]) -> str:
+    """Links between the parts of a split page, `current` counting from 0"""
+    items = []
+    for number, (part, href) in enumerate(zip(parts, hrefs)):
+        title = html.escape(part.title)
+        if number == current:
+            items.append(f'<li aria-current="page"><strong>{title}</strong></li>')
+        else:
+            items.append(f'<li><a href="{href}">{title}</a></li>')
+    links = []
+    if current > 0:
+        links.append(f'<a rel="prev" href="{hrefs[current - 1]}">&larr; Previous</a>')
+    if current < len(parts) - 1:
+        links.append(f'<a rel="next" href="{hrefs[current + 1]}">Next &rarr;</a>')
+    return (
+        f'<nav class="page-parts">\n<ol>\n{"".join(items)}\n</ol>\n'
+        f'<p>{" ".join(links)}</p>\n</nav>'
+    )
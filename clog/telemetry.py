@@ -0,0 +1,116 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from statistics import median
+from typing import Dict, List, NamedTuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+HISTORY_FILE = "history.jsonl"
+# Metrics compared against previous runs by `clog stats`
+TRACKED_METRICS = ("duration", "peak_rss")
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes, 0 if unknown"""
+    if resource is None:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+class PhaseTimer:
+    """Accumulates the wall-clock time spent in each phase of a build"""
+
+    def __init__(self):
+        self.phases = {}  # type: Dict[str, float]
+
+    @contextmanager
+    def __call__(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+
+class Regression(NamedTuple):
+    metric: str
+    value: float
+    median: float
+
+    @property
+    def change(self) -> float:
+        return self.value / self.median - 1 if self.median else 0.0
+
+
+class History:
+    """Build records stored one JSON object per line, oldest first"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def append(self, record: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as writer:
+            writer.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def load(self) -> List[dict]:
+        if not self.path.exists():
+            return []
+        records = []
+        for line in self.path.read_text(encoding="utf-8").splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # Partially written line from an interrupted build
+        return records
+
+
+def _metrics(record: dict) -> Dict[str, float]:
+    metrics = {m: record[m] for m in TRACKED_METRICS if record.get(m)}
+    for phase, seconds in record.get("phases", {}).items():
+        metrics[f"phases.{phase}"] = seconds
+    return metrics
+
+
+def _kind(record: dict) -> tuple:
+    """What makes two runs comparable. Runs recorded before `selective` and
+    `rendered` were rendered every page"""
+    pages = record.get("pages")
+    return bool(record.get("selective")), pages, record.get("rendered", pages)
+
+
+def find_regressions(
+    records: List[dict], threshold: float = 0.2, window: int = 10
+) -> List[Regression]:
+    """Compare the latest record with the median of the `window` runs before it.
+
+    Only runs of the same kind (full or `--only`) that had and rendered the
+    same number of pages are compared, so that a site growing or a selective
+    build is not reported as a regression, or taken as the norm.
+    """
+    if len(records) < 2:
+        return []
+    latest = records[-1]
+    previous = [r for r in records[:-1] if _kind(r) == _kind(latest)]
+    previous = previous[-window:]
+    if not previous:
+        return []
+
+    regressions = []
+    for metric, value in _metrics(latest).items():
+        values = [m[metric] for m in map(_metrics, previous) if metric in m]
+        if not values:
+            continue
+        regression = Regression(metric, value, median(values))
+        if regression.change > threshold:
+            regressions.append(regression)
+    return regressions
@@ -50,3 +50,16 @@ def assert_site_is_valid(path: Union[str, Path]):
         assert_directory_exists(site_dir.joinpath(path))
     for path in expected_files:
         assert_file_exists(site_dir.joinpath(path))
+
+
+def make_site(directory: Union[Path, str], pages: dict):
+    """Creates a site in `directory` with `pages` mapping content paths to markdown"""
+    from clog.models import Site
+
+    site = Site(cwd=Path(directory).resolve())
+    site.create()
+    for rel_path, markup in pages.items():
+        path = site.content_dir.joinpath(rel_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(markup)
+    return site
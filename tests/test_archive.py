@@ -0,0 +1,99 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from clog.archive import Collections
+from clog.page import Page
+from tests._helpers import make_site
+
+
+def _post(title, date, tags="[python]"):
+    return f'+++\ntitle = "{title}"\ndate = {date}\ntags = {tags}\n+++\n{title}\n'
+
+
+def _page(title, date, rel_dir="posts", tags=("python",)):
+    page = Page.from_meta({"title": f'"{title}"', "date": date, "tags": list(tags)})
+    page.html_directory = rel_dir
+    page.is_toplevel = rel_dir == ""
+    return page
+
+
+def test_collections_are_sorted_and_read_only():
+    pages = [
+        _page("Old", "2019-12-31"),
+        _page("New", "2020-03-02", rel_dir="notes", tags=()),
+        _page("Middle", "2020-03-01"),
+        _page("About", "2020-05-01", rel_dir=""),
+    ]
+    collections = Collections(pages)
+    assert [p.title for p in collections.by_date] == ["New", "Middle", "Old"]
+    assert list(collections.by_section) == ["notes", "posts"]
+    assert [p.title for p in collections.by_section["posts"]] == ["Middle", "Old"]
+    assert [p.title for p in collections.by_tag["python"]] == ["Middle", "Old"]
+    assert list(collections.by_year) == [2020, 2019]
+    assert list(collections.by_month) == [(2020, 3), (2019, 12)]
+    assert collections.buckets == [(2020, None), (2020, 3), (2019, None), (2019, 12)]
+    assert collections.archive(2020, 4) == ()
+    with pytest.raises(TypeError):
+        collections.by_year[2021] = ()
+
+
+def test_build_writes_archive_pages():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {
+                "posts/a.md": _post("First", "2020-03-01"),
+                "posts/b.md": _post("Second", "2020-04-01"),
+                "posts/c.md": _post("Third", "2021-01-15"),
+            },
+        )
+        site.build()
+        public = site.publish_dir
+        year = public.joinpath("archive/2020/index.html").read_text()
+        assert year.index("Second") < year.index("First")
+        assert "Third" not in year
+        month = public.joinpath("archive/2020/03/index.html").read_text()
+        assert "March 2020" in month and "First" in month and "Second" not in month
+        assert public.joinpath("archive/2021/01/index.html").exists()
+        index = public.joinpath("index.html").read_text()
+        assert index.index("Third") < index.index("Second") < index.index("First")
+
+
+def test_selective_build_only_updates_affected_archives():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {
+                "posts/a.md": _post("First", "2020-03-01"),
+                "posts/b.md": _post("Second", "2019-07-01"),
+            },
+        )
+        site.build()
+        public = site.publish_dir
+        untouched = public.joinpath("archive/2019/07/index.html").stat().st_mtime_ns
+
+        site.content_dir.joinpath("posts/a.md").write_text(_post("First", "2021-02-01"))
+        site.build(only=["posts/a.md"])
+        assert not public.joinpath("archive/2020").exists()
+        assert "First" in public.joinpath("archive/2021/02/index.html").read_text()
+        assert "First" in public.joinpath("archive/2021/index.html").read_text()
+        assert public.joinpath("archive/2019/07/index.html").stat().st_mtime_ns == untouched
+
+
+def test_full_build_removes_only_stale_archives():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {
+                "posts/a.md": _post("First", "2020-03-01"),
+                "posts/b.md": _post("Second", "2021-04-01"),
+            },
+        )
+        site.build()
+        site.content_dir.joinpath("posts/b.md").write_text(_post("Second", "2020-03-02"))
+        site.build()
+        public = site.publish_dir
+        assert "Second" in public.joinpath("archive/2020/03/index.html").read_text()
+        assert not public.joinpath("archive/2021").exists()
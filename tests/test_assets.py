@@ -0,0 +1,80 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from clog.assets import (
+    MATHJAX_FONTS,
+    VENDORED_ASSETS,
+    cache_key,
+    fingerprint,
+    has_codeblock,
+    has_math,
+)
+from tests._helpers import make_site
+
+PLAIN = '+++\ntitle = "Plain"\ndate = 2020-03-01\n+++\nJust text\n'
+CODE = '+++\ntitle = "Code"\ndate = 2020-03-01\n+++\n```python\nprint(1)\n```\n'
+MATH = '+++\ntitle = "Math"\ndate = 2020-03-01\n+++\nEuler: $$e^{i\\pi} + 1 = 0$$\n'
+TEX = '+++\ntitle = "TeX"\ndate = 2020-03-01\n+++\n```latex\n\\begin{equation}\n```\n'
+
+
+def test_detects_math_and_code():
+    assert has_math("$$x^2$$") and has_math(r"inline \(x\)")
+    assert not has_math("costs $5")
+    assert has_math(r"display \[x^2\]") and has_math(r"\[")
+    assert not has_math(r"a literal \[bracket] in prose")
+    assert has_codeblock("```python") and has_codeblock("  ~~~")
+    assert not has_codeblock("use `code` inline")
+
+
+def test_scripts_are_only_included_where_needed():
+    with TemporaryDirectory() as temp_dir:
+        pages = {
+            "posts/plain.md": PLAIN,
+            "posts/code.md": CODE,
+            "posts/math.md": MATH,
+            "posts/tex.md": TEX,
+        }
+        site = make_site(Path(temp_dir) / "site", pages)
+        site.build()
+
+        flags = {p.title: (p.needs_highlight, p.needs_math) for p in site.pages}
+        assert flags == {
+            "Plain": (False, False),
+            "Code": (True, False),
+            "Math": (False, True),
+            "TeX": (True, False),  # Math delimiters in code don't count
+        }
+
+        def _read(name):
+            return site.publish_dir.joinpath("posts", name, "index.html").read_text()
+
+        assert "highlight" not in _read("plain") and "MathJax" not in _read("plain")
+        assert "highlight.min.js" in _read("code") and "MathJax" not in _read("code")
+        assert "MathJax" in _read("math") and "hljs" not in _read("math")
+        assert "MathJax" not in site.publish_dir.joinpath("index.html").read_text()
+
+
+def test_vendored_assets_are_fingerprinted():
+    with TemporaryDirectory() as temp_dir:
+        site = make_site(Path(temp_dir) / "site", {"posts/code.md": CODE})
+        site.config_path.write_text(site.config_path.read_text() + "vendorAssets: true\n")
+        # Seed the download cache so the test does not need the network
+        site.load_config()
+        cache = site.open_cache()
+        for asset in VENDORED_ASSETS + MATHJAX_FONTS:
+            cache.put("vendor", cache_key(asset), f"/* {asset.filename} */".encode())
+        site.content_dir.joinpath("posts/math.md").write_text(MATH)
+        site.build()
+
+        digest = fingerprint(b"/* highlight.min.js */")
+        vendored = site.publish_dir.joinpath("static", "vendor", f"highlight.min.{digest}.js")
+        assert vendored.exists()
+        html = site.publish_dir.joinpath("posts", "code", "index.html").read_text()
+        assert f"/static/vendor/highlight.min.{digest}.js" in html
+        assert "libs/highlight.js" not in html
+        html = site.publish_dir.joinpath("posts", "math", "index.html").read_text()
+        assert "cdn.jsdelivr.net" not in html
+        fonts = site.publish_dir.joinpath("static", "vendor").glob("mathjax-fonts.*")
+        directory = next(fonts)
+        assert f'fontURL: "/static/vendor/{directory.name}"' in html
+        assert directory.joinpath("MathJax_Main-Regular.woff").exists()
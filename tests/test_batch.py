@@ -0,0 +1,75 @@
+import tempfile
+from pathlib import Path
+
+from clog.batch import SharedResources, build_site, build_sites, read_sites
+from tests._helpers import make_site
+
+POST = '+++\ntitle = "Hello"\ndate = 2020-03-01\n+++\nHello from {}\n'
+
+
+def _make_sites(directory, names):
+    sites = []
+    for name in names:
+        site = make_site(Path(directory, name), {"posts/hello.md": POST.format(name)})
+        config = site.config_path.read_text().replace("My New CLOG Site", name)
+        site.config_path.write_text(config)
+        sites.append(site)
+    return sites
+
+
+def test_sites_share_templates_and_pipelines():
+    with tempfile.TemporaryDirectory() as directory:
+        sites = _make_sites(directory, ["blog", "docs", "team"])
+        shared = SharedResources(cache_dir=Path(directory, "cache"))
+        results = [build_site(site.cwd, shared) for site in sites]
+        assert [r.error for r in results] == [None, None, None]
+        assert [r.reused_templates for r in results] == [False, True, True]
+        assert shared.counters == {"templates": 2, "pipelines": 2}
+        assert Path(directory, "cache", "pages").is_dir()
+        for site in sites:
+            # Fragments such as the navigation are not shared between sites
+            html = site.publish_dir.joinpath("index.html").read_text()
+            assert f'navbar-brand" href="/">{site.cwd.name}</a>' in html
+            post = site.publish_dir.joinpath("posts/hello/index.html").read_text()
+            assert f"Hello from {site.cwd.name}" in post
+
+
+def test_failed_sites_are_reported():
+    with tempfile.TemporaryDirectory() as directory:
+        (site,) = _make_sites(directory, ["blog"])
+        empty = Path(directory, "empty")
+        empty.mkdir()
+        results = build_sites([empty, site.cwd])
+        assert results[0].error == "InvalidSite" and results[0].pages == 0
+        assert results[1].error is None and results[1].pages == 1
+
+
+def test_unexpected_errors_do_not_stop_other_sites():
+    with tempfile.TemporaryDirectory() as directory:
+        sites = _make_sites(directory, ["blog", "broken", "docs"])
+        sites[1].content_dir.joinpath("posts/hello.md").write_bytes(
+            POST.format("broken").encode() + b"\xff\xfe"
+        )
+        for jobs in (1, 2):
+            results = build_sites([s.cwd for s in sites], jobs=jobs)
+            assert [r.pages for r in results] == [1, 0, 1]
+            assert results[1].error.startswith("UnicodeDecodeError")
+
+
+def test_sites_are_built_by_workers():
+    with tempfile.TemporaryDirectory() as directory:
+        sites = _make_sites(directory, ["blog", "docs"])
+        results = build_sites([s.cwd for s in sites], jobs=2)
+        assert [r.pages for r in results] == [1, 1]
+        assert all(s.publish_dir.joinpath("index.html").exists() for s in sites)
+
+
+def test_read_sites_from_a_list():
+    with tempfile.TemporaryDirectory() as directory:
+        listing = Path(directory, "sites.txt")
+        listing.write_text("# Team sites\nblog\n\ndocs/site\n")
+        assert read_sites([listing.as_posix(), "other"]) == [
+            Path(directory, "blog"),
+            Path(directory, "docs/site"),
+            Path("other"),
+        ]
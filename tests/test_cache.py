@@ -0,0 +1,169 @@
+import os
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from click.testing import CliRunner
+
+import clog
+from clog.cache import (
+    Cache,
+    NamespaceStats,
+    TemplateBytecodeCache,
+    digest,
+    parse_size,
+)
+from clog.cli import cache as cache_command
+from clog.fragments import FragmentCacheExtension
+from clog.models import Site
+from tests._helpers import make_site
+
+PAGES = {
+    "about.md": '+++\ntitle = "About"\n+++\nAbout me\n',
+    "posts/hello.md": '+++\ntitle = "Hello"\ndate = 2020-03-01\n+++\nHi\n',
+}
+
+
+def test_cache_round_trip_and_atomic_files():
+    with TemporaryDirectory() as temp_dir:
+        cache = Cache(Path(temp_dir))
+        key = digest("a", "b")
+        assert key != digest("ab", "")
+        assert cache.get("html", key) is None
+        cache.put("html", key, b"<p>x</p>")
+        cache.put_json("pages", key, {"html": "x"})
+        assert cache.get("html", key) == b"<p>x</p>"
+        assert cache.get_json("pages", key) == {"html": "x"}
+        assert cache.get("html", key, validate=lambda data: False) is None
+        assert cache.hits["html"] == 1 and cache.misses["html"] == 2
+        assert cache.namespaces() == ["html", "pages"]
+        assert not list(Path(temp_dir).rglob(".tmp-*"))
+
+
+def test_cache_is_shared_between_checkouts(monkeypatch):
+    with TemporaryDirectory() as temp_dir:
+        monkeypatch.setenv("CLOG_CACHE_DIR", str(Path(temp_dir, "shared")))
+        first = make_site(Path(temp_dir) / "first", PAGES)
+        second = make_site(Path(temp_dir) / "second", PAGES)
+        second.content_dir.joinpath("posts/hello.md").write_text(
+            PAGES["posts/hello.md"].replace("Hi", "Changed")
+        )
+
+        site = Site(first.cwd)
+        first_result = site.build(output=clog.MemoryOutput())
+        assert site.cache.misses["pages"] == 2 and site.cache.misses["html"] == 2
+        assert first_result.counters["cache_misses"] >= 4
+
+        site = Site(second.cwd)
+        result = site.build(output=clog.MemoryOutput())
+        assert result.counters["parsed"] == 1
+        assert site.cache.hits["pages"] == 1 and site.cache.hits["html"] == 1
+        assert site.cache.hits["templates"] > 0
+        assert "Changed" in result.output.read_text("posts/hello/index.html")
+        assert (
+            result.output.files["about/index.html"]
+            == first_result.output.files["about/index.html"]
+        )
+
+        # Templates are part of the key of rendered pages
+        single = second.cwd.joinpath("themes/basic/layouts/_default/single.html")
+        single.write_text(single.read_text().replace("Published on", "Posted on"))
+        result = Site(second.cwd).build(output=clog.MemoryOutput())
+        assert result.counters["parsed"] == 0
+        assert "Posted on" in result.output.read_text("posts/hello/index.html")
+
+
+def test_parse_size():
+    assert parse_size("500MB") == 500 * 1024 ** 2
+    assert parse_size("2G") == 2 * 1024 ** 3
+    assert parse_size("1.5 KiB") == 1536
+    assert parse_size(100) == 100
+
+
+def test_prune_evicts_least_recently_used_and_old_entries():
+    with TemporaryDirectory() as temp_dir:
+        cache = Cache(Path(temp_dir))
+        keys = [digest(str(i)) for i in range(4)]
+        for age, key in zip((400, 300, 200, 100), keys):
+            cache.put("html", key, b"x" * 10)
+            path = cache._path("html", key)
+            os.utime(path, (time.time() - age, time.time() - age))
+        cache.get("html", keys[0])  # Now the most recently used
+
+        assert cache.stats() == {"html": NamespaceStats(4, 40)}
+        assert cache.prune(max_size=25) == (2, 20)
+        assert cache.get("html", keys[1]) is None
+        assert cache.get("html", keys[2]) is None
+        assert cache.get("html", keys[0]) is not None
+
+        assert cache.prune(max_age=50) == (1, 10)
+        assert cache.get("html", keys[3]) is None
+        cache.clear()
+        assert cache.stats() == {}
+
+
+def test_cache_cli(monkeypatch):
+    with TemporaryDirectory() as temp_dir:
+        site = make_site(Path(temp_dir) / "site", PAGES)
+        clog.build(site.cwd, output=clog.MemoryOutput())
+        monkeypatch.chdir(site.cwd)
+        runner = CliRunner()
+
+        result = runner.invoke(cache_command, ["stats"])
+        assert result.exit_code == 0
+        assert "pages" in result.output and "html" in result.output
+
+        result = runner.invoke(cache_command, ["prune", "--max-size", "0"])
+        assert result.exit_code == 0 and "Removed" in result.output
+        assert all(s.entries == 0 for s in site.open_cache().stats().values())
+
+        result = runner.invoke(cache_command, ["clear"])
+        assert result.exit_code == 0
+        assert site.open_cache().stats() == {}
+
+
+def test_rendered_pages_list_the_current_pages():
+    with TemporaryDirectory() as temp_dir:
+        site = make_site(Path(temp_dir) / "site", PAGES)
+        single = site.cwd.joinpath("themes/basic/layouts/_default/single.html")
+        single.write_text(
+            single.read_text().replace(
+                "{{ page.html }}",
+                "{{ page.html }}{% for p in site.pages %}<i>{{ p.title }}</i>{% endfor %}",
+            )
+        )
+        Site(site.cwd).build(output=clog.MemoryOutput())
+        site.content_dir.joinpath("posts/new.md").write_text(
+            '+++\ntitle = "Newer"\ndate = 2020-03-02\n+++\nNew\n'
+        )
+        result = Site(site.cwd).build(output=clog.MemoryOutput())
+        assert "<i>Newer</i>" in result.output.read_text("posts/hello/index.html")
+
+
+def test_writes_over_the_size_limit_prune_the_cache():
+    with TemporaryDirectory() as temp_dir:
+        Cache(Path(temp_dir)).put("html", digest("old"), b"x" * 10)
+        cache = Cache(Path(temp_dir), max_size=25)
+        cache.put("html", digest("0"), b"x" * 10)
+        assert cache.stats() == {"html": NamespaceStats(2, 20)}
+        os.utime(cache._path("html", digest("0")), (time.time() + 1,) * 2)
+        cache.put("html", digest("1"), b"x" * 10)
+        assert cache.stats() == {"html": NamespaceStats(2, 20)}
+        assert cache.contains("html", digest("1"))
+        assert not cache.contains("html", digest("old"))
+        # Later processes start from the size recorded by the prune
+        assert Cache(Path(temp_dir), max_size=25)._recorded_size() == 20
+
+        # Clearing forgets the recorded size, so new entries don't prune
+        cache.clear()
+        cache = Cache(Path(temp_dir), max_size=25)
+        cache.put("html", digest("2"), b"x" * 10)
+        assert cache._recorded_size() == 10 and not cache._marker.exists()
+
+
+def test_compiled_templates_depend_on_the_extensions():
+    with TemporaryDirectory() as temp_dir:
+        cache = Cache(Path(temp_dir))
+        plain = TemplateBytecodeCache(cache)
+        extended = TemplateBytecodeCache(cache, [FragmentCacheExtension])
+        assert plain.signature != extended.signature
@@ -0,0 +1,114 @@
+import tempfile
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from clog.check import Checker, read_header
+from clog.cli import main
+from clog.discovery import Source
+from tests._helpers import make_site
+
+
+def _page(title, date="2020-03-01", tags="[python]"):
+    return f'+++\ntitle = "{title}"\ndate = {date}\ntags = {tags}\n+++\nBody\n'
+
+
+def _messages(problems):
+    return {(p.rel_path, p.message) for p in problems}
+
+
+def test_read_header_stops_at_closing_delimeter():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "page.md")
+        # The body is not valid UTF-8, so reading past the header would fail
+        path.write_bytes(_page("Hello").encode("utf-8") + b"\xff\xfe")
+        stat = path.stat()
+        header = read_header(Source(path.as_posix(), "posts", stat.st_size, 0))
+        assert header.problems == ()
+        assert header.meta["title"] == '"Hello"'
+
+
+def test_check_reports_invalid_fields():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {
+                "posts/ok.md": _page("Fine"),
+                "posts/untitled.md": "+++\ndate = 2020-03-01\n+++\nBody\n",
+                "posts/date.md": _page("Bad date", date='"not a date"'),
+                "posts/tags.md": _page("Bad tags", tags="python"),
+                "posts/open.md": '+++\ntitle = "Open"\ndate = 2020-03-01\n',
+                "posts/line.md": '+++\ntitle = "Line"\nno separator\n+++\n',
+                "about.md": '+++\ntitle = "About"\n+++\nUndated top-level page\n',
+            },
+        )
+        checker = Checker(site)
+        problems = _messages(checker.check())
+        assert checker.checked == 7
+        assert problems == {
+            ("posts/untitled.md", "missing title"),
+            ("posts/date.md", "invalid date 'not a date'"),
+            ("posts/tags.md", "tags must be a list of text, not 'python'"),
+            ("posts/open.md", "front matter is missing or not closed"),
+            ("posts/line.md", "line 3: expected `key = value` in front matter"),
+        }
+
+
+def test_check_reports_url_collisions():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {
+                "posts/a.md": _page("Hello World"),
+                "posts/b.md": _page("Hello, world!"),
+                "posts/c.md": _page("Other"),
+                "tags.md": '+++\ntitle = "Tags"\n+++\nBody\n',
+                "archive/notes.md": _page("Notes"),
+                "posts/d.md": _page("Moved").replace(
+                    "+++\nBody", 'aliases = ["/posts/other/"]\n+++\nBody'
+                ),
+            },
+        )
+        problems = _messages(Checker(site).check())
+        assert problems == {
+            ("posts/c.md", "URL /posts/other/ is also used by posts/d.md"),
+            ("posts/d.md", "URL /posts/other/ is also used by posts/c.md"),
+            ("posts/a.md", "URL /posts/hello-world/ is also used by posts/b.md"),
+            ("posts/b.md", "URL /posts/hello-world/ is also used by posts/a.md"),
+            ("tags.md", "URL /tags/ is used by a generated listing"),
+            ("archive/notes.md", "URL /archive/notes/ is used by a generated listing"),
+        }
+
+
+def test_check_only_given_files(monkeypatch):
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {
+                "posts/a.md": _page("Hello"),
+                "posts/b.md": "+++\ndate = 2020-03-01\n+++\nNo title\n",
+            },
+        )
+        site.content_dir.joinpath("posts/c.md").write_text(_page("Hello"))
+        monkeypatch.chdir(site.cwd)
+        result = CliRunner().invoke(main, ["check", "content/posts/c.md", "README"])
+        assert result.exit_code == 1
+        assert "content/posts/c.md: URL /posts/hello/ is also used by posts/a.md" in (
+            result.output
+        )
+        assert "posts/b.md" not in result.output
+        assert "Checked 1 pages, found 1 problems" in result.output
+
+        site.content_dir.joinpath("posts/c.md").write_text(_page("Different"))
+        result = CliRunner().invoke(main, ["check", "content/posts/c.md"])
+        assert result.exit_code == 0
+
+
+def test_check_in_parallel_matches_sequential():
+    with tempfile.TemporaryDirectory() as directory:
+        pages = {f"posts/{i}.md": _page(f"Page {i}") for i in range(20)}
+        pages["posts/bad.md"] = _page("Bad", date="[1, 2]")
+        site = make_site(Path(directory, "site"), pages)
+        sequential = Checker(site, jobs=1).check()
+        assert sequential == Checker(site, jobs=2).check()
+        assert _messages(sequential) == {("posts/bad.md", "invalid date [1, 2]")}
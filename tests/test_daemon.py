@@ -0,0 +1,80 @@
+import socket
+import threading
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from clog.daemon import BuildDaemon, find_daemon
+from clog.models import Site
+from tests._helpers import make_site
+
+PAGE = '+++\ntitle = "{title}"\ndate = 2020-03-01\n+++\n{body}\n'
+
+
+def test_daemon_builds_and_renders_with_a_warm_site():
+    # Unix socket paths are limited to ~100 characters, so keep the path short
+    with TemporaryDirectory(dir="/tmp") as temp_dir:
+        site = make_site(Path(temp_dir) / "s", {"about.md": PAGE.format(title="About", body="v1")})
+        server = BuildDaemon(site)
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+        try:
+            client = find_daemon(site.cwd)
+            assert client is not None
+
+            response = client.request("build")
+            assert response["ok"] and response["result"] == 1
+            assert site.publish_dir.joinpath("about", "index.html").exists()
+            template = site.template_single
+
+            response = client.request("build", jobs=2, quiet=True)
+            assert response["ok"] and response["output"] == ""
+            assert site.template_single is template  # Templates stay compiled
+            assert site.jobs == 2
+
+            site.content_dir.joinpath("about.md").write_text(
+                PAGE.format(title="About", body="version two")
+            )
+            response = client.request("render", path="about.md")
+            assert response["ok"] and "version two" in response["result"]
+
+            response = client.request("render", path="missing.md")
+            assert not response["ok"] and "missing.md" in response["error"]
+
+            assert client.request("invalidate", templates=True)["ok"]
+            assert client.request("shutdown")["ok"]
+        finally:
+            thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert find_daemon(site.cwd) is None
+
+
+def test_previews_use_the_pages_of_the_last_build():
+    with TemporaryDirectory() as temp_dir:
+        pages = {
+            "about.md": PAGE.format(title="About", body="About us"),
+            "contact.md": PAGE.format(title="Contact", body="Write to us"),
+        }
+        site = make_site(Path(temp_dir, "site"), pages)
+        site.build()
+        built = site.publish_dir.joinpath("about/index.html").read_text()
+        assert site.render_source("about.md") == built
+        assert site.pages and 'href="/contact"' in built
+
+        # A fresh site, e.g. a daemon started after the build
+        assert Site(site.cwd).render_source("about.md") == built
+
+
+def test_busy_daemons_are_waited_for_and_stale_sockets_ignored():
+    with TemporaryDirectory(dir="/tmp") as temp_dir:
+        path = Path(temp_dir, ".clog", "daemon.sock")
+        path.parent.mkdir()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path.as_posix())
+        listener.listen(1)
+        try:
+            # Connected but never answered, like a daemon in the middle of a build
+            client = find_daemon(Path(temp_dir))
+            assert client is not None and client.timeout is None
+        finally:
+            listener.close()
+        assert find_daemon(Path(temp_dir)) is None
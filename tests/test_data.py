@@ -0,0 +1,122 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from clog.cache import Cache
+from clog.data import DataDirectory
+from clog.exceptions import CLogException
+from tests._helpers import make_site
+
+SINGLE = """{% extends "base.html" %}
+{% block content %}{{ page.html }}
+{% if page.title == "Team" %}{% for p in site.data.team.people %}<i>{{ p.name }}</i>{% endfor %}{% endif %}
+{% endblock %}
+"""
+
+
+def _write(root: Path, files: dict):
+    for rel_path, text in files.items():
+        path = root.joinpath(rel_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+def test_data_files_are_loaded_lazily_and_cached():
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory, "data")
+        _write(
+            root,
+            {
+                "menu.yaml": "- home\n- about\n",
+                "authors.json": '{"ada": {"name": "Ada"}}',
+                "settings.toml": 'title = "Site"\n',
+                "team/people.csv": "name,role\nAda,author\nAlan,editor\n",
+            },
+        )
+        data = DataDirectory(root)
+        data.reset(Cache(Path(directory, "cache")))
+        site_data = data.namespace()
+        assert site_data.keys() == ["authors", "menu", "settings", "team"]
+        assert site_data.menu == ["home", "about"]
+        assert site_data["authors"]["ada"]["name"] == "Ada"
+        assert site_data.settings == {"title": "Site"}
+        assert site_data.team.people[1] == {"name": "Alan", "role": "editor"}
+        assert not hasattr(site_data, "missing")
+        assert data.counters["parsed"] == 4
+
+        # Parsed once per build
+        data.reads = set()
+        assert site_data.menu == ["home", "about"]
+        assert data.reads == {"menu"} and data.counters["parsed"] == 4
+
+        # Restored from the cache by a new process
+        fresh = DataDirectory(root)
+        fresh.reset(Cache(Path(directory, "cache")))
+        assert fresh.namespace().team.people[0]["name"] == "Ada"
+        assert fresh.counters == {"cached": 1}
+
+
+def test_invalid_and_ambiguous_data_files():
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory, "data")
+        _write(root, {"broken.json": "{", "menu.yaml": "[]", "menu.json": "[]"})
+        data = DataDirectory(root)
+        with pytest.raises(CLogException, match="found both"):
+            data.namespace().menu
+        os.unlink(root.joinpath("menu.json"))
+        data.reset()
+        with pytest.raises(CLogException, match="data/broken.json"):
+            data.namespace().broken
+
+
+def test_only_pages_reading_changed_data_are_rendered_again():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {
+                "team.md": '+++\ntitle = "Team"\n+++\nOur team\n',
+                "posts/hello.md": '+++\ntitle = "Hello"\ndate = 2020-03-01\n+++\nHi\n',
+            },
+        )
+        layouts = site.cwd.joinpath("themes/basic/layouts/_default")
+        layouts.joinpath("single.html").write_text(SINGLE)
+        people = site.cwd.joinpath("data/team/people.yaml")
+        _write(people.parent, {"people.yaml": "- name: Ada\n"})
+
+        site.build()
+        team = site.publish_dir.joinpath("team/index.html")
+        assert "<i>Ada</i>" in team.read_text()
+
+        site.build()
+        assert site.cache.misses["html"] == 0
+
+        people.write_text("- name: Ada\n- name: Alan\n")
+        site.build()
+        assert "<i>Alan</i>" in team.read_text()
+        # Only the team page, the other one doesn't read the data
+        assert site.cache.misses["html"] == 1
+        assert site.cache.hits["html"] == 1
+
+
+def test_values_that_json_cannot_keep_are_parsed_again():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"), {"team.md": '+++\ntitle = "Team"\n+++\nOne\n'}
+        )
+        layouts = site.cwd.joinpath("themes/basic/layouts/_default")
+        layouts.joinpath("single.html").write_text(
+            SINGLE.replace("site.data.team.people", "[site.data.years[2020]]")
+        )
+        _write(site.cwd.joinpath("data"), {"years.yaml": "2020:\n  name: Ada\n"})
+        site.build()
+
+        # The page changed, so it is rendered again, reading the data
+        site.content_dir.joinpath("team.md").write_text(
+            '+++\ntitle = "Team"\n+++\nTwo\n'
+        )
+        site = type(site)(site.cwd)
+        site.build()
+        assert "<i>Ada</i>" in site.publish_dir.joinpath("team/index.html").read_text()
+        assert site.data_files.counters["parsed"] == 1
@@ -0,0 +1,136 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from clog.deploy import (
+    MANIFEST_NAME,
+    DeployPlan,
+    DirectoryTarget,
+    deploy,
+    open_target,
+)
+from clog.exceptions import CLogException
+from tests._helpers import make_site
+
+
+def _write(root: Path, files: dict):
+    for rel_path, text in files.items():
+        path = root.joinpath(rel_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+def _files(root: Path) -> dict:
+    return {
+        p.relative_to(root).as_posix(): p.read_text()
+        for p in root.rglob("*")
+        if p.is_file()
+    }
+
+
+def test_plan_compares_sizes_and_digests():
+    local = {"a": [1, "x"], "b": [1, "y"], "c": [2, "z"]}
+    remote = {"a": [1, "x"], "b": [1, "old"], "d": [3, "w"]}
+    assert DeployPlan.compare(local, remote) == DeployPlan(["c"], ["b"], ["d"], ["a"])
+
+
+def test_deploy_transfers_only_changes():
+    with tempfile.TemporaryDirectory() as directory:
+        public, www = Path(directory, "public"), Path(directory, "www")
+        _write(public, {"index.html": "home", "a/index.html": "a", "b/index.html": "b"})
+        result = deploy(public, DirectoryTarget(www.as_posix()))
+        assert len(result.plan.added) == 3
+        assert result.bytes_transferred == result.bytes_total == 6
+        assert _files(www) == _files(public)
+        # Kept out of the served tree
+        assert not www.joinpath(MANIFEST_NAME).exists()
+        assert Path(directory, "www" + MANIFEST_NAME).is_file()
+
+        result = deploy(public, DirectoryTarget(www.as_posix()))
+        assert result.plan.transfers == [] and result.bytes_transferred == 0
+
+        inode = www.joinpath("index.html").stat().st_ino
+        _write(public, {"a/index.html": "changed", "c/index.html": "new"})
+        public.joinpath("b/index.html").unlink()
+        result = deploy(public, DirectoryTarget(www.as_posix()))
+        assert result.plan.added == ["c/index.html"]
+        assert result.plan.changed == ["a/index.html"]
+        assert result.plan.removed == ["b/index.html"]
+        assert result.bytes_transferred == len("changed") + len("new")
+        assert _files(www) == _files(public)
+        # Unchanged files are hard-linked into the new tree, not copied
+        assert www.joinpath("index.html").stat().st_ino == inode
+        # No staging or old trees are left behind
+        assert sorted(p.name for p in Path(directory).iterdir()) == [
+            "public",
+            "www",
+            "www" + MANIFEST_NAME,
+        ]
+
+
+def test_deploy_swaps_symlinked_target():
+    with tempfile.TemporaryDirectory() as directory:
+        public = Path(directory, "public")
+        live, www = Path(directory, "releases/first"), Path(directory, "www")
+        _write(public, {"index.html": "home"})
+        _write(live, {"stale.html": "stale"})
+        www.symlink_to(live)
+        deploy(public, DirectoryTarget(www.as_posix()))
+        assert www.is_symlink() and www.resolve() != live.resolve()
+        assert not live.exists()
+        assert _files(www) == {"index.html": "home"}
+
+
+def test_deploy_in_place_deletes_removed_files():
+    with tempfile.TemporaryDirectory() as directory:
+        public, www = Path(directory, "public"), Path(directory, "www")
+        _write(public, {"index.html": "home", "old/deep/index.html": "old"})
+        deploy(public, DirectoryTarget(www.as_posix(), atomic=False))
+        public.joinpath("old/deep/index.html").unlink()
+        result = deploy(public, DirectoryTarget(www.as_posix(), atomic=False))
+        assert result.plan.removed == ["old/deep/index.html"]
+        assert not www.joinpath("old").exists()
+        assert _files(www) == {"index.html": "home"}
+
+
+def test_failed_deploy_leaves_target_untouched():
+    with tempfile.TemporaryDirectory() as directory:
+        public, www = Path(directory, "public"), Path(directory, "www")
+        _write(public, {"index.html": "home"})
+        deploy(public, DirectoryTarget(www.as_posix()))
+
+        class FailingTarget(DirectoryTarget):
+            def put(self, rel_path, source):
+                raise OSError("Disk full")
+
+        _write(public, {"index.html": "changed"})
+        with pytest.raises(OSError):
+            deploy(public, FailingTarget(www.as_posix()))
+        assert _files(www) == {"index.html": "home"}
+        assert sorted(p.name for p in Path(directory).iterdir()) == [
+            "public",
+            "www",
+            "www" + MANIFEST_NAME,
+        ]
+
+
+def test_open_target():
+    assert isinstance(open_target("dir:/srv/www"), DirectoryTarget)
+    with pytest.raises(CLogException):
+        open_target("s3:bucket")
+
+
+def test_site_deploy_to_directory():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {"posts/hello.md": '+++\ntitle = "Hello"\ndate = 2020-03-01\n+++\nHello\n'},
+        )
+        www = Path(directory, "www")
+        first = site.deploy_to(f"dir:{www}")
+        assert www.joinpath("posts/hello/index.html").exists()
+        assert first.bytes_transferred == first.bytes_total
+        second = site.deploy_to(f"dir:{www}")
+        # Only pages showing the build time could differ between builds
+        assert second.bytes_transferred < second.bytes_total
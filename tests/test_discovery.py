@@ -0,0 +1,98 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from clog.discovery import ContentIndex, read_ignore_patterns
+from tests._helpers import make_site
+
+PAGE = """+++
+title = "{title}"
+date = 2020-03-01
++++
+Body
+"""
+
+
+def _write(root: Path, rel_path: str, text="x"):
+    path = root.joinpath(rel_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_index_lists_markdown_and_skips_ignored():
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        for rel_path in [
+            "about.md",
+            "notes.txt",
+            "posts/b.md",
+            "posts/a.md",
+            "posts/2020/c.md",
+            "drafts/d.md",
+            ".hidden/e.md",
+            "posts/skip-me.md",
+        ]:
+            _write(root, rel_path)
+        index = ContentIndex(root, ignore=["posts/skip-*"])
+        sources = index.scan()
+        assert [s.rel_path for s in sources] == [
+            "about.md",
+            "posts/a.md",
+            "posts/b.md",
+            "posts/2020/c.md",
+        ]
+        assert [s.is_toplevel for s in sources] == [True, False, False, False]
+        assert sources[0].size == 1
+
+        index = ContentIndex(root, include_drafts=True)
+        assert "drafts/d.md" in [s.rel_path for s in index.scan()]
+
+
+def test_index_reuses_cached_listing_of_unchanged_directories():
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir, "content")
+        cache_path = Path(temp_dir, "cache.json")
+        _write(root, "posts/a.md")
+        _write(root, "about.md")
+
+        first = ContentIndex(root, cache_path=cache_path)
+        first.scan()
+        assert first.dirs_scanned == 2
+
+        second = ContentIndex(root, cache_path=cache_path)
+        assert second.scan() == first.sources
+        assert (second.dirs_scanned, second.dirs_reused) == (0, 2)
+
+        _write(root, "posts/b.md")
+        stat = os.stat(root.joinpath("posts"))
+        os.utime(root.joinpath("posts"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10))
+        third = ContentIndex(root, cache_path=cache_path)
+        assert len(third.scan()) == 3
+        assert (third.dirs_scanned, third.dirs_reused) == (1, 1)
+
+
+def test_read_ignore_patterns():
+    with TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir, ".clogignore")
+        path.write_text("# comment\n\nposts/old/\n*.wip.md\n")
+        assert read_ignore_patterns(path) == ["posts/old", "*.wip.md"]
+
+
+def test_site_build_uses_content_index():
+    with TemporaryDirectory() as temp_dir:
+        site = make_site(
+            Path(temp_dir) / "site",
+            {
+                "about.md": PAGE.format(title="About"),
+                "posts/hello.md": PAGE.format(title="Hello"),
+                "posts/old/ignored.md": PAGE.format(title="Ignored"),
+                "posts/wip.md": PAGE.format(title="Wip"),
+            },
+        )
+        site.cwd.joinpath(".clogignore").write_text("posts/old\n")
+        wip = site.content_dir.joinpath("posts/wip.md")
+        wip.write_text(wip.read_text().replace("+++\nBody", "draft = true\n+++\nBody"))
+        site.build()
+        assert [p.title for p in site.pages] == ["About", "Hello"]
+        assert [p.title for p in site.toplevel_pages] == ["About"]
+        assert site.publish_dir.joinpath("posts", "hello", "index.html").exists()
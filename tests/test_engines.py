@@ -0,0 +1,106 @@
+import re
+import tempfile
+from html.parser import HTMLParser
+from pathlib import Path
+
+import pytest
+
+from clog.engines import (
+    DEFAULT_EXTENSIONS,
+    ENGINES,
+    benchmark,
+    create_engine,
+)
+from clog.exceptions import CLogException
+from clog.plugins import Pipeline
+from tests._helpers import make_site
+
+CORPUS = Path(__file__).parent.joinpath("corpus")
+# Attributes that change what a reader sees or where links go
+ATTRIBUTES = ("href", "src", "alt", "title", "class")
+
+
+class _Structure(HTMLParser):
+    """Tags, meaningful attributes and text of a document, ignoring the
+    whitespace and attribute order engines differ on"""
+
+    def __init__(self):
+        super().__init__()
+        self.tokens = []
+
+    def handle_starttag(self, tag, attrs):
+        kept = sorted((k, v) for k, v in attrs if k in ATTRIBUTES)
+        self.tokens.append(("start", tag, tuple(kept)))
+
+    def handle_endtag(self, tag):
+        self.tokens.append(("end", tag))
+
+    def handle_data(self, data):
+        text = re.sub(r"\s+", " ", data).strip()
+        if text:
+            self.tokens.append(("text", text))
+
+
+def _structure(html):
+    parser = _Structure()
+    parser.feed(html)
+    parser.close()
+    return parser.tokens
+
+
+def _engine(name):
+    try:
+        return create_engine(name, DEFAULT_EXTENSIONS)
+    except CLogException as ex:
+        pytest.skip(str(ex))
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+@pytest.mark.parametrize("source", sorted(p.name for p in CORPUS.glob("*.md")))
+def test_engines_agree_on_corpus(name, source):
+    engine = _engine(name)
+    path = CORPUS.joinpath(source)
+    expected = path.with_suffix(".html").read_text()
+    # Converted twice, to make sure no state is kept between pages
+    engine.convert(path.read_text())
+    assert _structure(engine.convert(path.read_text())) == _structure(expected)
+
+
+def test_engine_is_selected_from_config_and_part_of_cache_keys():
+    default = Pipeline.from_config({})
+    assert default.markdown() is default.markdown()
+    assert "python-markdown@" in default.signature
+    with pytest.raises(CLogException, match="Unknown Markdown engine"):
+        Pipeline.from_config({"markdownEngine": "nope"}).markdown()
+
+
+def test_other_engines_reject_extensions():
+    for name in sorted(ENGINES):
+        if name == "python-markdown":
+            continue
+        with pytest.raises(CLogException):
+            create_engine(name, DEFAULT_EXTENSIONS + ["toc"])
+
+
+def test_benchmark_reports_throughput():
+    texts = [p.read_text() for p in sorted(CORPUS.glob("*.md"))]
+    result = benchmark(create_engine(None, DEFAULT_EXTENSIONS), texts, repeat=2)
+    assert result.engine == "python-markdown"
+    assert result.documents == 2 * len(texts)
+    assert result.documents_per_second > 0 and result.megabytes_per_second > 0
+
+
+def test_site_builds_with_configured_engine():
+    _engine("mistune")
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {"posts/hello.md": '+++\ntitle = "Hello"\ndate = 2020-03-01\n+++\n*Hi*\n'},
+        )
+        site.config_path.write_text(
+            site.config_path.read_text() + "markdownEngine: mistune\n"
+        )
+        site.build()
+        html = site.publish_dir.joinpath("posts/hello/index.html").read_text()
+        assert "<em>Hi</em>" in html
+        assert site.pipeline.markdown().name == "mistune"
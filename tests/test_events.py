@@ -0,0 +1,95 @@
+import io
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from click.testing import CliRunner
+
+from clog.cli import build
+from clog.events import EventBus, ProgressBar
+from tests._helpers import make_site
+
+POSTS = {
+    "posts/a.md": '+++\ntitle = "A"\ndate = 2020-03-01\n+++\nA\n',
+    "posts/b.md": '+++\ntitle = "B"\ndate = 2020-03-02\n+++\nB\n',
+}
+
+
+def test_builds_emit_events():
+    with TemporaryDirectory() as directory:
+        site = make_site(Path(directory, "site"), POSTS)
+        events = []
+        site.events.subscribe(events.append)
+        site.build()
+        kinds = [e["event"] for e in events]
+        assert kinds[:3] == ["build_started", "phase", "file_parsed"]
+        assert kinds[-1] == "build_finished"
+        parsed = [e for e in events if e["event"] == "file_parsed"]
+        assert [(e["path"], e["parsed"]) for e in parsed] == [
+            ("posts/a.md", True),
+            ("posts/b.md", True),
+        ]
+        rendered = {e["path"] for e in events if e["event"] == "page_rendered"}
+        assert {"index.html", "posts/a/index.html"} <= rendered
+        assert all(e["time"] >= 0 for e in events)
+
+        events.clear()
+        site._parsed.clear()
+        site.build()
+        hits = {(e["namespace"], e["path"]) for e in events if e["event"] == "cache_hit"}
+        assert ("pages", "posts/a.md") in hits
+        assert ("html", "posts/a/index.html") in hits
+
+
+def test_events_are_not_built_without_handlers():
+    bus = EventBus()
+    bus.emit("file_parsed", path="a.md")
+    received = []
+    bus.subscribe(received.append)
+    bus.emit("file_parsed", path="b.md")
+    assert [e["path"] for e in received] == ["b.md"]
+
+
+def test_progress_bar_is_throttled():
+    stream = io.StringIO()
+    bar = ProgressBar(stream, interval=1.0)
+    bar({"event": "phase", "time": 0.0, "name": "parse", "total": 100})
+    for n in range(100):
+        bar({"event": "file_parsed", "time": n * 0.05, "path": f"{n}.md"})
+    bar({"event": "build_finished", "time": 5.0})
+    lines = stream.getvalue().split("\r")[1:]
+    # The first draw, one after each second and the final count
+    assert len(lines) == 1 + 4 + 1
+    assert lines[-1].rstrip("\n").endswith("100/100")
+
+
+def test_build_writes_json_lines(monkeypatch):
+    with TemporaryDirectory() as directory:
+        site = make_site(Path(directory, "site"), POSTS)
+        monkeypatch.chdir(site.cwd)
+        result = CliRunner().invoke(build, ["--no-daemon", "--log-format", "jsonl"])
+        assert result.exit_code == 0
+        events = [json.loads(line) for line in result.stdout.splitlines()]
+        assert events[-1]["event"] == "build_finished"
+        assert events[-1]["pages"] == 2
+        assert "Done!" in result.stderr
+
+        result = CliRunner().invoke(build, ["--no-daemon", "--quiet"])
+        assert result.exit_code == 0 and result.output == ""
+
+
+def test_build_to_an_output_honours_build_options(monkeypatch):
+    with TemporaryDirectory() as directory:
+        site = make_site(Path(directory, "site"), POSTS)
+        monkeypatch.chdir(site.cwd)
+        archive = Path(directory, "site.zip").as_posix()
+        args = ["--output", f"zip:{archive}", "--jobs", "2"]
+        result = CliRunner().invoke(build, args + ["--log-format", "jsonl"])
+        assert result.exit_code == 0
+        events = [json.loads(line) for line in result.stdout.splitlines()]
+        assert events[-1]["event"] == "build_finished"
+        (pool,) = [e for e in events if e["event"] == "pool_finished"]
+        assert pool["jobs"] == 2
+
+        result = CliRunner().invoke(build, args + ["--quiet"])
+        assert result.exit_code == 0 and result.output == ""
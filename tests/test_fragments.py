@@ -0,0 +1,51 @@
+import tempfile
+from itertools import count
+from pathlib import Path
+
+from jinja2 import DictLoader, Environment
+
+from clog.fragments import FragmentCacheExtension
+from tests._helpers import make_site
+
+
+def test_fragments_are_rendered_once_per_dependencies():
+    env = Environment(
+        loader=DictLoader(
+            {
+                "page.html": '{% cache "nav", section %}[{{ renders() }}]{% endcache %}'
+                " {{ title }}",
+            }
+        ),
+        extensions=[FragmentCacheExtension],
+    )
+    renders = count(1)
+    template = env.get_template("page.html")
+    context = {"renders": lambda: next(renders)}
+    assert template.render(section="a", title="One", **context) == "[1] One"
+    assert template.render(section="a", title="Two", **context) == "[1] Two"
+    assert template.render(section="b", title="Three", **context) == "[2] Three"
+    assert env.fragment_cache.summary() == [("nav", 1, 3)]
+
+    env.fragment_cache.clear()
+    assert template.render(section="a", title="Four", **context) == "[3] Four"
+
+
+def test_build_reuses_navigation_and_site_markup():
+    with tempfile.TemporaryDirectory() as directory:
+        pages = {
+            f"posts/post-{i}.md": f'+++\ntitle = "Post {i}"\ndate = 2020-03-0{i}\n+++\nBody\n'
+            for i in range(1, 5)
+        }
+        pages["about.md"] = '+++\ntitle = "About"\n+++\nAbout\n'
+        site = make_site(Path(directory, "site"), pages)
+        site.config_path.write_text(site.config_path.read_text() + "cache: false\n")
+        site.build()
+        hits = dict((name, hits) for name, hits, _ in site.fragments.summary())
+        # Index, five single pages, the tag index and one archive per year/month
+        assert hits["navigation"] >= 5
+        assert hits["site.imports"] >= 5
+        assert site.counters["fragment_hits"] == sum(hits.values())
+        about = site.toplevel_pages[0].href
+        for path in ["index.html", "posts/post-1/index.html", "about/index.html"]:
+            html = site.publish_dir.joinpath(path).read_text()
+            assert f'<a class="nav-link" href="{about}">About</a>' in html
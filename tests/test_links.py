@@ -0,0 +1,116 @@
+import tempfile
+from pathlib import Path
+
+from clog.links import CHUNK_SIZE, LinkChecker, scan_html
+from tests._helpers import make_site
+
+INDEX = """<html><body id="top">
+<a href="/a/">A</a> <a href="/a/#section">Section</a> <a href="/a/#nope">Nope</a>
+<a href="/missing/">Missing</a> <a href="b.html">B</a> <a href="#local">Local</a>
+<a href="mailto:me@example.com">Mail</a> <a href="https://example.com/x">Out</a>
+<img src="/static/logo.png"><p id="local"></p>
+</body></html>"""
+
+
+def _write(root: Path, files: dict):
+    for rel_path, text in files.items():
+        path = root.joinpath(rel_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+def _problems(broken):
+    return {(b.page, b.url, b.reason) for b in broken}
+
+
+def test_link_checker_reports_missing_pages_and_anchors():
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory, "public")
+        _write(
+            root,
+            {
+                "index.html": INDEX,
+                "a/index.html": '<h2 id="section">Section</h2><a href="../#top">Up</a>',
+                "b.html": "<a name='old'></a>",
+            },
+        )
+        broken = LinkChecker(root).check()
+        assert _problems(broken) == {
+            ("index.html", "/a/#nope", "anchor #nope not found"),
+            ("index.html", "/missing/", "page not found"),
+            ("index.html", "/static/logo.png", "page not found"),
+        }
+
+
+def test_characters_across_chunks_are_decoded():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "index.html")
+        # The "é" of the id straddles the end of the first chunk
+        tag = '<h2 id="'
+        html = "x" * (CHUNK_SIZE - len(tag) - 1) + tag + 'é">É</h2>'
+        path.write_text(html + '<a href="/café/">Café</a>', encoding="utf-8")
+        _, ids, urls = scan_html(path.as_posix())
+        assert ids == ["é"] and urls == ["/café/"]
+
+
+def test_link_checker_only_rechecks_affected_pages():
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory, "public")
+        state_path = Path(directory, "links.json")
+        _write(
+            root,
+            {
+                "index.html": '<a href="/a/">A</a>',
+                "a/index.html": '<a href="/b/#x">B</a>',
+                "b/index.html": '<p id="x"></p>',
+                "c/index.html": "<p>No links</p>",
+            },
+        )
+        checker = LinkChecker(root, state_path=state_path)
+        assert checker.check() == []
+        assert checker.parsed == 4
+
+        checker = LinkChecker(root, state_path=state_path)
+        assert checker.check() == []
+        assert (checker.parsed, checker.rechecked) == (0, 0)
+
+        # Only the page linking to the removed anchor is checked again
+        _write(root, {"b/index.html": "<p>Anchor removed</p>"})
+        checker = LinkChecker(root, state_path=state_path)
+        assert _problems(checker.check()) == {
+            ("a/index.html", "/b/#x", "anchor #x not found")
+        }
+        assert (checker.parsed, checker.rechecked) == (1, 2)
+
+        root.joinpath("a/index.html").unlink()
+        checker = LinkChecker(root, state_path=state_path)
+        assert _problems(checker.check()) == {("index.html", "/a/", "page not found")}
+        assert (checker.parsed, checker.rechecked) == (0, 1)
+
+
+def test_build_reports_broken_links_with_their_source():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {
+                "posts/hello.md": (
+                    '+++\ntitle = "Hello"\ndate = 2020-03-01\n+++\n'
+                    "[Other](/posts/other/#intro) and [gone](/posts/gone/)\n"
+                ),
+                "posts/other.md": (
+                    '+++\ntitle = "Other"\ndate = 2020-03-02\n+++\n'
+                    "# Intro {#intro}\n\n[Hello](../hello/#missing)\n"
+                ),
+            },
+        )
+        site.config_path.write_text(site.config_path.read_text() + "checkLinks: true\n")
+        site.build()
+        broken = {
+            (b.source, b.url, b.reason)
+            for b in site.find_broken_links()
+            if b.url.startswith(("/posts", "../"))
+        }
+        assert broken == {
+            ("posts/hello.md", "/posts/gone/", "page not found"),
+            ("posts/other.md", "../hello/#missing", "anchor #missing not found"),
+        }
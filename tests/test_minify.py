@@ -0,0 +1,59 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from clog.minify import HtmlMinifier, minify_html, minify_stream
+from tests._helpers import make_site
+
+HTML = """<html>
+  <head>
+    <!-- a comment -->
+    <!--[if IE]><p>IE</p><![endif]-->
+    <script>
+      var  x = 1;
+    </script>
+  </head>
+  <body>
+    <p>Some    <b>bold</b>   text</p>
+    <pre><code>def  f():
+    return  1
+</code></pre>
+    <textarea>  keep
+  me  </textarea>
+  </body>
+</html>
+"""
+
+
+def test_minify_collapses_whitespace_and_keeps_preformatted_content():
+    html = minify_html(HTML)
+    assert "<!-- a comment -->" not in html
+    assert "<!--[if IE]><p>IE</p><![endif]-->" in html
+    assert "<script>\n      var  x = 1;\n    </script>" in html
+    assert "<p>Some <b>bold</b> text</p>" in html
+    assert "<pre><code>def  f():\n    return  1\n</code></pre>" in html
+    assert "<textarea>  keep\n  me  </textarea>" in html
+    assert len(html) < len(HTML)
+
+
+def test_minify_stream_matches_whole_document_for_any_chunking():
+    expected = minify_html(HTML)
+    for size in (1, 2, 3, 7, 64):
+        chunks = [HTML[i : i + size] for i in range(0, len(HTML), size)]
+        minifier = HtmlMinifier()
+        assert "".join(minify_stream(chunks, minifier)) == expected
+        assert minifier.bytes_in == len(HTML.encode())
+        assert minifier.bytes_out == len(expected.encode())
+
+
+def test_site_build_minifies_pages_when_enabled():
+    with TemporaryDirectory() as temp_dir:
+        page = '+++\ntitle = "About"\ndate = 2020-03-01\n+++\n```\na   b\n```\n'
+        site = make_site(Path(temp_dir) / "site", {"about.md": page})
+        config = site.config_path.read_text()
+        site.config_path.write_text(config + "minify: true\n")
+        site.build()
+        html = site.publish_dir.joinpath("about", "index.html").read_text()
+        assert "<!-- Required meta tags -->" not in html
+        assert "\n  <meta" not in html
+        assert "a   b" in html
+        assert site.bytes_saved > 0
@@ -0,0 +1,64 @@
+import io
+import tarfile
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+import clog
+from clog.exceptions import CLogException
+from clog.output import DirectoryOutput, TarOutput, ZipOutput, open_output
+from tests._helpers import make_site
+
+PAGES = {
+    "about.md": '+++\ntitle = "About"\n+++\nAbout me\n',
+    "posts/hello.md": '+++\ntitle = "Hello"\ndate = 2020-03-01\ntags = [intro]\n+++\nHi\n',
+}
+
+
+def test_build_into_memory():
+    with TemporaryDirectory() as temp_dir:
+        site = make_site(Path(temp_dir) / "site", PAGES)
+        result = clog.build(site.cwd, output=clog.MemoryOutput())
+
+        assert not site.publish_dir.exists()
+        assert len(result.pages) == 2
+        assert "Hi" in result.output.read_text("posts/hello/index.html")
+        assert {"index.html", "about/index.html", "tags/intro/index.html"} <= set(
+            result.files
+        )
+        assert "static/style.css" in result.files
+        assert result.bytes_written == sum(len(d) for d in result.output.files.values())
+        assert all(hasattr(clog, name) for name in clog.__all__)
+
+
+def test_build_streams_archives():
+    with TemporaryDirectory() as temp_dir:
+        site = make_site(Path(temp_dir) / "site", PAGES)
+
+        stream = io.BytesIO()
+        clog.build(site.cwd, output=TarOutput(stream, "gz"))
+        stream.seek(0)
+        with tarfile.open(fileobj=stream, mode="r:gz") as archive:
+            assert "posts/hello/index.html" in archive.getnames()
+
+        stream = io.BytesIO()
+        clog.build(site.cwd, output=ZipOutput(stream))
+        with zipfile.ZipFile(stream) as archive:
+            assert b"About me" in archive.read("about/index.html")
+
+
+def test_open_output_parses_specs():
+    stdout = io.BytesIO()
+    assert isinstance(open_output("dir:public"), DirectoryOutput)
+    assert isinstance(open_output("build"), DirectoryOutput)
+    assert isinstance(open_output("zip:-", stdout=stdout), ZipOutput)
+    assert open_output("tar.gz:-", stdout=stdout).archive.fileobj is not None
+    with TemporaryDirectory() as temp_dir:
+        with open_output(str(Path(temp_dir, "site.tgz"))) as output:
+            assert isinstance(output, TarOutput)
+    with pytest.raises(CLogException):
+        open_output("rar:-", stdout=stdout)
+    with pytest.raises(CLogException, match="Cannot write"):
+        open_output("zip:/nonexistent/directory/site.zip")
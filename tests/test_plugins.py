@@ -0,0 +1,86 @@
+from pathlib import Path
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+
+import pytest
+
+from clog.exceptions import CLogException
+from clog.page import Page
+from clog.plugins import Pipeline, Plugin
+from tests._helpers import make_site
+
+MARKDOWN = """+++
+title = "About"
+date = 2020-03-01
++++
+# Demo
+
+Some text
+"""
+
+
+class UpperCasePlugin(Plugin):
+    name = "upper"
+
+    def preprocess(self, lines, page):
+        for line in lines:
+            yield line.upper()
+
+
+class FooterPlugin(Plugin):
+    name = "footer"
+    cacheable = False
+
+    def postprocess(self, html, page):
+        return html + "<footer></footer>"
+
+    def post_build(self, site):
+        site.post_build_called = True
+
+
+def _parse(markdown, pipeline):
+    with NamedTemporaryFile(suffix=".md") as fp:
+        fp.write(markdown.encode("utf-8"))
+        fp.flush()
+        return Page.parse(fp.name, pipeline)
+
+
+def test_pipeline_runs_hooks_in_order():
+    pipeline = Pipeline([UpperCasePlugin(), FooterPlugin()])
+    page = _parse(MARKDOWN, pipeline)
+    assert "<h1>DEMO</h1>" in page.html
+    assert page.html.endswith("<footer></footer>")
+    assert page.title == "About"
+
+
+def test_pipeline_records_timings_per_page_and_hook():
+    pipeline = Pipeline([UpperCasePlugin(), FooterPlugin()])
+    page = _parse(MARKDOWN, pipeline)
+    assert set(page.timings) == {"upper.preprocess", "footer.postprocess"}
+    assert {(name, hook) for name, hook, _ in pipeline.slowest()} == {
+        ("upper", "preprocess"),
+        ("footer", "postprocess"),
+    }
+
+
+def test_pipeline_cacheable_and_signature():
+    assert Pipeline([UpperCasePlugin()]).cacheable
+    assert not Pipeline([UpperCasePlugin(), FooterPlugin()]).cacheable
+    assert Pipeline(["codeblocks"]).signature != Pipeline().signature
+
+
+def test_pipeline_loads_plugins_by_path():
+    pipeline = Pipeline.from_config({"plugins": ["tests.test_plugins:FooterPlugin"]})
+    assert isinstance(pipeline.plugins[0], FooterPlugin)
+    with pytest.raises(CLogException):
+        Pipeline(["does-not-exist"])
+
+
+def test_site_build_runs_post_build_hooks():
+    with TemporaryDirectory() as temp_dir:
+        site = make_site(Path(temp_dir) / "site", {"about.md": MARKDOWN})
+        config = site.config_path.read_text()
+        site.config_path.write_text(config + "plugins: [tests.test_plugins:FooterPlugin]\n")
+        site.build()
+        assert site.post_build_called
+        html = site.publish_dir.joinpath("about", "index.html").read_text()
+        assert "<footer></footer>" in html
@@ -0,0 +1,118 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from clog.exceptions import CLogException
+from clog.publish import Releases
+from tests._helpers import make_site
+
+POST = '+++\ntitle = "Hello"\ndate = 2020-03-01\n+++\n{}\n'
+
+
+def _atomic_site(directory, keep=2):
+    site = make_site(Path(directory, "site"), {"posts/hello.md": POST.format("One")})
+    config = site.config_path.read_text()
+    site.config_path.write_text(config + f"atomicPublish: true\nkeepBuilds: {keep}\n")
+    return site
+
+
+def _post(site):
+    return site.publish_dir.joinpath("posts/hello/index.html").read_text()
+
+
+def test_builds_are_staged_and_swapped():
+    with tempfile.TemporaryDirectory() as directory:
+        site = _atomic_site(directory)
+        site.build()
+        assert site.publish_dir.is_symlink()
+        first = site.releases.current
+
+        site.cwd.joinpath("content/posts/hello.md").write_text(POST.format("Two"))
+        site.build()
+        assert site.releases.list() == [first, site.releases.current]
+        assert "Two" in _post(site)
+        # Unchanged files are shared with the previous build, changed ones aren't
+        previous = site.state_dir.joinpath("builds", first)
+        assert "One" in previous.joinpath("posts/hello/index.html").read_text()
+        css = next(p for p in previous.rglob("*.css"))
+        assert css.stat().st_nlink == 2
+        assert site.manifest.digest("posts/hello/index.html") is not None
+
+
+def test_old_builds_are_pruned_and_rolled_back_to():
+    with tempfile.TemporaryDirectory() as directory:
+        site = _atomic_site(directory, keep=1)
+        for text in ("One", "Two", "Three"):
+            site.cwd.joinpath("content/posts/hello.md").write_text(POST.format(text))
+            site.build()
+        builds = site.releases.list()
+        assert len(builds) == 2
+        assert site.rollback() == builds[0]
+        assert "Two" in _post(site)
+        assert site.manifest.digest("posts/hello/index.html") is not None
+        with pytest.raises(CLogException, match="No previous build"):
+            site.rollback()
+        assert site.rollback(builds[1]) == builds[1]
+        assert "Three" in _post(site)
+
+
+def test_failed_builds_leave_the_live_site_alone():
+    with tempfile.TemporaryDirectory() as directory:
+        site = _atomic_site(directory)
+        site.build()
+        live = site.releases.current
+        # Two pages with the same URL
+        site.cwd.joinpath("content/posts/other.md").write_text(POST.format("Two"))
+        with pytest.raises(CLogException):
+            site.build()
+        assert site.releases.current == live and "One" in _post(site)
+        site.cwd.joinpath("content/posts/other.md").unlink()
+        site.build()
+        assert not list(site.state_dir.joinpath("builds").glob(".staging-*"))
+
+
+def test_staging_directories_of_running_builds_are_kept():
+    with tempfile.TemporaryDirectory() as directory:
+        builds = Path(directory, "builds")
+        running = builds.joinpath(f".staging-{os.getppid()}")
+        failed = builds.joinpath(".staging-999999999")
+        running.mkdir(parents=True)
+        failed.mkdir()
+        output = Releases(Path(directory, "public"), builds).stage()
+        assert running.is_dir() and not failed.exists()
+        assert output.root == builds.joinpath(f".staging-{os.getpid()}")
+
+
+def test_existing_directory_is_kept_as_a_previous_build():
+    with tempfile.TemporaryDirectory() as directory:
+        link = Path(directory, "public")
+        link.mkdir()
+        link.joinpath("index.html").write_text("old")
+        releases = Releases(link, Path(directory, "builds"))
+        output = releases.stage()
+        output.write("index.html", ["new"])
+        assert link.joinpath("index.html").read_text() == "old"
+        name = releases.publish(output)
+        assert link.is_symlink() and link.joinpath("index.html").read_text() == "new"
+        assert releases.rollback() != name
+        assert link.joinpath("index.html").read_text() == "old"
+
+
+def test_removed_directories_keep_unchanged_files():
+    with tempfile.TemporaryDirectory() as directory:
+        releases = Releases(Path(directory, "public"), Path(directory, "builds"))
+        output = releases.stage()
+        output.write("tags/a/index.html", ["a"])
+        output.write("tags/b/index.html", ["b"])
+        releases.publish(output)
+        output = releases.stage()
+        output.remove("tags")
+        assert not output.exists("tags/a/index.html")
+        output.write("tags/a/index.html", ["a"])
+        assert output.exists("tags/a/index.html")
+        releases.publish(output)
+        public = Path(directory, "public")
+        assert public.joinpath("tags/a/index.html").stat().st_nlink == 2
+        assert not public.joinpath("tags/b").exists()
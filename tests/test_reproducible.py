@@ -0,0 +1,58 @@
+import io
+import os
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import clog
+from clog.output import TarOutput, ZipOutput
+from tests._helpers import make_site
+
+PAGES = {
+    "about.md": '+++\ntitle = "About"\n+++\nAbout me\n',
+    "posts/b.md": '+++\ntitle = "B"\ndate = 2020-03-02\ntags = [z, a, m]\n+++\nB\n',
+    "posts/a.md": '+++\ntitle = "A"\ndate = 2020-03-01\ntags = [m, z]\n+++\nA\n',
+    "posts/2020/c.md": '+++\ntitle = "C"\ndate = 2020-01-01\ntags = [a]\n+++\nC\n',
+}
+
+
+def _build(site_dir: Path, output):
+    clog.build(site_dir, output=output)
+    return output
+
+
+def test_builds_of_the_same_tree_are_byte_identical(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1583020800")
+    with TemporaryDirectory() as temp_dir:
+        first = make_site(Path(temp_dir) / "first", PAGES)
+        # Same sources written in a different order, at a different time
+        second = make_site(Path(temp_dir) / "second", dict(reversed(list(PAGES.items()))))
+        os.utime(second.content_dir.joinpath("about.md"), (0, time.time() + 100))
+
+        first_memory = _build(first.cwd, clog.MemoryOutput())
+        second_memory = _build(second.cwd, clog.MemoryOutput())
+        assert list(first_memory.files) == list(second_memory.files)
+        assert first_memory.files == second_memory.files
+
+        archives = []
+        for site_dir in (first.cwd, second.cwd):
+            tar_stream, zip_stream = io.BytesIO(), io.BytesIO()
+            _build(site_dir, TarOutput(tar_stream, "gz"))
+            _build(site_dir, ZipOutput(zip_stream))
+            archives.append((tar_stream.getvalue(), zip_stream.getvalue()))
+        assert archives[0] == archives[1]
+
+
+def test_reproducible_build_time_is_pinned(monkeypatch):
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    with TemporaryDirectory() as temp_dir:
+        site = make_site(Path(temp_dir) / "site", PAGES)
+        site.config_path.write_text(site.config_path.read_text() + "reproducible: true\n")
+        site.build(output=clog.MemoryOutput())
+        assert site.build_time.format("YYYY-MM-DD") == "2020-03-02"
+        page = [p for p in site.pages if p.title == "A"][0]
+        assert page.date_humanized == "a day ago"
+
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1583020800")
+        site.build(output=clog.MemoryOutput())
+        assert site.build_time.int_timestamp == 1583020800
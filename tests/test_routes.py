@@ -0,0 +1,88 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from clog.exceptions import CLogException
+from clog.page import Page
+from clog.routes import Routes, normalize
+from tests._helpers import make_site
+
+
+def _page(directory, **meta):
+    page = Page.from_meta({k: repr(v) if isinstance(v, list) else v for k, v in meta.items()})
+    page.html_directory = directory
+    return page
+
+
+def test_normalize():
+    assert normalize("/posts/hello/") == "posts/hello"
+    assert normalize("posts/hello/index.html#top") == "posts/hello"
+    assert normalize("/") == ""
+    with pytest.raises(CLogException):
+        normalize("/../etc/")
+
+
+def test_routes_resolve_sources_urls_and_aliases():
+    routes = Routes(reserved=["tags"])
+    hello = _page("posts", title="Hello World", aliases=["/2019/hello/"])
+    about = _page("", title="About", slug="about-me")
+    routes.add("posts/hello.md", hello)
+    routes.add("about.md", about)
+    routes.check()
+    assert routes.url_for("posts/hello.md") == hello.href == "/posts/hello-world"
+    assert routes.url_for("/about-me/") == "/about-me"
+    assert routes.url_for("/2019/hello/") == "/posts/hello-world"
+    assert list(routes.redirects()) == [("2019/hello", hello)]
+    assert list(routes.redirects([about])) == []
+    with pytest.raises(CLogException):
+        routes.url_for("posts/missing.md")
+
+
+def test_routes_report_collisions():
+    routes = Routes(reserved=["tags"])
+    routes.add("posts/a.md", _page("posts", title="Hello"))
+    routes.add("posts/b.md", _page("posts", title="Bye", slug="hello"))
+    routes.add("tags.md", _page("", title="Tags"))
+    routes.add("c.md", _page("", title="C", aliases=["/posts/hello/"]))
+    with pytest.raises(CLogException) as info:
+        routes.check()
+    assert str(info.value).splitlines() == [
+        "URL /posts/hello/ is used by posts/a.md, posts/b.md, c.md",
+        "URL /tags/ is used by tags.md, a generated listing",
+    ]
+
+
+def test_build_fails_on_duplicate_urls():
+    with tempfile.TemporaryDirectory() as directory:
+        post = '+++\ntitle = "Hello"\ndate = 2020-03-01\n+++\nHello\n'
+        site = make_site(Path(directory, "site"), {"posts/a.md": post, "posts/b.md": post})
+        with pytest.raises(CLogException, match="posts/a.md, posts/b.md"):
+            site.build()
+
+
+def test_pages_under_generated_directories_are_rejected():
+    with tempfile.TemporaryDirectory() as directory:
+        note = '+++\ntitle = "Notes"\ndate = 2020-03-01\n+++\nNotes\n'
+        site = make_site(Path(directory, "site"), {"archive/notes.md": note})
+        with pytest.raises(CLogException, match="/archive/notes/ is used by"):
+            site.build()
+        site.config_path.write_text(site.config_path.read_text() + "archives: false\n")
+        site.build()
+        assert site.publish_dir.joinpath("archive/notes/index.html").exists()
+
+
+def test_build_writes_aliases_and_custom_slugs():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {
+                "posts/hello.md": '+++\ntitle = "Hello"\ndate = 2020-03-01\n'
+                'slug = "hi"\naliases = ["/old/hello/"]\n+++\nHello\n',
+            },
+        )
+        site.build()
+        assert site.publish_dir.joinpath("posts/hi/index.html").exists()
+        redirect = site.publish_dir.joinpath("old/hello/index.html").read_text()
+        assert '<meta http-equiv="refresh" content="0; url=/posts/hi">' in redirect
+        assert site.url_for("posts/hello.md") == "/posts/hi"
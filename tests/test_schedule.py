@@ -0,0 +1,70 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from clog.discovery import Source
+from clog.schedule import DEFAULT_SECONDS_PER_BYTE, CostModel, PoolReport, schedule
+from tests._helpers import make_site
+
+
+def test_expensive_items_are_scheduled_first_and_cheap_ones_batched():
+    costs = {"huge.md": 8.0, "big.md": 4.0, **{f"{n}.md": 0.1 for n in range(40)}}
+    batches = schedule(costs, jobs=2)
+    assert batches[:2] == [["huge.md"], ["big.md"]]
+    assert all(len(batch) > 1 for batch in batches[2:])
+    assert sorted(key for batch in batches for key in batch) == sorted(costs)
+
+
+def test_costs_are_estimated_from_previous_builds_or_size():
+    with TemporaryDirectory() as directory:
+        costs = CostModel(Path(directory, "costs.json"))
+        new = Source("/site/content/posts/new.md", "posts", 1000, 0)
+        assert costs.estimate([new]) == {new.path: 1000 * DEFAULT_SECONDS_PER_BYTE}
+
+        old = Source("/site/content/posts/old.md", "posts", 2000, 0)
+        costs.record(old, 0.5)
+        costs.save()
+        costs = CostModel(Path(directory, "costs.json")).load()
+        grown = old._replace(size=4000)
+        assert costs.estimate([grown, new]) == {old.path: 1.0, new.path: 0.25}
+        costs.forget_except(["posts/new.md"])
+        assert costs.entries == {}
+
+
+def test_pool_utilisation():
+    assert PoolReport(jobs=4, batches=10, duration=2.0, busy=6.0).utilisation == 0.75
+    assert PoolReport(jobs=1, batches=0, duration=0.0, busy=0.0).utilisation == 0.0
+
+
+def test_pages_are_parsed_by_workers():
+    posts = {
+        f"posts/{n}.md": f'+++\ntitle = "Post {n}"\ndate = 2020-03-0{n}\n+++\n'
+        + f"Paragraph {n}\n\n" * (n * 50)
+        for n in range(1, 6)
+    }
+    with TemporaryDirectory() as directory:
+        serial = make_site(Path(directory, "serial"), posts)
+        serial.build()
+        site = make_site(Path(directory, "site"), posts)
+        site.config_path.write_text(
+            site.config_path.read_text() + "plugins:\n  - codeblocks\n"
+        )
+        site.jobs = 2
+        events = []
+        site.events.subscribe(events.append)
+        result = site.build()
+        assert result.counters["parsed"] == 5
+        (pool,) = [e for e in events if e["event"] == "pool_finished"]
+        assert pool["jobs"] == 2 and 0 < pool["utilisation"] <= 1
+        # Plugin timings come back from the workers
+        assert site.pipeline.timings[("codeblocks", "preprocess")] > 0
+        for n in range(1, 6):
+            path = f"posts/post-{n}/index.html"
+            expected = serial.publish_dir.joinpath(path).read_text()
+            assert site.publish_dir.joinpath(path).read_text() == expected
+        assert set(site.costs.load().entries) == set(posts)
+
+        # Cached pages are not sent to the workers
+        site._parsed.clear()
+        events.clear()
+        site.build()
+        assert not [e for e in events if e["event"] == "pool_finished"]
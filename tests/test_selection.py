@@ -0,0 +1,83 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from clog.selection import Selection
+from tests._helpers import make_site
+
+PAGE = """+++
+title = "{title}"
+date = 2020-03-01
+tags = [{tags}]
++++
+{body}
+"""
+
+
+def test_selection_matches_sections_globs_and_tags():
+    selection = Selection(["posts/2024/", "*.draft.md", "tag:python"])
+    assert selection.matches("posts/2024/a.md")
+    assert selection.matches("posts/2024/jan/b.md")
+    assert not selection.matches("posts/2023/a.md")
+    assert selection.matches("about.draft.md")
+    assert selection.matches("posts/2023/a.md", tags=["python"])
+    assert not selection.matches("posts/2023/a.md", tags=["rust"])
+
+
+def test_selective_build_renders_matching_pages_and_their_listings():
+    with TemporaryDirectory() as temp_dir:
+        pages = {
+            "posts/2024/new.md": PAGE.format(title="New", tags="python", body="one"),
+            "posts/2023/old.md": PAGE.format(title="Old", tags="rust", body="two"),
+        }
+        site = make_site(Path(temp_dir) / "site", pages)
+        site.build()
+
+        public = site.publish_dir
+        old_html = public.joinpath("posts/2023/old/index.html")
+        rust_html = public.joinpath("tags/rust/index.html")
+        old_html.write_text("untouched")
+        rust_html.write_text("untouched")
+
+        site.content_dir.joinpath("posts/2024/new.md").write_text(
+            PAGE.format(title="Newer", tags="python, go", body="changed")
+        )
+        site = type(site)(site.cwd)
+        site.build(only=["posts/2024"])
+
+        assert "changed" in public.joinpath("posts/2024/newer/index.html").read_text()
+        assert public.joinpath("tags/go/index.html").exists()
+        assert old_html.read_text() == "untouched"
+        assert rust_html.read_text() == "untouched"
+        index = public.joinpath("index.html").read_text()
+        assert "Newer" in index and "Old" in index
+        old_page = [p for p in site.pages if p.title == "Old"][0]
+        assert old_page.html is None  # reused from the previous build's metadata
+
+
+def test_selective_build_removes_pages_of_deleted_and_renamed_sources():
+    with TemporaryDirectory() as temp_dir:
+        pages = {
+            "posts/2024/new.md": PAGE.format(title="New", tags="python", body="one"),
+            "posts/2023/old.md": PAGE.format(title="Old", tags="rust", body="two"),
+            "posts/2023/gone.md": PAGE.format(title="Gone", tags="go", body="three"),
+        }
+        site = make_site(Path(temp_dir) / "site", pages)
+        site.build()
+        public = site.publish_dir
+        assert public.joinpath("tags/go/index.html").exists()
+
+        site.content_dir.joinpath("posts/2023/gone.md").unlink()
+        old = site.content_dir.joinpath("posts/2023/old.md")
+        old.rename(old.with_name("older.md"))
+        site.content_dir.joinpath("posts/2024/new.md").write_text(
+            PAGE.format(title="Newer", tags="python", body="changed")
+        )
+        site = type(site)(site.cwd)
+        site.build(only=["posts/2024"])
+
+        assert not public.joinpath("posts/2023/gone").exists()
+        assert not public.joinpath("tags/go").exists()
+        assert not public.joinpath("posts/2024/new").exists()
+        # Same title, so the renamed page is written at the same URL
+        assert "two" in public.joinpath("posts/2023/old/index.html").read_text()
+        assert "Gone" not in public.joinpath("archive/2020/index.html").read_text()
@@ -0,0 +1,199 @@
+import asyncio
+import gzip
+import tempfile
+from pathlib import Path
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from clog.cache import file_digest
+from clog.output import Manifest, precompress
+from clog.serve import (
+    RE_FINGERPRINTED,
+    accepted_encodings,
+    load_test,
+    make_app,
+    page_urls,
+)
+from tests._helpers import make_site
+
+PAGE = "<html><body>" + "<p>Hello, world</p>" * 100 + "</body></html>"
+
+
+def _serve(root: Path, manifest, requests):
+    """Runs `requests(base_url, client)` against a server for `root`"""
+
+    async def run():
+        sock, port = bind_unused_port()
+        server = HTTPServer(make_app(root, manifest))
+        server.add_sockets([sock])
+        client = AsyncHTTPClient(force_instance=True)
+        try:
+            return await requests(f"http://127.0.0.1:{port}", client)
+        finally:
+            client.close()
+            server.stop()
+
+    return asyncio.run(run())
+
+
+def _publish(directory):
+    root = Path(directory, "public")
+    root.joinpath("posts/hello").mkdir(parents=True)
+    root.joinpath("static/vendor").mkdir(parents=True)
+    root.joinpath("index.html").write_text(PAGE)
+    root.joinpath("posts/hello/index.html").write_text(PAGE.replace("Hello", "Bye"))
+    root.joinpath("static/vendor/app.0123456789.js").write_text("var x = 1;")
+    paths = ["index.html", "posts/hello/index.html", "static/vendor/app.0123456789.js"]
+    paths += precompress(root, paths)
+    manifest = Manifest(root, Path(directory, "manifest.json"))
+    manifest.update(paths)
+    manifest.save()
+    return root, manifest.load()
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br;q=0.8") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("gzip;q=0, identity") == {"identity"}
+    assert accepted_encodings("") == set()
+
+
+def test_precompress_skips_small_files_and_removes_stale_siblings():
+    with tempfile.TemporaryDirectory() as directory:
+        root, _ = _publish(directory)
+        assert root.joinpath("index.html.gz").exists()
+        assert not root.joinpath("static/vendor/app.0123456789.js.gz").exists()
+        assert gzip.decompress(root.joinpath("index.html.gz").read_bytes()) == (
+            PAGE.encode()
+        )
+        root.joinpath("index.html").write_text("<p>Short</p>")
+        assert precompress(root, ["index.html"]) == []
+        assert not root.joinpath("index.html.gz").exists()
+
+
+def test_serve_etags_and_conditional_requests():
+    with tempfile.TemporaryDirectory() as directory:
+        root, manifest = _publish(directory)
+
+        async def requests(base_url, client):
+            # Without decompress_response, no Accept-Encoding is sent
+            first = await client.fetch(
+                f"{base_url}/posts/hello/", decompress_response=False
+            )
+            again = await client.fetch(
+                f"{base_url}/posts/hello/",
+                headers={"If-None-Match": first.headers["Etag"]},
+                decompress_response=False,
+                raise_error=False,
+            )
+            return first, again
+
+        first, again = _serve(root, manifest, requests)
+        digest = manifest.entries["posts/hello/index.html"][2]
+        assert first.headers["Etag"] == f'"{digest[:32]}"'
+        assert first.headers["Cache-Control"] == "no-cache"
+        assert first.headers["Content-Type"] == "text/html; charset=UTF-8"
+        assert first.body.decode() == PAGE.replace("Hello", "Bye")
+        assert again.code == 304
+
+
+def test_serve_etags_of_files_missing_from_the_manifest():
+    with tempfile.TemporaryDirectory() as directory:
+        root, manifest = _publish(directory)
+        extra = root.joinpath("extra.txt")
+        extra.write_text("first")
+
+        async def fetch(base_url, client):
+            response = await client.fetch(f"{base_url}/extra.txt")
+            return response.headers.get("Etag")
+
+        first = _serve(root, manifest, fetch)
+        assert first == f'"{file_digest(extra)[:32]}"'
+        extra.write_text("second")
+        assert _serve(root, manifest, fetch) == f'"{file_digest(extra)[:32]}"' != first
+
+
+def test_serve_negotiates_precompressed_siblings():
+    with tempfile.TemporaryDirectory() as directory:
+        root, manifest = _publish(directory)
+
+        async def requests(base_url, client):
+            kwargs = {"decompress_response": False}
+            compressed = await client.fetch(
+                f"{base_url}/", headers={"Accept-Encoding": "gzip"}, **kwargs
+            )
+            plain = await client.fetch(
+                f"{base_url}/", headers={"Accept-Encoding": "identity"}, **kwargs
+            )
+            asset = await client.fetch(f"{base_url}/static/vendor/app.0123456789.js")
+            return compressed, plain, asset
+
+        compressed, plain, asset = _serve(root, manifest, requests)
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert compressed.headers["Content-Type"] == "text/html; charset=UTF-8"
+        assert compressed.headers["Vary"] == "Accept-Encoding"
+        assert gzip.decompress(compressed.body).decode() == PAGE
+        assert compressed.headers["Etag"] != plain.headers["Etag"]
+        assert "Content-Encoding" not in plain.headers
+        assert plain.body.decode() == PAGE
+        assert asset.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+
+
+def test_files_in_fingerprinted_directories_are_immutable():
+    assert RE_FINGERPRINTED.search("static/vendor/app.0123456789.js")
+    assert RE_FINGERPRINTED.search(
+        "static/vendor/mathjax-fonts.0123456789/MathJax_Zero.woff"
+    )
+    assert not RE_FINGERPRINTED.search("static/style.css")
+
+
+def test_load_test_reports_latencies():
+    with tempfile.TemporaryDirectory() as directory:
+        root, manifest = _publish(directory)
+        paths = page_urls(manifest)
+        assert paths == ["/", "/posts/hello/"]
+
+        async def requests(base_url, client):
+            return await load_test(base_url, paths + ["/missing"], 30, concurrency=3)
+
+        result = _serve(root, manifest, requests)
+        assert result.requests == len(result.latencies) == 30
+        assert result.errors == 10
+        assert result.percentile(50) <= result.percentile(99) == result.latencies[-1]
+        assert result.requests_per_second > 0
+
+
+def test_build_records_manifest_and_precompresses():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(
+            Path(directory, "site"),
+            {"posts/hello.md": '+++\ntitle = "Hello"\ndate = 2020-03-01\n+++\nHello\n'},
+        )
+        site.config_path.write_text(site.config_path.read_text() + "precompress: true\n")
+        site.build()
+        manifest = site.manifest
+        assert manifest.digest("posts/hello/index.html") is not None
+        assert manifest.digest("posts/hello/index.html.gz") is not None
+        assert site.publish_dir.joinpath("static/style.css").exists()
+        assert "/posts/hello/" in page_urls(manifest)
+
+
+def test_serve_large_files_and_ranges():
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory, "public")
+        root.mkdir()
+        data = bytes(range(256)) * (3 * 4096 + 7)  # Several mapped slices
+        root.joinpath("data.bin").write_bytes(data)
+
+        async def requests(base_url, client):
+            full = await client.fetch(f"{base_url}/data.bin")
+            part = await client.fetch(
+                f"{base_url}/data.bin", headers={"Range": "bytes=1000-1999999"}
+            )
+            return full, part
+
+        full, part = _serve(root, None, requests)
+        assert full.body == data
+        assert part.code == 206
+        assert part.body == data[1000:2000000]
@@ -0,0 +1,74 @@
+import tempfile
+from pathlib import Path
+
+from clog.page import Page
+from clog.split import split_blocks
+from tests._helpers import make_site
+
+FRONT_MATTER = '+++\ntitle = "Manual"\ndate = 2020-03-01\n+++\n'
+
+
+def _manual(sections=3, paragraphs=30):
+    lines = []
+    for n in range(1, sections + 1):
+        lines += [f"## Chapter {n}", ""]
+        for _ in range(paragraphs):
+            lines += [f"Text of chapter {n}, see [the docs][docs].", ""]
+    return FRONT_MATTER + "\n".join(lines) + "\n[docs]: https://example.com/docs\n"
+
+
+def test_blocks_start_at_headings_outside_code():
+    lines = ["# One", "a" * 10, "```", "# not a heading", "```", "## Two", "b", "# Three"]
+    assert list(split_blocks(lines, 5, level=1)) == [
+        ["# One", "a" * 10, "```", "# not a heading", "```", "## Two", "b"],
+        ["# Three"],
+    ]
+    assert len(list(split_blocks(lines, 5))) == 3
+    assert list(split_blocks(lines, 1000)) == [lines]
+
+
+def test_blocks_without_headings_are_cut_between_paragraphs():
+    lines = ["a" * 10, "", "- item", "", "  more", "", "b" * 10, "", "c"]
+    assert list(split_blocks(lines, 5)) == [
+        ["a" * 10, "", "- item", "", "  more", ""],
+        ["b" * 10, ""],
+        ["c"],
+    ]
+
+
+def test_large_pages_are_converted_in_chunks():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "manual.md")
+        path.write_text(_manual())
+        whole = Page.parse(path)
+        chunked = Page.parse(path, large_size=100)
+        assert chunked.parts == []
+        assert chunked.html == whole.html
+        assert chunked.html.count('href="https://example.com/docs"') == 90
+
+
+def test_split_pages_are_written_in_parts():
+    with tempfile.TemporaryDirectory() as directory:
+        site = make_site(Path(directory, "site"), {"posts/manual.md": _manual()})
+        site.config_path.write_text(site.config_path.read_text() + "splitPages: 1KB\n")
+        site.build()
+        first = site.publish_dir.joinpath("posts/manual/index.html").read_text()
+        second = site.publish_dir.joinpath("posts/manual/2/index.html").read_text()
+        assert "Chapter 1" in first and "Chapter 2" not in first.split("page-parts")[0]
+        assert '<a href="/posts/manual/2/">Chapter 2</a>' in first
+        assert '<a rel="prev" href="/posts/manual/">' in second
+        assert 'href="https://example.com/docs"' in second
+        assert site.publish_dir.joinpath("posts/manual/3/index.html").exists()
+
+
+def test_pages_with_footnotes_are_converted_whole():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "manual.md")
+        # Referenced in the first chapter, defined at the end
+        text = _manual().replace("## Chapter 1", "## Chapter 1\n\nSee[^a].", 1)
+        path.write_text(text + "\nAlso[^a].\n\n[^a]: A note.\n")
+        chunked = Page.parse(path, large_size=100, split_size=100)
+        assert chunked.parts == []
+        assert chunked.html == Page.parse(path).html
+        assert chunked.html.count('id="fn:a"') == 1
+        assert 'href="#fn:a"' in chunked.html.split("Chapter 2")[0]
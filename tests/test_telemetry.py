@@ -0,0 +1,81 @@
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from click.testing import CliRunner
+
+import clog
+from clog.cli import stats
+from clog.telemetry import HISTORY_FILE, History, find_regressions
+from tests._helpers import make_site
+
+
+def _record(duration, pages=10, render=1.0):
+    return {"duration": duration, "pages": pages, "phases": {"render": render}}
+
+
+def test_find_regressions_against_rolling_median():
+    records = [_record(1.0), _record(1.1), _record(0.9), _record(1.0)]
+    assert find_regressions(records) == []
+
+    regressions = find_regressions(records + [_record(1.5, render=1.05)])
+    assert [r.metric for r in regressions] == ["duration"]
+    assert regressions[0].median == 1.0
+    assert round(regressions[0].change, 2) == 0.5
+
+    # Builds of a different size are not comparable
+    assert find_regressions(records + [_record(5.0, pages=100)]) == []
+    assert find_regressions(records + [_record(1.5)], threshold=0.6) == []
+
+    # Selective builds are only compared with selective builds of the same size
+    selective = dict(_record(0.1), selective=True, rendered=1)
+    assert find_regressions(records + [selective]) == []
+    assert find_regressions(records + [selective, _record(1.0)]) == []
+    assert find_regressions([selective, selective, dict(selective, duration=0.2)])
+
+
+def test_build_appends_history_and_stats_reports_it():
+    with TemporaryDirectory() as temp_dir:
+        page = '+++\ntitle = "About"\n+++\nAbout me\n'
+        site = make_site(Path(temp_dir) / "site", {"about.md": page})
+        clog.build(site.cwd)
+        clog.build(site.cwd)
+        clog.build(site.cwd, only=["about.md"])
+
+        records = History(site.state_dir.joinpath(HISTORY_FILE)).load()
+        assert len(records) == 3
+        assert [(r["selective"], r["rendered"]) for r in records] == [
+            (False, 1),
+            (False, 1),
+            (True, 1),
+        ]
+        assert records[0]["pages"] == 1 and records[0]["parsed"] == 1
+        assert records[0]["version"] == clog.__version__
+        assert {"scan", "parse", "render", "post_build"} <= set(records[0]["phases"])
+        assert records[0]["bytes_written"] > 0
+
+
+def test_stats_lists_builds(monkeypatch):
+    with TemporaryDirectory() as temp_dir:
+        history = History(Path(temp_dir, ".clog", HISTORY_FILE))
+        for duration in (1.0, 1.0, 2.0):
+            history.append(
+                dict(
+                    _record(duration),
+                    time=0,
+                    parsed=10,
+                    bytes_written=1000,
+                    peak_rss=1e7,
+                )
+            )
+        monkeypatch.chdir(temp_dir)
+        runner = CliRunner()
+        result = runner.invoke(stats, [])
+        assert result.exit_code == 0
+        assert len(result.output.splitlines()) == 5
+        assert "Regression: duration is 2.00, 100% above" in result.output
+
+        result = runner.invoke(stats, ["--json", "--last", "2"])
+        data = json.loads(result.output)
+        assert [b["duration"] for b in data["builds"]] == [1.0, 2.0]
+        assert data["regressions"][0]["metric"] == "duration"